@@ -7,6 +7,9 @@ function HistoryPage() {
   const [activeTab, setActiveTab] = useState("images"); // "images" or "videos"
   const [images, setImages] = useState([]);
   const [videos, setVideos] = useState([]);
+  const [totals, setTotals] = useState({ images: 0, videos: 0 });
+  const [nextCursors, setNextCursors] = useState({ images: null, videos: null });
+  const [loadingMore, setLoadingMore] = useState(false);
   const [loading, setLoading] = useState(true);
   const [errorMsg, setErrorMsg] = useState("");
 
@@ -33,6 +36,8 @@ function HistoryPage() {
       } else {
         setImages(imagesData.images || []);
         setVideos(videosData.videos || []);
+        setTotals({ images: imagesData.total || 0, videos: videosData.total || 0 });
+        setNextCursors({ images: imagesData.next_cursor, videos: videosData.next_cursor });
       }
     } catch (err) {
       setErrorMsg("Could not reach server. Make sure the API is running.");
@@ -41,6 +46,36 @@ function HistoryPage() {
     }
   };
 
+  const loadMore = async () => {
+    const cursor = nextCursors[activeTab];
+    if (!cursor) return;
+
+    setLoadingMore(true);
+    setErrorMsg("");
+
+    try {
+      const res = await fetch(
+        `http://localhost:8000/${activeTab}?cursor=${encodeURIComponent(cursor)}`
+      );
+      const data = await res.json();
+
+      if (!res.ok) {
+        setErrorMsg(data.detail || "Failed to fetch history");
+      } else if (activeTab === "images") {
+        setImages((prev) => [...prev, ...(data.images || [])]);
+      } else {
+        setVideos((prev) => [...prev, ...(data.videos || [])]);
+      }
+      if (res.ok) {
+        setNextCursors((prev) => ({ ...prev, [activeTab]: data.next_cursor }));
+      }
+    } catch (err) {
+      setErrorMsg("Could not reach server. Make sure the API is running.");
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const viewImageDetails = (imageId) => {
     navigate(`/image/${imageId}`);
   };
@@ -78,7 +113,7 @@ function HistoryPage() {
               }}
               onClick={() => setActiveTab("images")}
             >
-              📸 Images ({images.length})
+              📸 Images ({totals.images})
             </button>
             <button
               style={{
@@ -87,7 +122,7 @@ function HistoryPage() {
               }}
               onClick={() => setActiveTab("videos")}
             >
-              🎥 Videos ({videos.length})
+              🎥 Videos ({totals.videos})
             </button>
           </div>
 
@@ -129,7 +164,7 @@ function HistoryPage() {
                 <span style={styles.statLabel}>
                   Total {activeTab === "images" ? "Images" : "Videos"}:
                 </span>
-                <span style={styles.statValue}>{currentCount}</span>
+                <span style={styles.statValue}>{totals[activeTab]}</span>
               </div>
             </div>
           )}
@@ -199,6 +234,18 @@ function HistoryPage() {
               ))}
             </div>
           )}
+
+          {!loading && nextCursors[activeTab] && (
+            <div style={styles.loadMoreContainer}>
+              <button
+                style={styles.refreshButton}
+                onClick={loadMore}
+                disabled={loadingMore}
+              >
+                {loadingMore ? "Loading..." : "Load more"}
+              </button>
+            </div>
+          )}
         </div>
       </div>
 
@@ -280,6 +327,11 @@ const styles = {
     fontWeight: 500,
     transition: "all 0.2s",
   },
+  loadMoreContainer: {
+    display: "flex",
+    justifyContent: "center",
+    marginTop: "1rem",
+  },
   tabContainer: {
     display: "flex",
     gap: "0.5rem",
@@ -2,6 +2,9 @@ import React, { useState, useEffect } from "react";
 import { useParams, useNavigate } from "react-router-dom";
 import Header from "../components/Header";
 
+// Frames requested for the viewer; long videos are downsampled by the server
+const TIMELINE_POINTS = 300;
+
 function VideoDetailPage() {
   const { id } = useParams();
   const navigate = useNavigate();
@@ -21,7 +24,7 @@ function VideoDetailPage() {
     setErrorMsg("");
 
     try {
-      const res = await fetch(`http://localhost:8000/video/${id}`);
+      const res = await fetch(`http://localhost:8000/video/${id}?points=${TIMELINE_POINTS}`);
       const data = await res.json();
 
       if (!res.ok) {
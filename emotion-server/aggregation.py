@@ -0,0 +1,213 @@
+"""
+Columnar emotion aggregation for video analyses.
+
+Frame results are held as a (frames x emotions) float32 score matrix with a
+timestamp vector, and every statistic is computed with vectorized NumPy.
+Scores that are unknown (frames stored before full distributions were kept,
+which only have their top 3 emotions) are NaN and left out of that
+emotion's statistics.
+"""
+import numpy as np
+
+EMOTION_LABELS = ["angry", "disgust", "fear", "happy", "sad", "surprise", "neutral"]
+
+# Weight of the last frame, which has no following frame to measure its duration by
+LAST_FRAME_SECONDS = 1.0
+
+# Emotions per frame that count towards presence_percentage
+PRESENCE_TOP_K = 3
+
+
+def emotion_vector(frame_data: dict, labels: list = EMOTION_LABELS, dtype=np.float32) -> np.ndarray:
+    """
+    Scores of one frame_analyses entry in label order. Uses the full
+    distribution when the entry has one, else its top_k_emotions.
+    """
+    emotions = frame_data.get("emotions")
+    if emotions is None:
+        emotions = {e["emotion"]: e["confidence"] for e in frame_data.get("top_k_emotions", [])}
+    return np.array(
+        [emotions[label] if emotions.get(label) is not None else np.nan for label in labels],
+        dtype=dtype
+    )
+
+
+def emotion_matrix(frame_analyses: list, labels: list = EMOTION_LABELS):
+    """(timestamps, scores) arrays of a list of frame_analyses entries."""
+    timestamps = np.fromiter((f["timestamp"] for f in frame_analyses), dtype=np.float64, count=len(frame_analyses))
+    scores = np.empty((len(frame_analyses), len(labels)), dtype=np.float32)
+    for i, frame_data in enumerate(frame_analyses):
+        scores[i] = emotion_vector(frame_data, labels)
+    return timestamps, scores
+
+
+def top_k_mask(scores: np.ndarray, k: int) -> np.ndarray:
+    """Boolean mask of the k highest known scores of each row."""
+    valid = ~np.isnan(scores)
+    order = np.argsort(-np.where(valid, scores, -np.inf), axis=1, kind="stable")[:, :k]
+    mask = np.zeros(scores.shape, dtype=bool)
+    np.put_along_axis(mask, order, True, axis=1)
+    return mask & valid
+
+
+def top_k_rows(scores: np.ndarray, k: int = 3, labels: list = EMOTION_LABELS) -> list:
+    """top_k_emotions lists for every row of a score matrix, highest score first."""
+    valid = ~np.isnan(scores)
+    order = np.argsort(-np.where(valid, scores, -np.inf), axis=1, kind="stable")[:, :k]
+    top_scores = np.take_along_axis(scores, order, axis=1).tolist()
+    top_valid = np.take_along_axis(valid, order, axis=1).tolist()
+    return [
+        [
+            {"emotion": labels[j], "confidence": score}
+            for j, score, known in zip(row_order, row_scores, row_valid) if known
+        ]
+        for row_order, row_scores, row_valid in zip(order.tolist(), top_scores, top_valid)
+    ]
+
+
+class EmotionAccumulator:
+    """
+    Time-weighted emotion statistics of a video, updated as frames stream in.
+
+    Each frame is weighted by the time until the next frame, so a frame's
+    weight is only known once the following frame arrives; the latest frame
+    is held back and counted with LAST_FRAME_SECONDS when summarizing.
+    With `keep_frames`, the scores are also kept as a growing float32 matrix.
+    """
+
+    def __init__(self, labels: list = EMOTION_LABELS, keep_frames: bool = True, capacity: int = 1024):
+        self.labels = list(labels)
+        self.keep_frames = keep_frames
+        n = len(self.labels)
+        self.count = 0
+        self._scores = np.empty((capacity if keep_frames else 0, n), dtype=np.float32)
+        self._timestamps = np.empty(capacity if keep_frames else 0, dtype=np.float64)
+
+        # Unweighted statistics over every known score
+        self._known = np.zeros(n, dtype=np.int64)
+        self._sum = np.zeros(n, dtype=np.float64)
+        self._sum_squares = np.zeros(n, dtype=np.float64)
+        self._min = np.full(n, np.inf, dtype=np.float64)
+        self._max = np.full(n, -np.inf, dtype=np.float64)
+
+        # Time-weighted statistics of every frame but the latest
+        self._weighted_sum = np.zeros(n, dtype=np.float64)
+        self._weight = np.zeros(n, dtype=np.float64)
+        self._presence = np.zeros(n, dtype=np.float64)
+        self._total_weight = 0.0
+        self._last = None  # (timestamp, scores) of the latest frame
+
+    @classmethod
+    def from_frame_analyses(cls, frame_analyses: list, **kwargs):
+        accumulator = cls(capacity=max(len(frame_analyses), 1), **kwargs)
+        accumulator.extend(*emotion_matrix(frame_analyses, accumulator.labels))
+        return accumulator
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        return self._timestamps[:self.count]
+
+    @property
+    def scores(self) -> np.ndarray:
+        return self._scores[:self.count]
+
+    def add_frames(self, frame_analyses: list):
+        """Add frame_analyses entries, in timestamp order after the frames added so far."""
+        if frame_analyses:
+            self.extend(*emotion_matrix(frame_analyses, self.labels))
+
+    def extend(self, timestamps: np.ndarray, scores: np.ndarray):
+        """Add a block of frames given as a timestamp vector and a (frames x emotions) score matrix."""
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        scores = np.asarray(scores, dtype=np.float32).reshape(len(timestamps), len(self.labels))
+        if not len(timestamps):
+            return
+
+        if self.keep_frames:
+            self._reserve(self.count + len(timestamps))
+            self._timestamps[self.count:self.count + len(timestamps)] = timestamps
+            self._scores[self.count:self.count + len(timestamps)] = scores
+        self.count += len(timestamps)
+
+        valid = ~np.isnan(scores)
+        known = np.where(valid, scores, 0).astype(np.float64)
+        self._known += valid.sum(axis=0)
+        self._sum += known.sum(axis=0)
+        self._sum_squares += (known * known).sum(axis=0)
+        self._min = np.minimum(self._min, np.where(valid, scores, np.inf).min(axis=0))
+        self._max = np.maximum(self._max, np.where(valid, scores, -np.inf).max(axis=0))
+
+        # The previous latest frame and all new frames but the last now have a successor
+        if self._last is not None:
+            timestamps = np.concatenate(([self._last[0]], timestamps))
+            scores = np.vstack((self._last[1], scores))
+        self._add_weighted(scores[:-1], np.diff(timestamps))
+        self._last = (timestamps[-1], scores[-1])
+
+    def _reserve(self, size: int):
+        if size <= len(self._timestamps):
+            return
+        capacity = max(size, 2 * len(self._timestamps))
+        scores = np.empty((capacity, len(self.labels)), dtype=np.float32)
+        scores[:self.count] = self._scores[:self.count]
+        timestamps = np.empty(capacity, dtype=np.float64)
+        timestamps[:self.count] = self._timestamps[:self.count]
+        self._scores, self._timestamps = scores, timestamps
+
+    def _weighted(self, scores: np.ndarray, durations: np.ndarray):
+        """Weighted sums, weights and presence of a block of frames with known durations."""
+        valid = ~np.isnan(scores)
+        weights = durations[:, None] * valid
+        return (
+            (np.where(valid, scores, 0) * weights).sum(axis=0),
+            weights.sum(axis=0),
+            (top_k_mask(scores, PRESENCE_TOP_K) * durations[:, None]).sum(axis=0),
+            float(durations.sum()),
+        )
+
+    def _add_weighted(self, scores: np.ndarray, durations: np.ndarray):
+        if not len(durations):
+            return
+        weighted_sum, weight, presence, total_weight = self._weighted(scores, durations)
+        self._weighted_sum += weighted_sum
+        self._weight += weight
+        self._presence += presence
+        self._total_weight += total_weight
+
+    def summary(self) -> dict:
+        """Aggregated emotions in the shape stored as VideoAnalysis.aggregated_data."""
+        if self._last is None:
+            return {}
+
+        last_sum, last_weight, last_presence, last_total = self._weighted(
+            self._last[1][None, :], np.array([LAST_FRAME_SECONDS])
+        )
+        weighted_sum = self._weighted_sum + last_sum
+        weight = self._weight + last_weight
+        presence = self._presence + last_presence
+        total_weight = self._total_weight + last_total
+
+        aggregated = {}
+        for j in np.flatnonzero(self._known):
+            mean = self._sum[j] / self._known[j]
+            variance = max(self._sum_squares[j] / self._known[j] - mean * mean, 0.0)
+            aggregated[self.labels[j]] = {
+                "average": round(float(weighted_sum[j] / weight[j]), 2) if weight[j] > 0 else round(float(mean), 2),
+                "simple_average": round(float(mean), 2),
+                "max": round(float(self._max[j]), 2),
+                "min": round(float(self._min[j]), 2),
+                "std": round(float(np.sqrt(variance)), 2),
+                "presence_percentage": round(float(presence[j] / total_weight * 100), 2) if total_weight > 0 else 0.0
+            }
+
+        sorted_aggregated = dict(
+            sorted(aggregated.items(), key=lambda x: x[1]["average"], reverse=True)
+        )
+
+        dominant_emotion = next(iter(sorted_aggregated), None)
+
+        return {
+            "emotions": sorted_aggregated,
+            "dominant_emotion": dominant_emotion,
+            "dominant_average_confidence": sorted_aggregated[dominant_emotion]["average"] if dominant_emotion else None
+        }
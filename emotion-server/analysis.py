@@ -0,0 +1,301 @@
+"""
+CPU-bound analysis pipelines.
+
+These functions do the decoding, inference and frame image encoding for the
+/image and /video endpoints. They take and return plain Python data and
+never touch the database, so they can run on the analysis worker pool.
+"""
+import cv2
+import numpy as np
+
+from config import DETECT_EVERY, FRAME_STORAGE, SAMPLING_STRATEGY
+from aggregation import EMOTION_LABELS, EmotionAccumulator, top_k_rows
+from frames import encode_frame
+from inference import analyze_frames_batched, analyze_image_array
+from metrics import StageTimings, timed_iter
+from sampling import (
+    average_frame_interval, effective_frame_interval, iter_adaptive_frames, iter_sampled_frames, sample_step
+)
+from storage import blob_store
+from tracking import FaceBoxPropagator, FaceTracker
+
+
+class VideoDecodeError(Exception):
+    """Raised when OpenCV cannot open an uploaded video."""
+
+
+def face_entries(analyses: list) -> list:
+    """
+    Per-face results of a multi-face analysis. DeepFace reports the whole
+    image with zero confidence when it finds no face; that is not a face.
+    """
+    faces = []
+    for analysis in analyses:
+        if not analysis.get("face_confidence"):
+            continue
+        region = analysis["region"]
+        faces.append({
+            "face_index": len(faces),
+            "region": {k: int(region[k]) for k in ("x", "y", "w", "h")},
+            "confidence": float(analysis["face_confidence"]),
+            "dominant_emotion": analysis["dominant_emotion"],
+            "emotions": {emo: round(float(score), 4) for emo, score in analysis["emotion"].items()},
+        })
+    return faces
+
+
+def analyze_image_bytes(
+    file_bytes: bytes,
+    multi_face: bool = False,
+    detector_backend: str = None,
+    timings: StageTimings = None
+):
+    """
+    Decode an uploaded image and analyze it for emotions. Returns the analysis
+    of the first face, and with `multi_face` also the list of all face entries.
+    """
+    if timings is None:
+        timings = StageTimings()
+    with timings.stage("decode"):
+        img = cv2.imdecode(np.frombuffer(file_bytes, np.uint8), cv2.IMREAD_COLOR)
+    with timings.stage("inference"):
+        analysis = analyze_image_array(img, multi_face=multi_face, detector_backend=detector_backend)
+    if not analysis:
+        raise ValueError("no face could be analyzed")
+    if multi_face:
+        return analysis[0], face_entries(analysis)
+    return analysis
+
+
+def analyze_images_bytes(images: list, batch_size: int, detector_backend: str = None) -> list:
+    """
+    Decode and analyze several uploaded images with one batched model pass.
+    Returns, per image, an analysis dict or an error message string.
+    """
+    decoded = [cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR) for data in images]
+    valid = [i for i, img in enumerate(decoded) if img is not None]
+
+    results = ["Invalid image data"] * len(images)
+    analyses = analyze_frames_batched(
+        [decoded[i] for i in valid], batch_size=batch_size, detector_backend=detector_backend
+    )
+    for i, analysis in zip(valid, analyses):
+        results[i] = analysis if analysis is not None else "no face could be analyzed"
+    return results
+
+
+def analyze_frame_batch(
+    pending: list,
+    fps: float,
+    batch_size: int,
+    multi_face: bool = False,
+    tracker=None,
+    detector_backend: str = None,
+    propagator=None,
+    timings: StageTimings = None,
+    frame_storage: str = FRAME_STORAGE
+):
+    """
+    Run batched inference on sampled frames and build frame_analyses entries.
+    With `multi_face`, entries carry every detected face, with track IDs when a tracker is given.
+    A propagator lets frames between detections reuse the previous face boxes.
+    Frame images are encoded as `frame_storage` says (see frames.py).
+    """
+    if timings is None:
+        timings = StageTimings()
+    with timings.stage("inference"):
+        analyses = analyze_frames_batched(
+            [rgb for _, _, rgb in pending],
+            batch_size=batch_size,
+            multi_face=multi_face,
+            detector_backend=detector_backend,
+            propagator=propagator
+        )
+
+    analyzed = []
+    for (frame_count, frame, _), analysis in zip(pending, analyses):
+        if not analysis:
+            print(f"Failed to analyze frame {frame_count}")
+            continue
+
+        faces = None
+        if multi_face:
+            faces = face_entries(analysis)
+            if tracker is not None:
+                track_ids = tracker.update([face["region"] for face in faces])
+                for face, track_id in zip(faces, track_ids):
+                    face["track_id"] = track_id
+            analysis = analysis[0]
+        analyzed.append((frame_count, frame, analysis, faces))
+
+    # Full emotion distributions of the batch as one (frames x emotions) matrix, kept
+    # in float64 so reported confidences match the per-frame values and /image exactly
+    scores = np.array(
+        [[analysis["emotion"][label] for label in EMOTION_LABELS] for _, _, analysis, _ in analyzed],
+        dtype=np.float64
+    ).reshape(len(analyzed), len(EMOTION_LABELS))
+    top_ks = top_k_rows(scores, k=3)
+
+    results = []
+    for (frame_count, frame, _, faces), emotions, top_k in zip(analyzed, scores.tolist(), top_ks):
+        timestamp = frame_count / fps if fps > 0 else 0
+
+        # Encode the frame image and write it to the blob store right away,
+        # so results of a long video never hold every frame image in memory
+        frame_blob = None
+        if frame_storage != "none":
+            with timings.stage("encode"):
+                data = encode_frame(frame, frame_storage)
+            with timings.stage("storage"):
+                frame_blob = blob_store.put(data)
+
+        results.append({
+            "frame": frame_count,
+            "timestamp": round(timestamp, 2),
+            "top_k_emotions": top_k,
+            "dominant_emotion": top_k[0]["emotion"] if top_k else None,
+            "dominant_confidence": top_k[0]["confidence"] if top_k else None,
+            "emotions": dict(zip(EMOTION_LABELS, emotions)),
+            "frame_blob": frame_blob
+        })
+        if faces is not None:
+            results[-1]["faces"] = faces
+
+    return results
+
+
+def probe_video(path: str) -> dict:
+    """Read frame count, fps and duration from a video file."""
+    cap = cv2.VideoCapture(path)
+
+    if not cap.isOpened():
+        raise VideoDecodeError("Could not open video file")
+
+    try:
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = cap.get(cv2.CAP_PROP_FPS)
+    finally:
+        cap.release()
+
+    return {
+        "total_frames": total_frames,
+        "fps": fps,
+        "duration": total_frames / fps if fps > 0 else 0,
+    }
+
+
+def iter_video_analyses(
+    path: str,
+    frame_interval: int,
+    batch_size: int,
+    start_frame: int = 0,
+    samples_per_second: float = None,
+    strategy: str = SAMPLING_STRATEGY,
+    multi_face: bool = False,
+    track_faces: bool = False,
+    detector_backend: str = None,
+    detect_every: int = DETECT_EVERY,
+    adaptive: bool = False,
+    timings: StageTimings = None,
+    end_frame: int = None,
+    frame_storage: str = FRAME_STORAGE
+):
+    """
+    Analyze the sampled frames of a video, one batch at a time.
+
+    Frames are sampled every `frame_interval` frames, or `samples_per_second`
+    times per second when given. With `adaptive`, frames are sampled on
+    scene changes instead (see iter_adaptive_frames) and the fixed stride is
+    ignored. With `multi_face` every detected face is
+    analyzed, and `track_faces` links faces across frames into tracks. With
+    `detect_every` above 1, faces are detected on every that many sampled
+    frames and carried over by optical flow in between. Yields
+    (frame_analyses, next_frame) after each batch, where next_frame is the
+    index decoding can be resumed from without losing any sampled frame.
+    Fixed-stride sampling stops before `end_frame` when given.
+    Time spent per stage is added to `timings` when given.
+    """
+    if timings is None:
+        timings = StageTimings()
+    cap = cv2.VideoCapture(path)
+
+    if not cap.isOpened():
+        raise VideoDecodeError("Could not open video file")
+
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        step = sample_step(fps, frame_interval, samples_per_second)
+        tracker = FaceTracker() if multi_face and track_faces else None
+        propagator = FaceBoxPropagator(detect_every) if detect_every > 1 else None
+        pending = []  # (frame_number, bgr_frame, rgb_frame) awaiting inference
+
+        if adaptive:
+            sampled = iter_adaptive_frames(cap, fps, start_frame)
+        else:
+            sampled = iter_sampled_frames(cap, step, start_frame, strategy, end_frame)
+
+        for frame_count, frame in timed_iter(sampled, timings, "decode"):
+            with timings.stage("decode"):
+                rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            pending.append((frame_count, frame, rgb_frame))
+
+            if len(pending) >= batch_size:
+                yield analyze_frame_batch(
+                    pending, fps, batch_size, multi_face, tracker, detector_backend, propagator, timings,
+                    frame_storage
+                ), frame_count + 1
+                pending = []
+
+        if pending:
+            yield analyze_frame_batch(
+                pending, fps, batch_size, multi_face, tracker, detector_backend, propagator, timings,
+                frame_storage
+            ), pending[-1][0] + 1
+    finally:
+        cap.release()
+
+
+def analyze_video_file(
+    path: str,
+    frame_interval: int,
+    batch_size: int,
+    samples_per_second: float = None,
+    multi_face: bool = False,
+    track_faces: bool = False,
+    detector_backend: str = None,
+    detect_every: int = DETECT_EVERY,
+    adaptive: bool = False,
+    timings: StageTimings = None,
+    frame_storage: str = FRAME_STORAGE
+) -> dict:
+    """Decode a video file, analyze its sampled frames and return the results."""
+    if timings is None:
+        timings = StageTimings()
+    result = probe_video(path)
+
+    frame_analyses = []
+    accumulator = EmotionAccumulator(keep_frames=False)
+    for batch, _ in iter_video_analyses(
+        path,
+        frame_interval,
+        batch_size,
+        samples_per_second=samples_per_second,
+        multi_face=multi_face,
+        track_faces=track_faces,
+        detector_backend=detector_backend,
+        detect_every=detect_every,
+        adaptive=adaptive,
+        timings=timings,
+        frame_storage=frame_storage
+    ):
+        frame_analyses.extend(batch)
+        accumulator.add_frames(batch)
+
+    if adaptive:
+        result["frame_interval"] = average_frame_interval(result["total_frames"], len(frame_analyses))
+    else:
+        result["frame_interval"] = effective_frame_interval(result["fps"], frame_interval, samples_per_second)
+    timings.frames = len(frame_analyses)
+    result["frame_analyses"] = frame_analyses
+    result["aggregated"] = accumulator.summary()
+    return result
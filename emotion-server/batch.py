@@ -0,0 +1,98 @@
+"""
+Reading batch image uploads.
+
+A batch request may mix plain image files with zip and tar archives of
+images. Items are yielded one at a time, archive members included, so
+large archives are never extracted to memory as a whole.
+"""
+import os
+import tarfile
+import zipfile
+
+from config import MAX_IMAGE_BYTES
+
+IMAGE_CONTENT_TYPES = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+}
+ZIP_CONTENT_TYPES = ("application/zip", "application/x-zip-compressed")
+TAR_CONTENT_TYPES = ("application/x-tar", "application/gzip", "application/x-gzip", "application/x-gtar")
+TAR_EXTENSIONS = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+
+
+class BatchItem:
+    """One image of a batch upload, or the reason it could not be read."""
+
+    def __init__(self, filename: str, content_type: str = None, data: bytes = None, error: str = None):
+        self.filename = filename
+        self.content_type = content_type
+        self.data = data
+        self.error = error
+
+
+def _member_content_type(name: str):
+    return IMAGE_CONTENT_TYPES.get(os.path.splitext(name)[1].lower())
+
+
+def _iter_zip(fileobj, archive_name: str):
+    with zipfile.ZipFile(fileobj) as archive:
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            name = f"{archive_name}/{info.filename}"
+            content_type = _member_content_type(info.filename)
+            if content_type is None:
+                yield BatchItem(name, error="Unsupported file type")
+            elif info.file_size > MAX_IMAGE_BYTES:
+                yield BatchItem(name, error="Image too large")
+            else:
+                yield BatchItem(name, content_type, archive.read(info))
+
+
+def _iter_tar(fileobj, archive_name: str):
+    # Stream mode reads members sequentially without seeking
+    with tarfile.open(fileobj=fileobj, mode="r|*") as archive:
+        for member in archive:
+            if not member.isfile():
+                continue
+            name = f"{archive_name}/{member.name}"
+            content_type = _member_content_type(member.name)
+            if content_type is None:
+                yield BatchItem(name, error="Unsupported file type")
+            elif member.size > MAX_IMAGE_BYTES:
+                yield BatchItem(name, error="Image too large")
+            else:
+                yield BatchItem(name, content_type, archive.extractfile(member).read())
+
+
+def iter_batch_items(uploads):
+    """Yield a BatchItem per image in the uploaded files (starlette UploadFile objects)."""
+    for upload in uploads:
+        filename = upload.filename or ""
+        lower = filename.lower()
+        try:
+            if upload.content_type in ZIP_CONTENT_TYPES or lower.endswith(".zip"):
+                yield from _iter_zip(upload.file, filename)
+            elif upload.content_type in TAR_CONTENT_TYPES or lower.endswith(TAR_EXTENSIONS):
+                yield from _iter_tar(upload.file, filename)
+            elif upload.content_type in IMAGE_CONTENT_TYPES.values():
+                data = upload.file.read(MAX_IMAGE_BYTES + 1)
+                if len(data) > MAX_IMAGE_BYTES:
+                    yield BatchItem(filename, error="Image too large")
+                else:
+                    yield BatchItem(filename, upload.content_type, data)
+            else:
+                yield BatchItem(filename, error=f"Invalid file type '{upload.content_type}'")
+        except (zipfile.BadZipFile, tarfile.TarError) as e:
+            yield BatchItem(filename, error=f"Invalid archive: {e}")
+
+
+def next_chunk(items, size: int) -> list:
+    """Take up to `size` items from an iterator."""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            break
+    return chunk
@@ -0,0 +1,1337 @@
+"""
+Benchmarks for the emotion server hot paths.
+
+Usage (from emotion-server/):
+    python benchmark.py batching --video clip.mp4 --frame-interval 30 --batch-sizes 1 8 16 32
+    python benchmark.py upload-memory --size-mb 1024
+    python benchmark.py sampling --video clip.mp4 --intervals 1 5 30 120
+    python benchmark.py history --rows 100000
+    python benchmark.py image-batch --images 200
+    python benchmark.py detectors --fixtures fixtures/faces
+    python benchmark.py face-reuse --video clip.mp4 --detect-every 2 4 8
+    python benchmark.py adaptive --video clip.mp4 --frame-interval 30
+    python benchmark.py aggregation --frames 100000
+    python benchmark.py timeline --frames 108000
+    python benchmark.py workers --workers 1 2 4 --requests 400
+    python benchmark.py suite --sizes 1000 10000 100000 --output results.json [--baseline old.json]
+    python benchmark.py sharding --video clip.mp4 --workers 1 2 4 8
+    python benchmark.py quantization --fixtures fixtures/faces --precisions float16 int8
+    python benchmark.py frames --video clip.mp4 --frame-interval 15
+    python benchmark.py startup --max-read-seconds 1.0
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+
+def synthetic_frames(count: int, width: int = 640, height: int = 480, seed: int = 0):
+    """Generate BGR frames with a bright ellipse so the detectors have something to find."""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for i in range(count):
+        frame = rng.integers(0, 60, size=(height, width, 3), dtype=np.uint8)
+        center = (width // 2 + (i % 20) - 10, height // 2)
+        cv2.ellipse(frame, center, (90, 120), 0, 0, 360, (180, 200, 230), -1)
+        frames.append(frame)
+    return frames
+
+
+def sampled_frames(video_path: str, frame_interval: int):
+    """Decode a video and return its sampled frames as RGB arrays."""
+    cap = cv2.VideoCapture(video_path)
+    frames = []
+    frame_count = 0
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if frame_count % frame_interval == 0:
+            frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        frame_count += 1
+    cap.release()
+    return frames
+
+
+def bench_batching(args):
+    """Compare the per-frame DeepFace.analyze loop against the batched engine."""
+    from deepface import DeepFace
+    from cache import ResultCache
+    from helpers import top_k_emotions
+    from inference import analyze_frames_batched
+
+    # Every batch size re-runs the same frames, so the result cache must stay out of the way
+    no_cache = ResultCache(enabled=False)
+
+    if args.video:
+        frames = sampled_frames(args.video, args.frame_interval)
+    else:
+        frames = [cv2.cvtColor(f, cv2.COLOR_BGR2RGB) for f in synthetic_frames(args.frames)]
+
+    # Warm up both paths so model loading is not timed
+    DeepFace.analyze(img_path=frames[0], actions=['emotion'], enforce_detection=False)
+    analyze_frames_batched(frames[:1], cache=no_cache)
+
+    start = time.perf_counter()
+    baseline = []
+    for frame in frames:
+        analysis = DeepFace.analyze(img_path=frame, actions=['emotion'], enforce_detection=False)
+        if isinstance(analysis, list):
+            analysis = analysis[0]
+        baseline.append(top_k_emotions(analysis, k=3))
+    per_frame_time = time.perf_counter() - start
+    print(f"per-frame loop: {len(frames)} frames in {per_frame_time:.2f}s "
+          f"({len(frames) / per_frame_time:.1f} frames/s)")
+
+    for batch_size in args.batch_sizes:
+        start = time.perf_counter()
+        batched = []
+        for i in range(0, len(frames), batch_size):
+            for analysis in analyze_frames_batched(frames[i:i + batch_size], batch_size=batch_size, cache=no_cache):
+                batched.append(top_k_emotions(analysis, k=3) if analysis else [])
+        elapsed = time.perf_counter() - start
+
+        matches = sum(
+            [e["emotion"] for e in a] == [e["emotion"] for e in b]
+            and np.allclose([e["confidence"] for e in a], [e["confidence"] for e in b], atol=1e-2)
+            for a, b in zip(baseline, batched)
+        )
+        print(f"batch_size={batch_size}: {elapsed:.2f}s ({len(frames) / elapsed:.1f} frames/s), "
+              f"speedup {per_frame_time / elapsed:.2f}x, matching frames {matches}/{len(frames)}")
+
+
+def write_synthetic_video(path: str, seconds: float, fps: int = 30, width: int = 640, height: int = 480):
+    """Write a synthetic MJPG video (large per-frame size, cheap to encode)."""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, (width, height))
+    frames = synthetic_frames(30, width, height)
+    for i in range(int(seconds * fps)):
+        writer.write(frames[i % len(frames)])
+    writer.release()
+
+
+def write_large_file(path: str, size_mb: int):
+    """Pad a file with random bytes up to size_mb (upload streaming does not decode it)."""
+    chunk = os.urandom(1024 * 1024)
+    with open(path, "ab") as f:
+        while f.tell() < size_mb * 1024 * 1024:
+            f.write(chunk)
+
+
+def bench_upload_memory(args):
+    """Measure Python heap growth when saving a large upload: full read vs chunked streaming."""
+    from starlette.datastructures import UploadFile
+    from config import UPLOAD_CHUNK_BYTES
+    from helpers import save_upload_to_tempfile
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        source = os.path.join(tmp_dir, "synthetic.avi")
+        write_synthetic_video(source, seconds=2)
+        write_large_file(source, args.size_mb)
+        print(f"synthetic upload: {os.path.getsize(source) / 2**20:.0f} MB")
+
+        async def buffered():
+            with open(source, "rb") as f:
+                upload = UploadFile(file=f, filename="synthetic.avi")
+                file_bytes = await upload.read()
+                with tempfile.NamedTemporaryFile(dir=tmp_dir, delete=False) as out:
+                    out.write(file_bytes)
+                os.remove(out.name)
+
+        async def streamed():
+            with open(source, "rb") as f:
+                upload = UploadFile(file=f, filename="synthetic.avi")
+                path = await save_upload_to_tempfile(upload, max_bytes=2**62, chunk_size=UPLOAD_CHUNK_BYTES)
+                os.remove(path)
+
+        for name, fn in (("full read", buffered), ("streamed", streamed)):
+            tracemalloc.start()
+            start = time.perf_counter()
+            asyncio.run(fn())
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"{name}: peak heap {peak / 2**20:.1f} MB, {elapsed:.2f}s")
+
+
+def bench_sampling(args):
+    """Decode throughput of the read-every-frame loop against grab/seek sampling."""
+    from sampling import iter_sampled_frames
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        video = args.video
+        if not video:
+            video = os.path.join(tmp_dir, "synthetic.avi")
+            write_synthetic_video(video, seconds=args.seconds)
+
+        def read_all(interval):
+            cap = cv2.VideoCapture(video)
+            sampled = []
+            frame_count = 0
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                if frame_count % interval == 0:
+                    sampled.append(frame_count)
+                frame_count += 1
+            cap.release()
+            return sampled
+
+        def sampler(strategy):
+            def run(interval):
+                cap = cv2.VideoCapture(video)
+                sampled = [n for n, _ in iter_sampled_frames(cap, float(interval), strategy=strategy)]
+                cap.release()
+                return sampled
+            return run
+
+        total_frames = int(cv2.VideoCapture(video).get(cv2.CAP_PROP_FRAME_COUNT))
+        print(f"video: {video} ({total_frames} frames)")
+        for interval in args.intervals:
+            baseline = None
+            for name, fn in (("read all", read_all), ("grab", sampler("grab")), ("seek", sampler("seek"))):
+                start = time.perf_counter()
+                sampled = fn(interval)
+                elapsed = time.perf_counter() - start
+                if baseline is None:
+                    baseline = sampled
+                same = "same frames" if sampled == baseline else "DIFFERENT frames"
+                print(f"interval={interval:>4} {name:>8}: {elapsed:.2f}s, "
+                      f"{total_frames / elapsed:.0f} source frames/s, {len(sampled)} sampled, {same}")
+
+
+EMOTIONS = ["angry", "disgust", "fear", "happy", "sad", "surprise", "neutral"]
+
+
+def seed_history(engine, rows: int, blob_kb: int = 0, seed: int = 0):
+    """Insert `rows` image analyses and video analyses with spread-out upload dates."""
+    from datetime import datetime, timedelta
+    from models import ImageAnalysis, VideoAnalysis
+
+    rng = np.random.default_rng(seed)
+    start = datetime(2024, 1, 1)
+    blob = os.urandom(blob_kb * 1024) if blob_kb else None
+    analysis_json = '{"top_k_emotions": [], "dominant_emotion": "happy", "dominant_confidence": 90.0}'
+
+    with engine.begin() as conn:
+        for offset in range(0, rows, 5000):
+            count = min(5000, rows - offset)
+            emotions = rng.choice(EMOTIONS, size=count)
+            dates = [start + timedelta(seconds=int(s)) for s in rng.integers(0, 365 * 86400, size=count)]
+            conn.execute(ImageAnalysis.__table__.insert(), [
+                {
+                    "filename": f"image_{offset + i}.jpg",
+                    "file_type": "image/jpeg",
+                    "upload_date": dates[i],
+                    "dominant_emotion": str(emotions[i]),
+                    "dominant_confidence": 90.0,
+                    "analysis_data": analysis_json,
+                    "image_data": blob,
+                }
+                for i in range(count)
+            ])
+            conn.execute(VideoAnalysis.__table__.insert(), [
+                {
+                    "filename": f"video_{offset + i}.mp4",
+                    "file_type": "video/mp4",
+                    "upload_date": dates[i],
+                    "duration_seconds": 60.0,
+                    "total_frames": 1800,
+                    "analyzed_frames": 60,
+                    "fps": 30.0,
+                    "frame_interval": 30,
+                    "dominant_emotion": str(emotions[i]),
+                    "dominant_confidence": 80.0,
+                    "aggregated_data": analysis_json,
+                }
+                for i in range(count)
+            ])
+
+
+def timed(fn, repeat: int = 5):
+    """Best wall time of fn over `repeat` runs, in milliseconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def bench_history(args):
+    """Latency of the old full-table history listing against projected keyset pages."""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from crud import list_history
+    from models import Base, ImageAnalysis
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp_dir, 'history.db')}")
+        Base.metadata.create_all(bind=engine)
+        seed_history(engine, args.rows, args.blob_kb)
+        db = sessionmaker(bind=engine)()
+        columns = [ImageAnalysis.filename, ImageAnalysis.dominant_emotion, ImageAnalysis.dominant_confidence]
+        print(f"seeded {args.rows} images and {args.rows} videos")
+
+        def full_listing():
+            db.query(ImageAnalysis).order_by(ImageAnalysis.upload_date.desc()).all()
+            db.expunge_all()
+
+        def first_page():
+            list_history(db, ImageAnalysis, columns, args.page_size)
+
+        cursor = None
+        for _ in range(args.rows // args.page_size // 2):
+            _, _, cursor = list_history(db, ImageAnalysis, columns, args.page_size, cursor)
+
+        def deep_page():
+            list_history(db, ImageAnalysis, columns, args.page_size, cursor)
+
+        def filtered_page():
+            list_history(db, ImageAnalysis, columns, args.page_size, dominant_emotion="happy")
+
+        print(f"full ORM listing (.all()): {timed(full_listing, 1):.1f} ms")
+        print(f"first page ({args.page_size}):       {timed(first_page):.1f} ms")
+        print(f"middle page via cursor:    {timed(deep_page):.1f} ms")
+        print(f"filtered page (happy):     {timed(filtered_page):.1f} ms")
+        db.close()
+
+
+async def asgi_request(app, method: str, path: str, body: bytes = b"", headers: dict = None):
+    """Call an ASGI app in-process (no network). Returns (status, headers, body)."""
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+                   + [(b"content-length", str(len(body)).encode())],
+        "client": ("127.0.0.1", 50000),
+        "server": ("testserver", 80),
+    }
+    request_sent = False
+    response = {"status": None, "headers": {}, "body": bytearray()}
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await asyncio.sleep(3600)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = {k.decode(): v.decode() for k, v in message.get("headers", [])}
+        elif message["type"] == "http.response.body":
+            response["body"] += message.get("body", b"")
+
+    await app(scope, receive, send)
+    return response["status"], response["headers"], bytes(response["body"])
+
+
+def multipart_body(fields: dict = None, files: list = None):
+    """Encode form fields and (field, filename, content_type, data) files as multipart/form-data."""
+    boundary = f"benchmark{os.urandom(8).hex()}"
+    parts = []
+    for name, value in (fields or {}).items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        )
+    for field, filename, content_type, data in files or []:
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n'.encode() + data + b"\r\n"
+        )
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), {"content-type": f"multipart/form-data; boundary={boundary}"}
+
+
+def load_app(work_dir: str):
+    """Import the FastAPI app with its database and blob store inside work_dir."""
+    os.chdir(work_dir)
+    import main
+    return main.app
+
+
+def synthetic_jpegs(count: int, prefix: str = "image", seed: int = None):
+    """
+    Distinct synthetic JPEG images (distinct pixels, so the result cache does not hide work).
+    Calls with the same count and seed return the same pixels; give each run its own seed.
+    """
+    images = []
+    for i, frame in enumerate(synthetic_frames(count, 320, 240, seed=count if seed is None else seed)):
+        _, buffer = cv2.imencode(".jpg", frame)
+        images.append((f"{prefix}_{i}.jpg", buffer.tobytes()))
+    return images
+
+
+def bench_image_batch(args):
+    """Throughput of the single-image endpoint against /images/batch (files and zip archive)."""
+    import io
+    import zipfile
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        app = load_app(tmp_dir)
+
+        async def run():
+            async with app.router.lifespan_context(app):
+                start = time.perf_counter()
+                for filename, data in synthetic_jpegs(args.images, "single", seed=1):
+                    body, headers = multipart_body(files=[("file", filename, "image/jpeg", data)])
+                    await asgi_request(app, "POST", "/image", body, headers)
+                single = time.perf_counter() - start
+                print(f"POST /image x{args.images}: {single:.2f}s ({args.images / single:.1f} images/s)")
+
+                images = synthetic_jpegs(args.images, "batch", seed=2)
+                body, headers = multipart_body(
+                    fields={"batch_size": args.batch_size},
+                    files=[("files", filename, "image/jpeg", data) for filename, data in images]
+                )
+                start = time.perf_counter()
+                status, _, _ = await asgi_request(app, "POST", "/images/batch", body, headers)
+                batched = time.perf_counter() - start
+                print(f"POST /images/batch ({args.images} files): {batched:.2f}s "
+                      f"({args.images / batched:.1f} images/s, {single / batched:.2f}x), status {status}")
+
+                archive = io.BytesIO()
+                with zipfile.ZipFile(archive, "w") as zf:
+                    for filename, data in synthetic_jpegs(args.images, "zipped", seed=3):
+                        zf.writestr(filename, data)
+                body, headers = multipart_body(
+                    fields={"batch_size": args.batch_size},
+                    files=[("files", "images.zip", "application/zip", archive.getvalue())]
+                )
+                start = time.perf_counter()
+                status, _, _ = await asgi_request(app, "POST", "/images/batch", body, headers)
+                zipped = time.perf_counter() - start
+                print(f"POST /images/batch (zip of {args.images}): {zipped:.2f}s "
+                      f"({args.images / zipped:.1f} images/s, {single / zipped:.2f}x), status {status}")
+
+        asyncio.run(run())
+
+
+def load_fixture_images(fixtures_dir: str):
+    """Read every image in a fixture directory, sorted by name, as BGR arrays."""
+    images = []
+    for name in sorted(os.listdir(fixtures_dir)):
+        img = cv2.imread(os.path.join(fixtures_dir, name), cv2.IMREAD_COLOR)
+        if img is not None:
+            images.append((name, img))
+    return images
+
+
+def bench_detectors(args):
+    """Per-image latency of each detector backend and its agreement with the most accurate one."""
+    from cache import ResultCache
+    from inference import DETECTOR_PROFILES, analyze_frames_batched, registry
+
+    if args.fixtures and os.path.isdir(args.fixtures):
+        images = load_fixture_images(args.fixtures)
+    else:
+        print(f"fixture directory '{args.fixtures}' not found, using synthetic frames")
+        images = [(f"synthetic_{i}", frame) for i, frame in enumerate(synthetic_frames(args.frames))]
+    if not images:
+        raise SystemExit("no images to benchmark")
+
+    registry.load()
+    # Every image must go through detection, so the result cache stays out of the way
+    no_cache = ResultCache(enabled=False)
+    profiles = {backend: profile for profile, backend in DETECTOR_PROFILES.items()}
+    reference_backend = DETECTOR_PROFILES["accurate"]
+    backends = [reference_backend] + [b for b in args.backends if b != reference_backend]
+
+    results = {}
+    for backend in backends:
+        # Build the detector and run one image so model loading is not timed
+        analyze_frames_batched([images[0][1]], batch_size=1, cache=no_cache, detector_backend=backend)
+
+        start = time.perf_counter()
+        analyses = [
+            analyze_frames_batched([img], batch_size=1, cache=no_cache, detector_backend=backend)[0]
+            for _, img in images
+        ]
+        elapsed = time.perf_counter() - start
+        results[backend] = analyses
+
+        found = sum(1 for a in analyses if a and a.get("face_confidence"))
+        line = (f"{backend:<11} ({profiles.get(backend, '-')}): {elapsed / len(images) * 1000:.1f} ms/image, "
+                f"faces found {found}/{len(images)}")
+        if backend != reference_backend:
+            agree = sum(
+                1 for a, ref in zip(analyses, results[reference_backend])
+                if a and ref and a["dominant_emotion"] == ref["dominant_emotion"]
+            )
+            line += f", dominant emotion agrees with {reference_backend} on {agree}/{len(images)}"
+        print(line)
+
+
+def bench_face_reuse(args):
+    """Speedup and result drift of propagating face boxes between detections."""
+    from cache import ResultCache
+    from inference import EMOTION_LABELS, analyze_frames_batched, registry
+    from tracking import FaceBoxPropagator, box_iou
+
+    if args.video:
+        frames = sampled_frames(args.video, args.frame_interval)
+    else:
+        print("no --video given, using synthetic frames (the detector may find no faces in them)")
+        frames = [cv2.cvtColor(f, cv2.COLOR_BGR2RGB) for f in synthetic_frames(args.frames)]
+
+    registry.load()
+    no_cache = ResultCache(enabled=False)
+
+    def run(propagator=None):
+        start = time.perf_counter()
+        analyses = []
+        for i in range(0, len(frames), args.batch_size):
+            analyses.extend(analyze_frames_batched(
+                frames[i:i + args.batch_size], batch_size=args.batch_size,
+                cache=no_cache, propagator=propagator
+            ))
+        return time.perf_counter() - start, analyses
+
+    baseline_time, baseline = run()
+    print(f"detect every frame: {len(frames)} frames in {baseline_time:.2f}s "
+          f"({len(frames) / baseline_time:.1f} frames/s)")
+
+    for detect_every in args.detect_every:
+        propagator = FaceBoxPropagator(detect_every)
+        elapsed, analyses = run(propagator)
+
+        pairs = [(a, b) for a, b in zip(baseline, analyses) if a and b]
+        agree = sum(1 for a, b in pairs if a["dominant_emotion"] == b["dominant_emotion"])
+        score_drift = np.mean([
+            np.abs([a["emotion"][e] - b["emotion"][e] for e in EMOTION_LABELS]).mean() for a, b in pairs
+        ]) if pairs else 0.0
+        box_overlap = np.mean([box_iou(a["region"], b["region"]) for a, b in pairs]) if pairs else 0.0
+
+        print(f"detect_every={detect_every}: {elapsed:.2f}s ({len(frames) / elapsed:.1f} frames/s), "
+              f"speedup {baseline_time / elapsed:.2f}x, detections {propagator.detections}, "
+              f"propagated {propagator.propagations}, lost {propagator.lost}; "
+              f"dominant emotion agrees on {agree}/{len(pairs)}, "
+              f"mean score drift {score_drift:.2f} points, mean box IoU {box_overlap:.2f}")
+
+
+def write_scene_video(path: str, seconds: float, scene_seconds: float, fps: int = 30,
+                      width: int = 640, height: int = 480):
+    """Write a synthetic video of static shots with a slowly drifting blob and hard cuts between them."""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, (width, height))
+    rng = np.random.default_rng(0)
+    scene_frames = max(1, int(scene_seconds * fps))
+    for i in range(int(seconds * fps)):
+        if i % scene_frames == 0:
+            background = np.full((height, width, 3), rng.integers(0, 255, size=3), dtype=np.uint8)
+        frame = background.copy()
+        offset = (i % scene_frames) // 10
+        cv2.ellipse(frame, (width // 2 + offset, height // 2), (90, 120), 0, 0, 360, (180, 200, 230), -1)
+        writer.write(frame)
+    writer.release()
+
+
+def bench_adaptive(args):
+    """Analyzed-frame count and wall time of adaptive sampling against a fixed stride."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        video = args.video
+        if not video:
+            video = os.path.join(tmp_dir, "scenes.avi")
+            write_scene_video(video, seconds=args.seconds, scene_seconds=args.scene_seconds)
+
+        if args.analyze:
+            # Frame JPEGs of both runs go to a throwaway blob store
+            os.environ["EMOTION_BLOB_DIR"] = os.path.join(tmp_dir, "blobs")
+            os.environ["EMOTION_RESULT_CACHE"] = "0"
+            from analysis import analyze_video_file
+            from helpers import aggregate_emotions_weighted
+            from inference import registry
+            registry.load()
+
+            def run(adaptive):
+                result = analyze_video_file(video, args.frame_interval, args.batch_size, adaptive=adaptive)
+                return len(result["frame_analyses"]), aggregate_emotions_weighted(result["frame_analyses"])
+        else:
+            from sampling import iter_adaptive_frames, iter_sampled_frames
+
+            def run(adaptive):
+                cap = cv2.VideoCapture(video)
+                fps = cap.get(cv2.CAP_PROP_FPS)
+                if adaptive:
+                    sampled = sum(1 for _ in iter_adaptive_frames(cap, fps))
+                else:
+                    sampled = sum(1 for _ in iter_sampled_frames(cap, float(args.frame_interval)))
+                cap.release()
+                return sampled, None
+
+        total_frames = int(cv2.VideoCapture(video).get(cv2.CAP_PROP_FRAME_COUNT))
+        print(f"video: {video} ({total_frames} frames), {'decode and analysis' if args.analyze else 'decode only'}")
+        for name, adaptive in ((f"fixed stride {args.frame_interval}", False), ("adaptive", True)):
+            start = time.perf_counter()
+            sampled, aggregated = run(adaptive)
+            elapsed = time.perf_counter() - start
+            print(f"{name:>16}: {sampled} frames analyzed in {elapsed:.2f}s")
+            if aggregated:
+                print(f"{'':>16}  dominant emotion {aggregated['dominant_emotion']} "
+                      f"({aggregated['dominant_average_confidence']})")
+
+
+def synthetic_frame_analyses(count: int, seed: int = 0):
+    """frame_analyses entries with random emotion distributions, one per sampled frame at 1 fps."""
+    from aggregation import top_k_rows
+    rng = np.random.default_rng(seed)
+    scores = (rng.dirichlet(np.ones(len(EMOTIONS)), size=count) * 100).astype(np.float32)
+    return [
+        {
+            "frame": i * 30,
+            "timestamp": float(i),
+            "top_k_emotions": top_k,
+            "emotions": dict(zip(EMOTIONS, row)),
+        }
+        for i, (row, top_k) in enumerate(zip(scores.tolist(), top_k_rows(scores, k=3)))
+    ]
+
+
+def legacy_aggregate(frame_analyses: list):
+    """The per-dict, top-3-only aggregation loop that EmotionAccumulator replaced."""
+    scores = {}
+    for i, frame in enumerate(frame_analyses):
+        if i < len(frame_analyses) - 1:
+            duration = frame_analyses[i + 1]["timestamp"] - frame["timestamp"]
+        else:
+            duration = 1.0
+        for emotion_data in frame.get("top_k_emotions", []):
+            data = scores.setdefault(emotion_data["emotion"], {"total_weight": 0, "weighted_sum": 0, "scores": []})
+            data["weighted_sum"] += emotion_data["confidence"] * duration
+            data["total_weight"] += duration
+            data["scores"].append(emotion_data["confidence"])
+    return {
+        emotion: {
+            "average": round(data["weighted_sum"] / data["total_weight"], 2),
+            "simple_average": round(np.mean(data["scores"]), 2),
+            "max": round(np.max(data["scores"]), 2),
+            "min": round(np.min(data["scores"]), 2),
+            "std": round(np.std(data["scores"]), 2),
+        }
+        for emotion, data in scores.items()
+    }
+
+
+def bench_aggregation(args):
+    """Legacy dict aggregation against the columnar accumulator, in one pass and streamed in batches."""
+    from aggregation import EmotionAccumulator, emotion_matrix
+
+    frame_analyses = synthetic_frame_analyses(args.frames)
+    print(f"{args.frames} sampled frames")
+
+    legacy_time = timed(lambda: legacy_aggregate(frame_analyses), repeat=args.repeat)
+    print(f"legacy dict loop (top-3 only): {legacy_time:.1f} ms")
+
+    columnar_time = timed(
+        lambda: EmotionAccumulator.from_frame_analyses(frame_analyses, keep_frames=False).summary(),
+        repeat=args.repeat
+    )
+    print(f"accumulator from frame dicts: {columnar_time:.1f} ms ({legacy_time / columnar_time:.2f}x)")
+
+    timestamps, scores = emotion_matrix(frame_analyses)
+
+    def from_matrix():
+        accumulator = EmotionAccumulator(keep_frames=False)
+        accumulator.extend(timestamps, scores)
+        return accumulator.summary()
+
+    matrix_time = timed(from_matrix, repeat=args.repeat)
+    print(f"accumulator from score matrix: {matrix_time:.1f} ms ({legacy_time / matrix_time:.2f}x)")
+
+    def streamed():
+        accumulator = EmotionAccumulator(keep_frames=False)
+        for start in range(0, len(timestamps), args.batch_size):
+            accumulator.extend(timestamps[start:start + args.batch_size], scores[start:start + args.batch_size])
+        return accumulator.summary()
+
+    streamed_time = timed(streamed, repeat=args.repeat)
+    print(f"incremental, {args.batch_size}-frame batches: {streamed_time:.1f} ms "
+          f"({streamed_time / len(timestamps) * 1000:.2f} us/frame)")
+
+    legacy = legacy_aggregate(frame_analyses)
+    columnar = streamed()["emotions"]
+    for emotion in EMOTIONS:
+        top3 = legacy[emotion]["average"] if emotion in legacy else float("nan")
+        print(f"  {emotion:>8}: average {top3:6.2f} over frames where it was in the top 3, "
+              f"{columnar[emotion]['average']:6.2f} over all frames")
+
+
+def seed_video_frames(engine, frames: int, fps: float = 30.0, seed: int = 0) -> int:
+    """Insert one video analysis with `frames` analyzed frames (one per source frame). Returns its id."""
+    import json
+    from aggregation import top_k_rows
+    from models import EMOTION_COLUMNS, VideoAnalysis, VideoFrame
+
+    rng = np.random.default_rng(seed)
+    with engine.begin() as conn:
+        video_id = conn.execute(VideoAnalysis.__table__.insert().values(
+            filename="hour_long.mp4",
+            file_type="video/mp4",
+            duration_seconds=frames / fps,
+            total_frames=frames,
+            analyzed_frames=frames,
+            fps=fps,
+            frame_interval=1,
+            dominant_emotion="happy",
+            dominant_confidence=50.0,
+            aggregated_data="{}",
+        )).inserted_primary_key[0]
+
+        for offset in range(0, frames, 5000):
+            count = min(5000, frames - offset)
+            scores = (rng.dirichlet(np.ones(len(EMOTION_COLUMNS)), size=count) * 100).astype(np.float32)
+            rows = []
+            for i, (row, top_k) in enumerate(zip(scores.tolist(), top_k_rows(scores, k=3))):
+                rows.append({
+                    "video_id": video_id,
+                    "frame_number": offset + i,
+                    "timestamp": round((offset + i) / fps, 2),
+                    "dominant_emotion": top_k[0]["emotion"],
+                    "dominant_confidence": top_k[0]["confidence"],
+                    "emotions_data": json.dumps(top_k),
+                    "frame_blob": "0" * 64,
+                    **dict(zip(EMOTION_COLUMNS, row)),
+                })
+            conn.execute(VideoFrame.__table__.insert(), rows)
+    return video_id
+
+
+def bench_timeline(args):
+    """Payload size and latency of a full video timeline against time windows and downsampled ones."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        app = load_app(tmp_dir)
+        from database import engine, init_db
+        init_db()
+        video_id = seed_video_frames(engine, args.frames)
+        duration = args.frames / 30.0
+        print(f"video with {args.frames} analyzed frames ({duration / 60:.0f} minutes at 30 fps)")
+
+        queries = [
+            ("full timeline", ""),
+            (f"lttb {args.points} points", f"?points={args.points}"),
+            (f"bucket {args.points} points", f"?points={args.points}&method=bucket"),
+            ("60 s window", f"?start={duration / 2:.0f}&end={duration / 2 + 60:.0f}"),
+            (f"60 s window, lttb {args.points}", f"?start={duration / 2:.0f}&end={duration / 2 + 60:.0f}&points={args.points}"),
+        ]
+
+        async def run():
+            for name, query in queries:
+                best = float("inf")
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    status, _, body = await asgi_request(app, "GET", f"/video/{video_id}{query}")
+                    best = min(best, time.perf_counter() - start)
+                print(f"{name:>28}: {best * 1000:8.1f} ms, {len(body) / 1024:9.1f} KB, status {status}")
+
+        asyncio.run(run())
+
+
+def wait_until_ready(port: int, workers: int, timeout: float = 600):
+    """Poll /ready until enough consecutive answers are 200 that every worker has likely loaded its models."""
+    import http.client
+
+    deadline = time.time() + timeout
+    streak = 0
+    while streak < 3 * workers:
+        if time.time() > deadline:
+            raise SystemExit(f"server on port {port} did not become ready")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            conn.request("GET", "/ready")
+            status = conn.getresponse().status
+            conn.close()
+        except OSError:
+            status = None
+        streak = streak + 1 if status == 200 else 0
+        time.sleep(0.05 if status == 200 else 1)
+
+
+def bench_workers(args):
+    """Throughput and latency of serve.py over real HTTP as the number of server processes grows."""
+    import http.client
+    import subprocess
+    import sys
+    from concurrent.futures import ThreadPoolExecutor
+    from sqlalchemy import create_engine
+    from models import Base
+
+    server_dir = os.path.dirname(os.path.abspath(__file__))
+    images = synthetic_jpegs(args.requests, "load")
+
+    def request(port, i):
+        """Alternate history reads with image analyses. Returns (latency, status)."""
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=600)
+        if i % args.write_every == 0:
+            filename, data = images[i]
+            body, headers = multipart_body(files=[("file", f"{port}_{filename}", "image/jpeg", data)])
+            method, path = "POST", "/image"
+        else:
+            body, headers, method, path = None, {}, "GET", "/images?limit=50"
+        start = time.perf_counter()
+        conn.request(method, path, body=body, headers=headers)
+        response = conn.getresponse()
+        response.read()
+        conn.close()
+        return time.perf_counter() - start, response.status
+
+    for workers in args.workers:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            engine = create_engine(f"sqlite:///{os.path.join(tmp_dir, 'emotion_analysis.db')}")
+            Base.metadata.create_all(engine)
+            seed_history(engine, args.rows)
+            engine.dispose()
+
+            port = args.port + workers
+            env = dict(os.environ, PYTHONPATH=server_dir, EMOTION_SERVER_WORKERS=str(workers))
+            server = subprocess.Popen(
+                [sys.executable, os.path.join(server_dir, "serve.py"), "--workers", str(workers), "--port", str(port)],
+                cwd=tmp_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+            try:
+                wait_until_ready(port, workers)
+                start = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+                    results = list(executor.map(lambda i: request(port, i), range(args.requests)))
+                elapsed = time.perf_counter() - start
+            finally:
+                server.terminate()
+                server.wait()
+
+        latencies = np.array([latency for latency, _ in results]) * 1000
+        rejected = sum(1 for _, status in results if status == 503)
+        errors = sum(1 for _, status in results if status >= 400) - rejected
+        print(f"workers={workers}: {args.requests / elapsed:.1f} req/s, "
+              f"p50 {np.percentile(latencies, 50):.0f} ms, p95 {np.percentile(latencies, 95):.0f} ms, "
+              f"{rejected} rejected with 503, {errors} other errors")
+
+
+class RssSampler:
+    """Samples the resident set size of this process in a background thread and keeps the peak."""
+
+    def __init__(self, interval: float = 0.05):
+        import threading
+        self.interval = interval
+        self.peak_bytes = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @staticmethod
+    def current_bytes() -> int:
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError):
+            import resource
+            # Not Linux: fall back to the lifetime peak (kilobytes on Linux, bytes on macOS)
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak_bytes = max(self.peak_bytes, self.current_bytes())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak_bytes = self.current_bytes()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+async def run_scenario(app, make_request, requests: int, concurrency: int) -> dict:
+    """Send `requests` ASGI requests, `concurrency` at a time, and summarize their latencies."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    statuses = []
+
+    async def one(i):
+        method, path, body, headers = make_request(i)
+        async with semaphore:
+            start = time.perf_counter()
+            status, _, _ = await asgi_request(app, method, path, body, headers)
+            latencies.append(time.perf_counter() - start)
+            statuses.append(status)
+
+    with RssSampler() as rss:
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - start
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": sum(1 for status in statuses if status >= 400),
+        "throughput_rps": round(requests / elapsed, 2),
+        "latency_ms": {
+            "p50": round(float(np.percentile(latencies_ms, 50)), 2),
+            "p95": round(float(np.percentile(latencies_ms, 95)), 2),
+            "p99": round(float(np.percentile(latencies_ms, 99)), 2),
+            "mean": round(float(latencies_ms.mean()), 2),
+            "max": round(float(latencies_ms.max()), 2),
+        },
+        "peak_rss_mb": round(rss.peak_bytes / (1024 * 1024), 1),
+    }
+
+
+def git_commit() -> str:
+    import subprocess
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(baseline: dict, current: dict):
+    """Print throughput and p95 changes of every scenario found in both result files."""
+    previous = {(r["db_rows"], r["scenario"]): r for r in baseline["results"]}
+    print(f"\nchanges against {baseline.get('commit') or 'baseline'}:")
+    for result in current["results"]:
+        before = previous.get((result["db_rows"], result["scenario"]))
+        if before is None:
+            continue
+        throughput = (result["throughput_rps"] / before["throughput_rps"] - 1) * 100
+        p95 = (result["latency_ms"]["p95"] / before["latency_ms"]["p95"] - 1) * 100
+        print(f"{result['db_rows']:>8} rows {result['scenario']:>14}: throughput {throughput:+6.1f}%, p95 {p95:+6.1f}%")
+
+
+def bench_suite(args):
+    """Concurrent load on the main endpoints through the ASGI app at several database sizes."""
+    import json
+    from datetime import datetime
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        video_path = os.path.join(tmp_dir, "suite.avi")
+        write_synthetic_video(video_path, seconds=args.video_seconds, width=320, height=240)
+        with open(video_path, "rb") as f:
+            video_bytes = f.read()
+
+        # Every video request posts the same bytes; with the result cache on, all but
+        # the first would time content-hash cache hits instead of analysis
+        os.environ["EMOTION_RESULT_CACHE"] = "0"
+        app = load_app(tmp_dir)
+        from database import engine, init_db
+        init_db()
+        video_id = seed_video_frames(engine, args.video_frames)
+
+        def post_image(i):
+            filename, data = images[i]
+            body, headers = multipart_body(files=[("file", filename, "image/jpeg", data)])
+            return "POST", "/image", body, headers
+
+        def post_video(i):
+            body, headers = multipart_body(
+                fields={"frame_interval": 15},
+                files=[("file", f"suite_{seeded}_{i}.avi", "video/x-msvideo", video_bytes)]
+            )
+            return "POST", "/video", body, headers
+
+        scenarios = {
+            "image": (post_image, args.requests),
+            "video": (post_video, args.video_requests),
+            "images": (lambda i: ("GET", "/images?limit=100", b"", {}), args.requests),
+            "videos": (lambda i: ("GET", "/videos?limit=100", b"", {}), args.requests),
+            "video_detail": (lambda i: ("GET", f"/video/{video_id}?points=300", b"", {}), args.requests),
+        }
+        selected = args.scenarios or list(scenarios)
+
+        report = {
+            "commit": git_commit(),
+            "created_at": datetime.utcnow().isoformat(),
+            "settings": {
+                "requests": args.requests,
+                "video_requests": args.video_requests,
+                "concurrency": args.concurrency,
+                "video_frames": args.video_frames,
+                "result_cache": False,
+            },
+            "results": [],
+        }
+
+        async def run():
+            nonlocal images, seeded
+            async with app.router.lifespan_context(app):
+                for size in sorted(args.sizes):
+                    # The database only grows, so each size adds the missing rows
+                    seed_history(engine, size - seeded, seed=size)
+                    seeded = size
+                    # New pixels for every size, so uploads are not answered from the result cache
+                    images = synthetic_jpegs(args.requests, f"suite_{size}", seed=size)
+                    for name in selected:
+                        make_request, requests = scenarios[name]
+                        result = await run_scenario(app, make_request, requests, args.concurrency)
+                        report["results"].append({"db_rows": size, "scenario": name, **result})
+                        latency = result["latency_ms"]
+                        print(f"{size:>8} rows {name:>14}: {result['throughput_rps']:8.1f} req/s, "
+                              f"p50 {latency['p50']:8.1f} ms, p95 {latency['p95']:8.1f} ms, "
+                              f"p99 {latency['p99']:8.1f} ms, peak RSS {result['peak_rss_mb']:.0f} MB, "
+                              f"{result['errors']} errors")
+
+        images, seeded = [], 0
+        asyncio.run(run())
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare_results(json.load(f), report)
+
+
+def bench_sharding(args):
+    """Wall time of segment-sharded video analysis as the process pool grows, checked against the sequential path."""
+    os.environ["EMOTION_RESULT_CACHE"] = "0"  # Spawned workers inherit this, so every run does the inference
+    video = os.path.abspath(args.video) if args.video else None
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.chdir(tmp_dir)  # Frame blobs go to a throwaway store
+        if video is None:
+            print("no --video given, using a synthetic video (the detector may find no faces in it)")
+            video = os.path.join(tmp_dir, "sharding.avi")
+            write_synthetic_video(video, seconds=args.seconds)
+
+        from analysis import analyze_video_file
+        from sharding import analyze_video_sharded
+        from workers import AnalysisPool
+
+        def run_on(pool):
+            return lambda fn, *fn_args, timings=None: pool.run(fn, *fn_args)
+
+        async def analyze(workers: int, sharded: bool):
+            pool = AnalysisPool(mode="process", workers=workers, max_queued=workers)
+            pool.start()  # Spawns the workers and loads their models, not timed
+            try:
+                start = time.perf_counter()
+                if sharded:
+                    result = await analyze_video_sharded(
+                        run_on(pool), video, args.frame_interval, args.batch_size, workers
+                    )
+                else:
+                    result = await pool.run(analyze_video_file, video, args.frame_interval, args.batch_size)
+                return time.perf_counter() - start, result
+            finally:
+                pool.shutdown()
+
+        baseline_time, baseline = asyncio.run(analyze(1, sharded=False))
+        frames = [f["frame"] for f in baseline["frame_analyses"]]
+        print(f"sequential: {len(frames)} frames in {baseline_time:.2f}s ({len(frames) / baseline_time:.1f} frames/s)")
+
+        for workers in args.workers:
+            elapsed, result = asyncio.run(analyze(workers, sharded=True))
+            same_frames = [f["frame"] for f in result["frame_analyses"]] == frames
+            same_aggregate = result["aggregated"] == baseline["aggregated"]
+            print(f"workers={workers}: {elapsed:.2f}s ({len(frames) / elapsed:.1f} frames/s), "
+                  f"speedup {baseline_time / elapsed:.2f}x, "
+                  f"frames {'identical' if same_frames else 'DIFFER'}, "
+                  f"aggregate {'identical' if same_aggregate else 'DIFFERS'}")
+
+
+def bench_quantization(args):
+    """Speedup, memory and top-1 agreement of the reduced-precision emotion models against the Keras model."""
+    from inference import registry
+    from quantized import face_inputs, load_emotion_model, synthetic_faces
+
+    registry.load()
+    keras_model = registry.emotion_model if registry.precision == "float32" else None
+    if keras_model is None:
+        raise SystemExit("run with EMOTION_MODEL_PRECISION=float32, the Keras model is the reference")
+
+    if args.fixtures and os.path.isdir(args.fixtures):
+        faces = face_inputs([img for _, img in load_fixture_images(args.fixtures)])
+        print(f"{len(faces)} faces detected in {args.fixtures}")
+    else:
+        print(f"fixture directory '{args.fixtures}' not found, using synthetic faces (agreement is not meaningful)")
+        faces = synthetic_faces(args.faces, seed=1)
+    if not len(faces):
+        raise SystemExit("no faces to validate on")
+
+    def run(model):
+        model.predict(faces[:args.batch_size], batch_size=args.batch_size, verbose=0)  # Warm-up, not timed
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            predictions = model.predict(faces, batch_size=args.batch_size, verbose=0)
+            best = min(best, time.perf_counter() - start)
+        return best, np.asarray(predictions)
+
+    reference_time, reference = run(keras_model)
+    reference_top1 = reference.argmax(axis=1)
+    reference_bytes = sum(w.nbytes for w in keras_model.get_weights())
+    print(f"float32 (Keras): {reference_time / len(faces) * 1000:.3f} ms/face, "
+          f"weights {reference_bytes / 1024 / 1024:.1f} MB")
+
+    for precision in args.precisions:
+        rss_before = RssSampler.current_bytes()
+        # The fixture faces calibrate int8, and the cached model is replaced with this conversion
+        model = load_emotion_model(keras_model, precision, calibration=faces, rebuild=True)
+        elapsed, predictions = run(model)
+        rss_growth = RssSampler.current_bytes() - rss_before
+        agreement = float((predictions.argmax(axis=1) == reference_top1).mean())
+        drift = float(np.abs(predictions - reference).mean() * 100)
+        print(f"{precision:>7} (TFLite): {elapsed / len(faces) * 1000:.3f} ms/face, "
+              f"speedup {reference_time / elapsed:.2f}x, model {model.size_bytes / 1024 / 1024:.1f} MB "
+              f"({(1 - model.size_bytes / reference_bytes) * 100:.0f}% smaller), "
+              f"RSS +{rss_growth / 1024 / 1024:.1f} MB after loading and running, "
+              f"top-1 agreement {agreement * 100:.1f}%, mean probability drift {drift:.2f} points")
+
+
+def bench_frames(args):
+    """Analysis time and bytes stored per frame for each frame storage mode, and on-demand frame extraction."""
+    os.environ["EMOTION_RESULT_CACHE"] = "0"  # Every mode must do the same inference work
+    video = os.path.abspath(args.video) if args.video else None
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.chdir(tmp_dir)  # Frame images go to a throwaway blob store
+        if video is None:
+            print("no --video given, using a synthetic 1280x720 video")
+            video = os.path.join(tmp_dir, "frames.avi")
+            write_synthetic_video(video, seconds=args.seconds, width=1280, height=720)
+
+        from analysis import analyze_video_file
+        from frames import FrameCache, render_video_frame
+        from inference import registry
+        from metrics import StageTimings
+        from storage import blob_store
+
+        registry.load()
+        for mode in ("full", "thumbnail", "none"):
+            timings = StageTimings()
+            start = time.perf_counter()
+            result = analyze_video_file(video, args.frame_interval, args.batch_size, timings=timings, frame_storage=mode)
+            elapsed = time.perf_counter() - start
+
+            frames = result["frame_analyses"]
+            refs = {f["frame_blob"] for f in frames if f["frame_blob"]}
+            stored = sum(os.path.getsize(blob_store.path(ref)) for ref in refs)
+            if mode == "none":
+                stored = os.path.getsize(video)  # The source video is kept instead
+            encode_ms = (timings.seconds.get("encode", 0) + timings.seconds.get("storage", 0)) * 1000
+            print(f"{mode:>9}: {elapsed:.2f}s for {len(frames)} frames, "
+                  f"encode + store {encode_ms / max(len(frames), 1):.2f} ms/frame, "
+                  f"{stored / max(len(frames), 1) / 1024:.1f} KB stored per frame")
+
+        cache = FrameCache()
+        frame_numbers = [f["frame"] for f in frames[:args.renders]]
+        for label in ("cold", "cached"):
+            start = time.perf_counter()
+            for frame_number in frame_numbers:
+                render_video_frame(video, "benchmark", frame_number, cache=cache)
+            elapsed = time.perf_counter() - start
+            print(f"on-demand frame ({label}): {elapsed / max(len(frame_numbers), 1) * 1000:.2f} ms/frame")
+
+
+# Modules the read-only API process must never import
+HEAVY_MODULES = ("tensorflow", "deepface", "cv2", "PIL")
+
+# Run in a fresh interpreter: time one app import, then report RSS and the heavy modules it loaded
+STARTUP_PROBE = """
+import json, os, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+with open("/proc/self/statm") as f:
+    rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+heavy = [name for name in {heavy!r} if name in sys.modules]
+print(json.dumps({{"seconds": seconds, "rss_bytes": rss, "heavy": heavy}}))
+"""
+
+
+def parse_importtime(stderr: str) -> list:
+    """(cumulative seconds, module) of the top-level imports in `python -X importtime` output."""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not name.startswith("  "):  # Nested imports are indented below their parent
+            imports.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(imports, reverse=True)
+
+
+def bench_startup(args):
+    """
+    Import time and idle RSS of the read-only app vs the full app, each in a
+    fresh interpreter with -X importtime. Fails when the read app imports an
+    analysis library or takes longer than --max-read-seconds.
+    """
+    import json
+    import subprocess
+    import sys
+
+    server_dir = os.path.dirname(os.path.abspath(__file__))
+    failures = []
+    for role, module in (("read", "read_app"), ("all", "main")):
+        runs = []
+        for _ in range(args.repeats):
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                proc = subprocess.run(
+                    [sys.executable, "-X", "importtime", "-c", STARTUP_PROBE.format(module=module, heavy=HEAVY_MODULES)],
+                    cwd=tmp_dir, env=dict(os.environ, PYTHONPATH=server_dir), capture_output=True, text=True
+                )
+            if proc.returncode != 0:
+                raise SystemExit(f"importing {module} failed:\n{proc.stderr[-2000:]}")
+            runs.append((json.loads(proc.stdout.strip().splitlines()[-1]), parse_importtime(proc.stderr)))
+
+        # The first run may also compile bytecode; report the fastest
+        result, imports = min(runs, key=lambda run: run[0]["seconds"])
+        print(f"{role:>4} ({module}): import {result['seconds'] * 1000:.0f} ms, "
+              f"RSS {result['rss_bytes'] / 1024 / 1024:.0f} MB, "
+              f"heavy modules: {', '.join(result['heavy']) or 'none'}")
+        for seconds, name in imports[:args.top]:
+            print(f"      {seconds * 1000:8.1f} ms  {name}")
+
+        if role == "read":
+            if result["heavy"]:
+                failures.append(f"read_app imported {', '.join(result['heavy'])}")
+            if result["seconds"] > args.max_read_seconds:
+                failures.append(f"read_app import took {result['seconds']:.2f}s (limit {args.max_read_seconds}s)")
+
+    if failures:
+        raise SystemExit("FAIL: " + "; ".join(failures))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    batching = subparsers.add_parser("batching", help="per-frame vs batched video inference")
+    batching.add_argument("--video", help="video file to sample (synthetic frames if omitted)")
+    batching.add_argument("--frames", type=int, default=64, help="number of synthetic frames")
+    batching.add_argument("--frame-interval", type=int, default=30)
+    batching.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 16, 32])
+    batching.set_defaults(func=bench_batching)
+
+    upload_memory = subparsers.add_parser("upload-memory", help="peak memory of saving a large video upload")
+    upload_memory.add_argument("--size-mb", type=int, default=512, help="size of the synthetic upload")
+    upload_memory.set_defaults(func=bench_upload_memory)
+
+    sampling = subparsers.add_parser("sampling", help="decode throughput of frame sampling strategies")
+    sampling.add_argument("--video", help="video file to decode (synthetic video if omitted)")
+    sampling.add_argument("--seconds", type=float, default=60, help="length of the synthetic video")
+    sampling.add_argument("--intervals", type=int, nargs="+", default=[1, 5, 30, 120])
+    sampling.set_defaults(func=bench_sampling)
+
+    history = subparsers.add_parser("history", help="history listing latency on a seeded database")
+    history.add_argument("--rows", type=int, default=100000)
+    history.add_argument("--page-size", type=int, default=100)
+    history.add_argument("--blob-kb", type=int, default=2, help="inline image_data per row, as in un-migrated databases")
+    history.set_defaults(func=bench_history)
+
+    image_batch = subparsers.add_parser("image-batch", help="single-image endpoint vs batch endpoint throughput")
+    image_batch.add_argument("--images", type=int, default=200)
+    image_batch.add_argument("--batch-size", type=int, default=16)
+    image_batch.set_defaults(func=bench_image_batch)
+
+    detectors = subparsers.add_parser("detectors", help="latency and agreement of face detector backends")
+    detectors.add_argument("--fixtures", default="fixtures/faces", help="directory of labelled face images")
+    detectors.add_argument("--frames", type=int, default=32, help="number of synthetic frames without fixtures")
+    detectors.add_argument("--backends", nargs="+", default=["opencv", "ssd", "mtcnn", "retinaface"])
+    detectors.set_defaults(func=bench_detectors)
+
+    face_reuse = subparsers.add_parser("face-reuse", help="optical-flow box propagation vs detecting every frame")
+    face_reuse.add_argument("--video", help="video file to sample (synthetic frames if omitted)")
+    face_reuse.add_argument("--frames", type=int, default=64, help="number of synthetic frames")
+    face_reuse.add_argument("--frame-interval", type=int, default=5)
+    face_reuse.add_argument("--batch-size", type=int, default=16)
+    face_reuse.add_argument("--detect-every", type=int, nargs="+", default=[2, 4, 8])
+    face_reuse.set_defaults(func=bench_face_reuse)
+
+    adaptive = subparsers.add_parser("adaptive", help="adaptive scene-change sampling vs a fixed stride")
+    adaptive.add_argument("--video", help="video file to sample (synthetic video with cuts if omitted)")
+    adaptive.add_argument("--seconds", type=float, default=120, help="length of the synthetic video")
+    adaptive.add_argument("--scene-seconds", type=float, default=8, help="shot length of the synthetic video")
+    adaptive.add_argument("--frame-interval", type=int, default=30)
+    adaptive.add_argument("--batch-size", type=int, default=16)
+    adaptive.add_argument("--analyze", action="store_true", help="also run inference (needs the models)")
+    adaptive.set_defaults(func=bench_adaptive)
+
+    aggregation = subparsers.add_parser("aggregation", help="emotion aggregation over many sampled frames")
+    aggregation.add_argument("--frames", type=int, default=100000)
+    aggregation.add_argument("--batch-size", type=int, default=16, help="frames per incremental update")
+    aggregation.add_argument("--repeat", type=int, default=3)
+    aggregation.set_defaults(func=bench_aggregation)
+
+    timeline = subparsers.add_parser("timeline", help="video detail latency and payload, full vs downsampled")
+    timeline.add_argument("--frames", type=int, default=108000, help="analyzed frames (108000 = one hour at 30 fps)")
+    timeline.add_argument("--points", type=int, default=300)
+    timeline.add_argument("--repeat", type=int, default=3)
+    timeline.set_defaults(func=bench_timeline)
+
+    workers = subparsers.add_parser("workers", help="load test of serve.py with growing worker counts")
+    workers.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    workers.add_argument("--requests", type=int, default=400)
+    workers.add_argument("--concurrency", type=int, default=16, help="concurrent client connections")
+    workers.add_argument("--write-every", type=int, default=4, help="every Nth request is a POST /image")
+    workers.add_argument("--rows", type=int, default=10000, help="seeded history rows")
+    workers.add_argument("--port", type=int, default=8100, help="base port, offset by the worker count")
+    workers.set_defaults(func=bench_workers)
+
+    suite = subparsers.add_parser("suite", help="concurrent endpoint load test with percentiles, RSS and JSON output")
+    suite.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="seeded history rows")
+    suite.add_argument("--scenarios", nargs="+", choices=["image", "video", "images", "videos", "video_detail"])
+    suite.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    suite.add_argument("--video-requests", type=int, default=10, help="requests of the POST /video scenario")
+    suite.add_argument("--video-seconds", type=float, default=5, help="length of the uploaded synthetic video")
+    suite.add_argument("--video-frames", type=int, default=108000, help="frames of the video behind /video/{id}")
+    suite.add_argument("--concurrency", type=int, default=8)
+    suite.add_argument("--output", help="write results as JSON to this file")
+    suite.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    suite.set_defaults(func=bench_suite)
+
+    sharding = subparsers.add_parser("sharding", help="segment-sharded video analysis on 1..N worker processes")
+    sharding.add_argument("--video", help="video file (defaults to a synthetic clip)")
+    sharding.add_argument("--seconds", type=float, default=120, help="length of the synthetic clip")
+    sharding.add_argument("--frame-interval", type=int, default=5)
+    sharding.add_argument("--batch-size", type=int, default=16)
+    sharding.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    sharding.set_defaults(func=bench_sharding)
+
+    quantization = subparsers.add_parser("quantization", help="validate the float16/int8 emotion models against Keras")
+    quantization.add_argument("--fixtures", default="fixtures/faces", help="directory of face images")
+    quantization.add_argument("--faces", type=int, default=500, help="synthetic faces when there are no fixtures")
+    quantization.add_argument("--precisions", nargs="+", choices=["float16", "int8"], default=["float16", "int8"])
+    quantization.add_argument("--batch-size", type=int, default=16)
+    quantization.add_argument("--repeat", type=int, default=5)
+    quantization.set_defaults(func=bench_quantization)
+
+    frames = subparsers.add_parser("frames", help="frame image storage modes: analysis time, bytes and on-demand extraction")
+    frames.add_argument("--video", help="video file (defaults to a synthetic 720p clip)")
+    frames.add_argument("--seconds", type=float, default=60, help="length of the synthetic clip")
+    frames.add_argument("--frame-interval", type=int, default=15)
+    frames.add_argument("--batch-size", type=int, default=16)
+    frames.add_argument("--renders", type=int, default=50, help="frames extracted on demand")
+    frames.set_defaults(func=bench_frames)
+
+    startup = subparsers.add_parser("startup", help="import time and idle RSS of the read-only app vs the full app")
+    startup.add_argument("--repeats", type=int, default=3, help="fresh interpreters per app; the fastest is reported")
+    startup.add_argument("--top", type=int, default=8, help="slowest top-level imports to list")
+    startup.add_argument("--max-read-seconds", type=float, default=1.0, help="fail when the read app imports slower")
+    startup.set_defaults(func=bench_startup)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Content-addressed cache of emotion analysis results.
+
+Keys hash the decoded pixels of an image or frame together with the
+analysis settings, so the same picture uploaded under another name, or a
+frame repeated in a re-encoded copy of a clip, is answered without running
+detection or the emotion model again.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+
+from config import (
+    RESULT_CACHE_ENABLED, RESULT_CACHE_MEMORY_ENTRIES,
+    RESULT_CACHE_SQLITE, RESULT_CACHE_SQLITE_ENTRIES
+)
+
+# SQLite eviction runs once per this many inserts instead of on every write
+SQLITE_EVICT_EVERY = 100
+
+
+def content_key(pixels: np.ndarray, settings: str) -> str:
+    """Hash decoded pixels (with their shape and dtype) plus analysis settings."""
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(settings.encode())
+    digest.update(f"{pixels.shape}|{pixels.dtype}".encode())
+    digest.update(np.ascontiguousarray(pixels).data)
+    return digest.hexdigest()
+
+
+def _json_default(value):
+    # DeepFace regions may contain NumPy scalars or tuples
+    if hasattr(value, "item"):
+        return value.item()
+    return list(value)
+
+
+class ResultCache:
+    """LRU memory tier in front of an optional SQLite tier."""
+
+    def __init__(
+        self,
+        enabled: bool = RESULT_CACHE_ENABLED,
+        memory_entries: int = RESULT_CACHE_MEMORY_ENTRIES,
+        use_sqlite: bool = RESULT_CACHE_SQLITE,
+        sqlite_entries: int = RESULT_CACHE_SQLITE_ENTRIES
+    ):
+        self.enabled = enabled
+        self.memory_entries = memory_entries
+        self.use_sqlite = use_sqlite
+        self.sqlite_entries = sqlite_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._sqlite_inserts = 0
+        self.memory_hits = 0
+        self.sqlite_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str):
+        """Return the cached analysis for key, or None."""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            analysis = self._memory.get(key)
+            if analysis is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return analysis
+
+        if self.use_sqlite:
+            analysis = self._sqlite_get(key)
+            if analysis is not None:
+                self._memory_put(key, analysis)
+                with self._lock:
+                    self.sqlite_hits += 1
+                return analysis
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, analysis: dict):
+        if not self.enabled:
+            return
+        self._memory_put(key, analysis)
+        if self.use_sqlite:
+            self._sqlite_put(key, analysis)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+
+    def _memory_put(self, key: str, analysis: dict):
+        with self._lock:
+            self._memory[key] = analysis
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+                self.evictions += 1
+
+    def _sqlite_get(self, key: str):
+        from database import SessionLocal
+        from models import AnalysisCacheEntry
+
+        db = SessionLocal()
+        try:
+            entry = db.get(AnalysisCacheEntry, key)
+            if entry is None:
+                return None
+            entry.last_used = datetime.utcnow()
+            db.commit()
+            return json.loads(entry.analysis)
+        finally:
+            db.close()
+
+    def _sqlite_put(self, key: str, analysis: dict):
+        from database import SessionLocal
+        from models import AnalysisCacheEntry
+
+        db = SessionLocal()
+        try:
+            db.merge(AnalysisCacheEntry(
+                key=key,
+                analysis=json.dumps(analysis, default=_json_default),
+                last_used=datetime.utcnow()
+            ))
+            db.commit()
+
+            with self._lock:
+                self._sqlite_inserts += 1
+                evict = self._sqlite_inserts % SQLITE_EVICT_EVERY == 0
+            if evict:
+                self._sqlite_evict(db)
+        finally:
+            db.close()
+
+    def _sqlite_evict(self, db):
+        """Delete the least recently used rows beyond the SQLite tier's size limit."""
+        from models import AnalysisCacheEntry
+
+        cutoff = db.query(AnalysisCacheEntry.last_used).order_by(
+            AnalysisCacheEntry.last_used.desc()
+        ).offset(self.sqlite_entries).limit(1).scalar()
+        if cutoff is None:
+            return
+
+        deleted = db.query(AnalysisCacheEntry).filter(
+            AnalysisCacheEntry.last_used <= cutoff
+        ).delete(synchronize_session=False)
+        db.commit()
+        with self._lock:
+            self.evictions += deleted
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.memory_hits + self.sqlite_hits
+            lookups = hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "sqlite_tier": self.use_sqlite,
+                "memory_entries": len(self._memory),
+                "memory_limit": self.memory_entries,
+                "memory_hits": self.memory_hits,
+                "sqlite_hits": self.sqlite_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+result_cache = ResultCache()
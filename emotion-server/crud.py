@@ -0,0 +1,281 @@
+import base64
+import binascii
+import json
+from datetime import datetime, timezone
+
+import numpy as np
+from sqlalchemy import and_, func, insert, or_, select
+from sqlalchemy.orm import Session
+
+from aggregation import emotion_vector
+from helpers import aggregate_emotions_weighted
+from models import EMOTION_COLUMNS, Face, ImageAnalysis, VideoAnalysis, VideoFrame, VideoJobFrame
+from storage import blob_store
+
+# Frame rows sent per executemany statement
+FRAME_INSERT_CHUNK = 1000
+
+
+def frame_row(video_id: int, frame_data: dict) -> dict:
+    """Column values of a VideoFrame row for one frame_analyses entry."""
+    return {
+        "video_id": video_id,
+        "frame_number": frame_data["frame"],
+        "timestamp": frame_data["timestamp"],
+        "dominant_emotion": frame_data["dominant_emotion"],
+        "dominant_confidence": frame_data["dominant_confidence"],
+        "emotions_data": json.dumps(frame_data["top_k_emotions"]),
+        "frame_blob": frame_data["frame_blob"],
+        **emotion_columns(frame_data),
+    }
+
+
+def emotion_columns(frame_data: dict) -> dict:
+    """Per-emotion score columns of a frame_analyses entry, NULL when it has no full distribution."""
+    emotions = frame_data.get("emotions") or {}
+    return {emotion: emotions.get(emotion) for emotion in EMOTION_COLUMNS}
+
+
+def face_row(face: dict, image_id: int = None, video_id: int = None, frame_data: dict = None) -> dict:
+    """Column values of a Face row for one face entry of an image or video frame."""
+    row = {
+        "image_id": image_id,
+        "video_id": video_id,
+        "frame_number": frame_data["frame"] if frame_data else None,
+        "timestamp": frame_data["timestamp"] if frame_data else None,
+        "face_index": face["face_index"],
+        "track_id": face.get("track_id"),
+        "confidence": face["confidence"],
+        "dominant_emotion": face["dominant_emotion"],
+        **face["region"],
+    }
+    for emotion in EMOTION_COLUMNS:
+        row[emotion] = face["emotions"].get(emotion)
+    return row
+
+
+def bulk_insert_faces(db: Session, rows: list, chunk_size: int = FRAME_INSERT_CHUNK):
+    """Insert Face rows with executemany, chunk_size rows per statement."""
+    for start in range(0, len(rows), chunk_size):
+        db.execute(insert(Face), rows[start:start + chunk_size])
+
+
+def add_video_record(
+    db: Session,
+    filename: str,
+    file_type: str,
+    frame_interval: int,
+    video_info: dict,
+    frame_analyses: list,
+    detector_backend: str = None,
+    aggregated: dict = None,
+    timings: dict = None,
+    source_blob: str = None
+):
+    """
+    Add the VideoAnalysis row, aggregating the frame results unless the
+    aggregate was already computed while they streamed in. Flushes but does not commit.
+    """
+    if aggregated is None:
+        aggregated = aggregate_emotions_weighted(frame_analyses)
+
+    db_video = VideoAnalysis(
+        filename=filename,
+        file_type=file_type,
+        duration_seconds=round(video_info["duration"], 2),
+        total_frames=video_info["total_frames"],
+        analyzed_frames=len(frame_analyses),
+        fps=round(video_info["fps"], 2),
+        frame_interval=frame_interval,
+        dominant_emotion=aggregated.get("dominant_emotion"),
+        dominant_confidence=aggregated.get("dominant_average_confidence"),
+        aggregated_data=json.dumps(aggregated),
+        detector_backend=detector_backend,
+        timing_data=json.dumps(timings) if timings is not None else None,
+        source_blob=source_blob
+    )
+
+    db.add(db_video)
+    db.flush()  # Assigns db_video.id for the frame rows
+
+    return db_video, aggregated
+
+
+def bulk_insert_frames(db: Session, video_id: int, frame_analyses: list, chunk_size: int = FRAME_INSERT_CHUNK):
+    """Insert frame rows with executemany, chunk_size rows per statement."""
+    for start in range(0, len(frame_analyses), chunk_size):
+        chunk = frame_analyses[start:start + chunk_size]
+        db.execute(insert(VideoFrame), [frame_row(video_id, frame_data) for frame_data in chunk])
+
+
+def save_video_analysis(
+    db: Session,
+    filename: str,
+    file_type: str,
+    frame_interval: int,
+    video_info: dict,
+    frame_analyses: list,
+    detector_backend: str = None,
+    aggregated: dict = None,
+    timings: dict = None,
+    source_blob: str = None
+):
+    """Store the video analysis and all its frames in a single transaction."""
+    try:
+        db_video, aggregated = add_video_record(
+            db, filename, file_type, frame_interval, video_info, frame_analyses, detector_backend, aggregated,
+            timings, source_blob
+        )
+        bulk_insert_frames(db, db_video.id, frame_analyses)
+        bulk_insert_faces(db, [
+            face_row(face, video_id=db_video.id, frame_data=frame_data)
+            for frame_data in frame_analyses
+            for face in frame_data.get("faces", [])
+        ])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    return db_video, aggregated
+
+
+# Columns holding blob store references, all indexed
+BLOB_REF_COLUMNS = (
+    ImageAnalysis.image_blob,
+    VideoFrame.frame_blob,
+    VideoJobFrame.frame_blob,
+    VideoAnalysis.source_blob,
+)
+
+# Refs per IN (...) query, below SQLite's bound parameter limit
+BLOB_REF_QUERY_CHUNK = 500
+
+
+def release_blobs(db: Session, refs, created_at: datetime = None):
+    """
+    Delete blobs that are no longer referenced by any row. Call after committing the deletes.
+
+    References are counted with one indexed IN query per table and chunk of
+    refs. `created_at` is when the deleted rows were stored; a blob written
+    or re-added after that is kept, since an identical upload may be about
+    to commit a row that references it.
+    """
+    refs = {ref for ref in refs if ref}
+    in_use = set()
+    pending = sorted(refs)
+    for start in range(0, len(pending), BLOB_REF_QUERY_CHUNK):
+        chunk = pending[start:start + BLOB_REF_QUERY_CHUNK]
+        for column in BLOB_REF_COLUMNS:
+            in_use.update(ref for (ref,) in db.query(column).filter(column.in_(chunk)).distinct())
+
+    not_after = created_at.replace(tzinfo=timezone.utc).timestamp() if created_at is not None else None
+    for ref in refs - in_use:
+        if not_after is not None and (blob_store.modified_at(ref) or 0) > not_after:
+            continue
+        blob_store.delete(ref)
+
+
+def encode_cursor(upload_date: datetime, row_id: int) -> str:
+    """Opaque keyset cursor pointing just after the given row."""
+    return base64.urlsafe_b64encode(f"{upload_date.isoformat()}|{row_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    """Inverse of encode_cursor. Raises ValueError for malformed cursors."""
+    try:
+        upload_date, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(upload_date), int(row_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid cursor")
+
+
+def list_history(
+    db: Session,
+    model,
+    columns: list,
+    limit: int,
+    cursor: str = None,
+    dominant_emotion: str = None,
+    start_date: datetime = None,
+    end_date: datetime = None
+):
+    """
+    One page of an analysis listing, newest first, selecting only `columns`.
+
+    Uses keyset pagination on (upload_date, id) so each page is an index range
+    scan regardless of how deep the client has paged. Returns
+    (rows, total matching rows, next page cursor or None).
+    """
+    filters = []
+    if dominant_emotion:
+        filters.append(model.dominant_emotion == dominant_emotion)
+    if start_date:
+        filters.append(model.upload_date >= start_date)
+    if end_date:
+        filters.append(model.upload_date <= end_date)
+
+    total = db.query(func.count(model.id)).filter(*filters).scalar()
+
+    query = db.query(model.id, model.upload_date, *columns).filter(*filters)
+    if cursor:
+        after_date, after_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            model.upload_date < after_date,
+            and_(model.upload_date == after_date, model.id < after_id)
+        ))
+
+    rows = query.order_by(model.upload_date.desc(), model.id.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].upload_date, rows[-1].id)
+
+    return rows, total, next_cursor
+
+
+def load_frame_scores(db: Session, video_id: int, start: float = None, end: float = None) -> dict:
+    """
+    Numeric timeline of a video's frames within [start, end] seconds, read
+    from the per-emotion score columns with a range scan on
+    (video_id, timestamp). Only rows stored before those columns existed
+    have their top_k JSON parsed. Returns frame_numbers, timestamps,
+    dominant_emotions, dominant_confidences and a (frames x emotions) scores matrix.
+    """
+    conditions = [VideoFrame.video_id == video_id]
+    if start is not None:
+        conditions.append(VideoFrame.timestamp >= start)
+    if end is not None:
+        conditions.append(VideoFrame.timestamp <= end)
+
+    rows = db.execute(
+        select(
+            VideoFrame.frame_number,
+            VideoFrame.timestamp,
+            VideoFrame.dominant_emotion,
+            VideoFrame.dominant_confidence,
+            *[getattr(VideoFrame, emotion) for emotion in EMOTION_COLUMNS]
+        ).where(*conditions).order_by(VideoFrame.timestamp, VideoFrame.frame_number)
+    ).all()
+
+    scores = np.array(
+        [[np.nan if v is None else v for v in row[4:]] for row in rows], dtype=np.float64
+    ).reshape(len(rows), len(EMOTION_COLUMNS))
+    legacy = np.flatnonzero(np.isnan(scores).all(axis=1))
+    if len(legacy):
+        emotions_data = dict(db.execute(
+            select(VideoFrame.frame_number, VideoFrame.emotions_data)
+            .where(*conditions, VideoFrame.angry.is_(None))
+        ).all())
+        for i in legacy:
+            top_k = json.loads(emotions_data.get(rows[i].frame_number) or "[]")
+            scores[i] = emotion_vector({"top_k_emotions": top_k}, EMOTION_COLUMNS, dtype=np.float64)
+
+    return {
+        "frame_numbers": np.array([row.frame_number for row in rows], dtype=np.int64),
+        "timestamps": np.array([row.timestamp for row in rows], dtype=np.float64),
+        "dominant_emotions": [row.dominant_emotion for row in rows],
+        "dominant_confidences": [row.dominant_confidence for row in rows],
+        "scores": scores,
+    }
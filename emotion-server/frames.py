@@ -0,0 +1,114 @@
+"""
+Frame images of analyzed videos.
+
+How sampled frames are kept is set by FRAME_STORAGE:
+
+- "thumbnail": downscaled to FRAME_THUMBNAIL_WIDTH and encoded with
+  FRAME_IMAGE_FORMAT at FRAME_IMAGE_QUALITY, then stored in the blob store
+- "full": the full-resolution JPEG that was stored before thumbnails existed
+- "none": no frame images are encoded during analysis; the source video is
+  kept in the blob store instead and frames are extracted from it when
+  requested, through a bounded in-memory cache
+"""
+import threading
+from collections import OrderedDict
+
+import cv2
+
+from config import (
+    FRAME_CACHE_MB, FRAME_IMAGE_FORMAT, FRAME_IMAGE_QUALITY, FRAME_STORAGE, FRAME_THUMBNAIL_WIDTH
+)
+
+FRAME_STORAGE_MODES = ("thumbnail", "full", "none")
+
+# Extension and OpenCV quality flag of each frame image format
+FRAME_FORMATS = {
+    "jpeg": (".jpg", cv2.IMWRITE_JPEG_QUALITY),
+    "webp": (".webp", cv2.IMWRITE_WEBP_QUALITY),
+}
+
+
+def encode_frame(
+    frame,
+    mode: str = FRAME_STORAGE,
+    width: int = FRAME_THUMBNAIL_WIDTH,
+    image_format: str = FRAME_IMAGE_FORMAT,
+    quality: int = FRAME_IMAGE_QUALITY
+) -> bytes:
+    """Encode a BGR frame as stored with the given mode. Returns None for "none"."""
+    if mode not in FRAME_STORAGE_MODES:
+        raise ValueError(f"Unknown frame storage '{mode}', expected one of {FRAME_STORAGE_MODES}")
+    if mode == "none":
+        return None
+    if mode == "full":
+        _, buffer = cv2.imencode(".jpg", frame)
+        return buffer.tobytes()
+
+    height, frame_width = frame.shape[:2]
+    if width and frame_width > width:
+        frame = cv2.resize(frame, (width, max(1, round(height * width / frame_width))), interpolation=cv2.INTER_AREA)
+    extension, quality_flag = FRAME_FORMATS[image_format]
+    _, buffer = cv2.imencode(extension, frame, [quality_flag, quality])
+    return buffer.tobytes()
+
+
+def read_video_frame(video_path: str, frame_number: int):
+    """Decode one frame of a video file, or None if the video has no such frame."""
+    cap = cv2.VideoCapture(video_path)
+    try:
+        if not cap.isOpened():
+            return None
+        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
+        ret, frame = cap.read()
+        return frame if ret else None
+    finally:
+        cap.release()
+
+
+class FrameCache:
+    """LRU cache of encoded frame images, bounded by their total size in bytes."""
+
+    def __init__(self, max_bytes: int = FRAME_CACHE_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+            return data
+
+    def put(self, key, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = data
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+
+frame_cache = FrameCache()
+
+
+def render_video_frame(video_path: str, source_ref: str, frame_number: int, cache: FrameCache = frame_cache) -> bytes:
+    """
+    Thumbnail of one frame of a stored source video, extracted and encoded on
+    first request and then served from the cache. Returns None if the video
+    has no such frame.
+    """
+    key = (source_ref, frame_number)
+    data = cache.get(key)
+    if data is None:
+        frame = read_video_frame(video_path, frame_number)
+        if frame is None:
+            return None
+        data = encode_frame(frame, mode="thumbnail")
+        cache.put(key, data)
+    return data
@@ -1,5 +1,9 @@
 from fastapi import UploadFile, HTTPException
-import numpy as np
+from fastapi.responses import JSONResponse
+import os
+import tempfile
+
+from aggregation import EmotionAccumulator
 
 def top_k_emotions(analysis: dict, k: int = 3):
     """Extract the top K emotions from the analysis dictionary. Default k=3."""
@@ -22,54 +26,80 @@ def validate_content_type(file: UploadFile, allowed_types: list[str]):
             detail=f"Invalid file type. Allowed types are: {allowed_types}"
         )
 
+class UploadSizeLimitMiddleware:
+    """
+    Reject POST bodies larger than a per-path limit with 413 before they are parsed.
+
+    UploadFile only exists after Starlette has received and spooled the whole
+    multipart body, so a size check in the endpoint comes after the upload.
+    This rejects at once when Content-Length is over the limit, and otherwise
+    (chunked uploads) as soon as the received body grows past it.
+    """
+
+    def __init__(self, app, limits: dict):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        max_bytes = self.limits.get(scope.get("path")) if scope["type"] == "http" and scope["method"] == "POST" else None
+        if max_bytes is None:
+            await self.app(scope, receive, send)
+            return
+
+        detail = f"File too large. Maximum size is {max_bytes // (1024 * 1024)} MB"
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > max_bytes:
+            await JSONResponse(status_code=413, content={"detail": detail})(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    # Raised inside form parsing, which FastAPI passes through as the response
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+async def save_upload_to_file(file: UploadFile, dest_path: str, max_bytes: int, chunk_size: int = 1024 * 1024):
+    """
+    Stream an upload to dest_path in chunks without holding it in memory.
+    Rejects the upload with 413 once it grows past max_bytes. Returns the number of bytes written.
+    Starlette has already spooled the upload by now; UploadSizeLimitMiddleware
+    is what stops an oversize body before it is received.
+    """
+    written = 0
+    try:
+        with open(dest_path, "wb") as out:
+            while True:
+                chunk = await file.read(chunk_size)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if written > max_bytes:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File too large. Maximum size is {max_bytes // (1024 * 1024)} MB"
+                    )
+                out.write(chunk)
+    except BaseException:
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+        raise
+    return written
+
+async def save_upload_to_tempfile(file: UploadFile, max_bytes: int, chunk_size: int = 1024 * 1024, suffix: str = ".mp4"):
+    """Stream an upload to a new temporary file and return its path."""
+    fd, tmp_path = tempfile.mkstemp(suffix=suffix)
+    os.close(fd)
+    await save_upload_to_file(file, tmp_path, max_bytes, chunk_size)
+    return tmp_path
+
 def aggregate_emotions_weighted(frame_analyses: list):
     """Aggregate emotions across frames using time-weighted averages."""
-    if not frame_analyses:
-        return {}
-    
-    emotion_weighted_scores = {}
-    
-    for i, frame in enumerate(frame_analyses):
-        # Calculate time weight (duration until next frame)
-        if i < len(frame_analyses) - 1:
-            duration = frame_analyses[i + 1]["timestamp"] - frame["timestamp"]
-        else:
-            duration = 1.0  # Default for last frame
-        
-        for emotion_data in frame.get("top_k_emotions", []):
-            emotion = emotion_data["emotion"]
-            confidence = emotion_data["confidence"]
-            
-            if emotion not in emotion_weighted_scores:
-                emotion_weighted_scores[emotion] = {
-                    "total_weight": 0, 
-                    "weighted_sum": 0, 
-                    "scores": []
-                }
-            
-            emotion_weighted_scores[emotion]["weighted_sum"] += confidence * duration
-            emotion_weighted_scores[emotion]["total_weight"] += duration
-            emotion_weighted_scores[emotion]["scores"].append(confidence)
-    
-    aggregated = {}
-    for emotion, data in emotion_weighted_scores.items():
-        aggregated[emotion] = {
-            "average": round(data["weighted_sum"] / data["total_weight"], 2),
-            "simple_average": round(np.mean(data["scores"]), 2),
-            "max": round(np.max(data["scores"]), 2),
-            "min": round(np.min(data["scores"]), 2),
-            "std": round(np.std(data["scores"]), 2),
-            "presence_percentage": round((data["total_weight"] / frame_analyses[-1]["timestamp"]) * 100, 2)
-        }
-    
-    sorted_aggregated = dict(
-        sorted(aggregated.items(), key=lambda x: x[1]["average"], reverse=True)
-    )
-    
-    dominant_emotion = list(sorted_aggregated.keys())[0] if sorted_aggregated else None
-    
-    return {
-        "emotions": sorted_aggregated,
-        "dominant_emotion": dominant_emotion,
-        "dominant_average_confidence": sorted_aggregated[dominant_emotion]["average"] if dominant_emotion else None
-    }
\ No newline at end of file
+    return EmotionAccumulator.from_frame_analyses(frame_analyses, keep_frames=False).summary()
@@ -0,0 +1,253 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+from deepface import DeepFace
+from deepface.modules import detection, preprocessing
+
+from aggregation import EMOTION_LABELS
+from cache import ResultCache, content_key, result_cache
+from config import DETECTOR_BACKEND, EMOTION_PRECISION
+
+# Speed/accuracy profiles mapped to DeepFace detector backends
+DETECTOR_PROFILES = {
+    "fast": "opencv",         # Haar cascade
+    "balanced": "mtcnn",
+    "accurate": "retinaface",
+}
+
+# Detector backends accepted by name
+DETECTOR_BACKENDS = ("opencv", "ssd", "mtcnn", "retinaface", "mediapipe", "yunet", "centerface")
+
+def resolve_detector(profile: str = None, detector_backend: str = None):
+    """
+    Pick the detector backend for a request from a profile name or an explicit
+    backend. Returns None (use the server default) when neither is given.
+    """
+    if detector_backend:
+        if detector_backend not in DETECTOR_BACKENDS:
+            raise ValueError(f"Unknown detector_backend '{detector_backend}'. Allowed: {list(DETECTOR_BACKENDS)}")
+        return detector_backend
+    if profile:
+        if profile not in DETECTOR_PROFILES:
+            raise ValueError(f"Unknown profile '{profile}'. Allowed: {list(DETECTOR_PROFILES)}")
+        return DETECTOR_PROFILES[profile]
+    return None
+
+class ModelRegistry:
+    """
+    Process-wide holder for the emotion model and face detector. With a
+    reduced `precision` the emotion model is a TFLite conversion (see quantized.py).
+    """
+
+    def __init__(self, detector_backend: str = DETECTOR_BACKEND, precision: str = EMOTION_PRECISION):
+        self.detector_backend = detector_backend
+        self.precision = precision
+        self.emotion_model = None
+        self.detector = None
+        self.detectors = {}
+        self.ready = False
+        self.startup_seconds = None
+        self._first_request_logged = False
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Build the models and run a warm-up inference. Safe to call more than once."""
+        with self._lock:
+            if self.ready:
+                return
+
+            start = time.perf_counter()
+            self.emotion_model = DeepFace.build_model(
+                task="facial_attribute", model_name="Emotion"
+            ).model
+            if self.precision != "float32":
+                from quantized import EMOTION_PRECISIONS, load_emotion_model
+                if self.precision not in EMOTION_PRECISIONS:
+                    raise ValueError(f"Unknown model precision '{self.precision}', expected one of {EMOTION_PRECISIONS}")
+                self.emotion_model = load_emotion_model(self.emotion_model, self.precision)
+            # DeepFace caches built detectors, so extract_faces reuses this instance
+            self.detector = self.ensure_detector(self.detector_backend)
+            load_seconds = time.perf_counter() - start
+
+            analyze_frames_batched([warmup_image()], registry=self, cache=ResultCache(enabled=False))
+
+            self.startup_seconds = time.perf_counter() - start
+            self.ready = True
+            print(
+                f"✅ Models loaded in {load_seconds:.2f}s, "
+                f"ready after warm-up in {self.startup_seconds:.2f}s "
+                f"(detector: {self.detector_backend}, precision: {self.precision})"
+            )
+
+    def get_emotion_model(self):
+        """Return the emotion model, loading it on demand if startup did not."""
+        if self.emotion_model is None:
+            self.load()
+        return self.emotion_model
+
+    def ensure_detector(self, detector_backend: str):
+        """Build a detector backend once; DeepFace caches it, so extract_faces reuses it."""
+        if detector_backend not in self.detectors:
+            self.detectors[detector_backend] = DeepFace.build_model(
+                task="face_detector", model_name=detector_backend
+            )
+        return self.detectors[detector_backend]
+
+    def settings_key(self, detector_backend: str = None) -> str:
+        """Analysis settings that affect results, used in result cache keys."""
+        detector_backend = detector_backend or self.detector_backend
+        key = f"Emotion|{detector_backend}|align=True|enforce_detection=False"
+        return key if self.precision == "float32" else f"{key}|{self.precision}"
+
+    def log_request_latency(self, endpoint: str, seconds: float):
+        """Log the latency of the first analysis request served by this process."""
+        if self._first_request_logged:
+            return
+        self._first_request_logged = True
+        print(f"⏱️ First {endpoint} request analyzed in {seconds:.2f}s")
+
+registry = ModelRegistry()
+
+def warmup_image() -> np.ndarray:
+    """Synthetic BGR image with a face-like blob used to warm up the models."""
+    img = np.full((224, 224, 3), 40, dtype=np.uint8)
+    cv2.ellipse(img, (112, 112), (60, 80), 0, 0, 360, (180, 200, 230), -1)
+    return img
+
+def _emotion_input(face: np.ndarray) -> np.ndarray:
+    """Prepare a detected face the same way DeepFace.analyze does for the emotion model."""
+    # extract_faces returns RGB, the emotion model expects BGR
+    face = face[:, :, ::-1]
+    face = preprocessing.resize_image(img=face, target_size=(224, 224))[0]
+    gray = cv2.cvtColor(face.astype(np.float32), cv2.COLOR_BGR2GRAY)
+    return cv2.resize(gray, (48, 48))
+
+def _crop_face(frame: np.ndarray, box: dict, confidence: float) -> dict:
+    """Cut a propagated face box out of a frame, shaped like an extract_faces result."""
+    face = frame[box["y"]:box["y"] + box["h"], box["x"]:box["x"] + box["w"]]
+    return {
+        "face": face[:, :, ::-1].astype(np.float32) / 255,
+        "facial_area": dict(box),
+        "confidence": confidence,
+    }
+
+def _detected_faces(analysis) -> list:
+    """(box, confidence) of the real faces in an analysis result, for box propagation."""
+    analyses = analysis if isinstance(analysis, list) else [analysis]
+    return [(a["region"], a["face_confidence"]) for a in analyses if a.get("face_confidence")]
+
+def _to_analysis(predictions: np.ndarray, face_obj: dict) -> dict:
+    """Convert raw model output into the same shape as a DeepFace.analyze result."""
+    total = predictions.sum()
+    emotions = {
+        label: float(100 * predictions[i] / total)
+        for i, label in enumerate(EMOTION_LABELS)
+    }
+    return {
+        "emotion": emotions,
+        "dominant_emotion": EMOTION_LABELS[int(np.argmax(predictions))],
+        "region": face_obj["facial_area"],
+        "face_confidence": face_obj.get("confidence"),
+    }
+
+def analyze_frames_batched(
+    frames: list,
+    batch_size: int = 16,
+    registry: ModelRegistry = registry,
+    cache: ResultCache = result_cache,
+    multi_face: bool = False,
+    detector_backend: str = None,
+    propagator=None
+) -> list:
+    """
+    Analyze emotions for several frames with a single emotion model pass.
+
+    Frames already in the result cache are answered from it. Face detection
+    runs per remaining frame (DeepFace detectors do not batch), then the
+    faces of every frame are stacked into one (N, 48, 48, 1) array for the
+    emotion CNN. Only the first face of each frame is analyzed unless
+    `multi_face` is set. `detector_backend` overrides the registry's default.
+
+    With a FaceBoxPropagator, frames must be consecutive samples of one
+    video: detection only runs when the propagator asks for it, and the other
+    frames reuse the previous boxes moved by optical flow. Results built on
+    propagated boxes depend on earlier frames, so they are not cached.
+
+    Returns, in the same order as `frames`, one analysis dict per frame (or a
+    list of analysis dicts, one per face, with `multi_face`), or None for
+    frames that failed.
+    """
+    results = [None] * len(frames)
+    keys = [None] * len(frames)
+    faces = []
+    face_frames = []
+    detector_backend = detector_backend or registry.detector_backend
+    registry.ensure_detector(detector_backend)
+    settings = registry.settings_key(detector_backend) + ("|multi_face" if multi_face else "")
+
+    for i, frame in enumerate(frames):
+        if cache.enabled:
+            keys[i] = content_key(frame, settings)
+            cached = cache.get(keys[i])
+            if cached is not None:
+                results[i] = cached
+                if propagator is not None:
+                    propagator.reset(frame, _detected_faces(cached))
+                continue
+
+        try:
+            face_objs = None
+            if propagator is not None and not propagator.needs_detection():
+                moved = propagator.propagate(frame)
+                if moved is not None:
+                    face_objs = [_crop_face(frame, box, confidence) for box, confidence in moved]
+                    keys[i] = None
+
+            if face_objs is None:
+                face_objs = detection.extract_faces(
+                    img_path=frame,
+                    detector_backend=detector_backend,
+                    grayscale=False,
+                    enforce_detection=False,
+                    align=True,
+                )
+                if not multi_face:
+                    face_objs = face_objs[:1]
+                if propagator is not None:
+                    propagator.reset(frame, [
+                        (f["facial_area"], f.get("confidence")) for f in face_objs if f.get("confidence")
+                    ])
+
+            for face_obj in face_objs:
+                if face_obj["face"].shape[0] == 0 or face_obj["face"].shape[1] == 0:
+                    continue
+                faces.append(_emotion_input(face_obj["face"]))
+                face_frames.append((i, face_obj))
+        except Exception as e:
+            print(f"Face detection failed for batch item {i}: {e}")
+
+    if not faces:
+        return results
+
+    model = registry.get_emotion_model()
+    batch = np.expand_dims(np.stack(faces), axis=-1)
+    predictions = model.predict(batch, batch_size=batch_size, verbose=0)
+
+    per_frame = {}
+    for (i, face_obj), preds in zip(face_frames, predictions):
+        per_frame.setdefault(i, []).append(_to_analysis(preds, face_obj))
+
+    for i, analyses in per_frame.items():
+        results[i] = analyses if multi_face else analyses[0]
+        if keys[i] is not None:
+            cache.put(keys[i], results[i])
+
+    return results
+
+def analyze_image_array(img: np.ndarray, multi_face: bool = False, detector_backend: str = None):
+    """Analyze a single decoded BGR image. Returns None if no analysis was produced."""
+    return analyze_frames_batched(
+        [img], batch_size=1, multi_face=multi_face, detector_backend=detector_backend
+    )[0]
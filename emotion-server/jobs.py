@@ -0,0 +1,281 @@
+"""
+Background pipeline for asynchronous video analysis jobs.
+
+A job's upload is kept on disk and its analyzed frames are staged in
+video_job_frames after every batch, so progress can be streamed to clients
+and a job interrupted by a restart resumes from the last persisted batch.
+
+When several server processes share the database, only the one holding the
+scheduler lock file runs jobs; it picks up jobs the others queued by polling.
+"""
+import asyncio
+import json
+import os
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single server process always runs the jobs
+    fcntl = None
+
+import numpy as np
+from sqlalchemy import func, insert, literal, select
+
+from aggregation import EmotionAccumulator, emotion_vector
+from analysis import iter_video_analyses, probe_video
+from config import DETECT_EVERY, FRAME_STORAGE, JOBS_DIR, JOB_CONCURRENCY, JOB_POLL_SECONDS, RETRY_AFTER_SECONDS
+from crud import add_video_record, emotion_columns
+from database import SessionLocal
+from inference import registry
+from metrics import StageTimings
+from models import EMOTION_COLUMNS, VideoFrame, VideoJob, VideoJobFrame
+from sampling import average_frame_interval, effective_frame_interval
+from storage import blob_store
+from workers import analysis_pool, PoolSaturated
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+def run_video_job(job_id: str):
+    """Process (or resume) a video job. Runs on the analysis pool with its own session."""
+    db = SessionLocal()
+    try:
+        job = db.get(VideoJob, job_id)
+        if job is None or job.status not in ACTIVE_STATUSES:
+            return
+        source_path = job.source_path
+
+        try:
+            video_info = probe_video(job.source_path)
+            job.status = "running"
+            job.total_frames = video_info["total_frames"]
+            db.commit()
+
+            # Covers this run of the job; a resumed job's earlier runs are not included
+            timings = StageTimings()
+            timings.bytes = os.path.getsize(job.source_path)
+            for batch, next_frame in iter_video_analyses(
+                job.source_path,
+                job.frame_interval,
+                job.batch_size,
+                start_frame=job.next_frame,
+                samples_per_second=job.samples_per_second,
+                detector_backend=job.detector_backend,
+                detect_every=job.detect_every or DETECT_EVERY,
+                adaptive=bool(job.adaptive_sampling),
+                timings=timings
+            ):
+                timings.frames += len(batch)
+                with timings.stage("db"):
+                    if batch:
+                        db.execute(insert(VideoJobFrame), [
+                            {
+                                "job_id": job.id,
+                                "frame_number": frame_data["frame"],
+                                "timestamp": frame_data["timestamp"],
+                                "dominant_emotion": frame_data["dominant_emotion"],
+                                "dominant_confidence": frame_data["dominant_confidence"],
+                                "emotions_data": json.dumps(frame_data["top_k_emotions"]),
+                                "frame_blob": frame_data["frame_blob"],
+                                **emotion_columns(frame_data),
+                            }
+                            for frame_data in batch
+                        ])
+                    job.next_frame = next_frame
+                    db.commit()
+
+            # Aggregate straight from the staged score columns; only frames staged
+            # without them (before the columns existed) fall back to their top 3
+            staged = db.query(
+                VideoJobFrame.timestamp,
+                VideoJobFrame.emotions_data,
+                *[getattr(VideoJobFrame, emo) for emo in EMOTION_COLUMNS]
+            ).filter(VideoJobFrame.job_id == job.id).order_by(VideoJobFrame.frame_number).all()
+            timestamps = np.array([fr.timestamp for fr in staged], dtype=np.float64)
+            scores = np.array(
+                [[np.nan if v is None else v for v in fr[2:]] for fr in staged], dtype=np.float32
+            ).reshape(len(staged), len(EMOTION_COLUMNS))
+            for i in np.flatnonzero(np.isnan(scores).all(axis=1)):
+                scores[i] = emotion_vector({"top_k_emotions": json.loads(staged[i].emotions_data)}, EMOTION_COLUMNS)
+            accumulator = EmotionAccumulator(EMOTION_COLUMNS, keep_frames=False)
+            accumulator.extend(timestamps, scores)
+
+            # Without stored frame images the source is kept to extract frames from;
+            # copied, so the job can still resume from it if this transaction fails
+            source_blob = blob_store.put_file(job.source_path) if FRAME_STORAGE == "none" else None
+
+            # Parent row, frames and job status change in one transaction; the frames
+            # are copied from the staging table server-side with INSERT ... SELECT
+            db_video, _ = add_video_record(
+                db,
+                filename=job.filename,
+                file_type=job.file_type,
+                frame_interval=average_frame_interval(
+                    video_info["total_frames"], len(staged)
+                ) if job.adaptive_sampling else effective_frame_interval(
+                    video_info["fps"], job.frame_interval, job.samples_per_second
+                ),
+                video_info=video_info,
+                frame_analyses=staged,
+                detector_backend=job.detector_backend or registry.detector_backend,
+                aggregated=accumulator.summary(),
+                timings=timings.to_dict(),
+                source_blob=source_blob
+            )
+            frame_columns = [
+                "frame_number", "timestamp", "dominant_emotion",
+                "dominant_confidence", "emotions_data", "frame_blob", *EMOTION_COLUMNS
+            ]
+            db.execute(insert(VideoFrame).from_select(
+                ["video_id"] + frame_columns,
+                select(
+                    literal(db_video.id),
+                    *[getattr(VideoJobFrame, col) for col in frame_columns]
+                ).where(VideoJobFrame.job_id == job.id).order_by(VideoJobFrame.frame_number)
+            ))
+
+            db.query(VideoJobFrame).filter(VideoJobFrame.job_id == job.id).delete()
+            job.status = "completed"
+            job.video_id = db_video.id
+            job.next_frame = video_info["total_frames"]
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            job.status = "failed"
+            job.error = str(e)
+            db.commit()
+            print(f"Video job {job_id} failed: {e}")
+
+        # Completed or failed for good, so the upload is no longer needed. A job cut
+        # short by a shutdown never gets here and keeps its upload to resume from
+        if os.path.exists(source_path):
+            os.remove(source_path)
+    finally:
+        db.close()
+
+
+def get_job_progress(job_id: str, after_frame: int = -1):
+    """Return a job's status and the staged frames after `after_frame`, or None if unknown."""
+    db = SessionLocal()
+    try:
+        job = db.get(VideoJob, job_id)
+        if job is None:
+            return None
+
+        frames = db.query(VideoJobFrame).filter(
+            VideoJobFrame.job_id == job_id,
+            VideoJobFrame.frame_number > after_frame
+        ).order_by(VideoJobFrame.frame_number).all()
+
+        analyzed_frames = db.query(func.count(VideoJobFrame.id)).filter(
+            VideoJobFrame.job_id == job_id
+        ).scalar()
+
+        status = job.to_dict()
+        if job.status != "completed":
+            status["analyzed_frames"] = analyzed_frames
+        return status, [fr.to_frame_analysis() for fr in frames]
+    finally:
+        db.close()
+
+
+class JobScheduler:
+    """
+    Feeds queued video jobs to the analysis pool from background tasks.
+
+    Only the process holding the lock on `lock_path` runs jobs. The others
+    just record submitted jobs in the database and keep trying to take the
+    lock, so jobs carry on if the running process exits.
+    """
+
+    def __init__(self, concurrency: int = JOB_CONCURRENCY, lock_path: str = os.path.join(JOBS_DIR, "scheduler.lock")):
+        self.concurrency = concurrency
+        self.lock_path = lock_path
+        self.leader = False
+        self._lock_file = None
+        self._queue = None
+        self._queued_ids = set()
+        self._tasks = []
+
+    async def start(self):
+        """Start the scheduler, becoming the job runner now or as soon as the lock is free."""
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._poller())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+            self.leader = False
+
+    def submit(self, job_id: str):
+        """Queue a job that was just added to the database. Other processes find it by polling."""
+        if self.leader and job_id not in self._queued_ids:
+            self._queued_ids.add(job_id)
+            self._queue.put_nowait(job_id)
+
+    def _try_lead(self) -> bool:
+        if fcntl is None:
+            return True
+        os.makedirs(os.path.dirname(self.lock_path) or ".", exist_ok=True)
+        lock_file = open(self.lock_path, "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def _queue_unfinished(self) -> int:
+        """Queue jobs in the database that this process has not queued yet."""
+        db = SessionLocal()
+        try:
+            unfinished = db.query(VideoJob.id).filter(
+                VideoJob.status.in_(ACTIVE_STATUSES)
+            ).order_by(VideoJob.created_at).all()
+        finally:
+            db.close()
+
+        queued = 0
+        for (job_id,) in unfinished:
+            if job_id not in self._queued_ids:
+                self.submit(job_id)
+                queued += 1
+        return queued
+
+    async def _poller(self):
+        while True:
+            if not self.leader and self._try_lead():
+                self.leader = True
+                self._tasks += [asyncio.create_task(self._runner()) for _ in range(self.concurrency)]
+                # Jobs left running by a previous runner resume from their last persisted batch
+                resumed = self._queue_unfinished()
+                print(f"✅ Running background video jobs in process {os.getpid()}")
+                if resumed:
+                    print(f"✅ Resumed {resumed} unfinished video job(s)")
+            elif self.leader:
+                self._queue_unfinished()
+            await asyncio.sleep(JOB_POLL_SECONDS)
+
+    async def _runner(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                while True:
+                    try:
+                        await analysis_pool.run(run_video_job, job_id)
+                        break
+                    except PoolSaturated:
+                        await asyncio.sleep(RETRY_AFTER_SECONDS)
+            except Exception as e:
+                print(f"Video job {job_id} crashed: {e}")
+            finally:
+                self._queued_ids.discard(job_id)
+                self._queue.task_done()
+
+
+job_scheduler = JobScheduler()
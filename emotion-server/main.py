@@ -1,18 +1,43 @@
-from fastapi import FastAPI, File, Response, UploadFile, HTTPException, Form, Depends
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, File, Request, UploadFile, HTTPException, Form, Depends
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 from fastapi.middleware.cors import CORSMiddleware
-from deepface import DeepFace
 from PIL import Image
 import io
-from helpers import top_k_emotions, validate_content_type, aggregate_emotions_weighted
-import tempfile
+from helpers import (
+    top_k_emotions, validate_content_type, save_upload_to_file, save_upload_to_tempfile, UploadSizeLimitMiddleware
+)
 import os
-import cv2
 import json
+import time
+import uuid
+import asyncio
+from typing import List, Optional
+from datetime import datetime
 
 from database import get_db, init_db
-from models import ImageAnalysis, VideoAnalysis, VideoFrame
+from crud import save_video_analysis, release_blobs, bulk_insert_faces, face_row
+from storage import blob_store
+from models import ImageAnalysis, VideoAnalysis, VideoFrame, VideoJob, Face
+from inference import registry, resolve_detector
+from cache import result_cache
+from analysis import analyze_image_bytes, analyze_images_bytes, analyze_video_file, VideoDecodeError
+from sharding import analyze_video_sharded, can_shard
+from batch import iter_batch_items, next_chunk
+from workers import analysis_pool, PoolSaturated
+from reads import router as reads_router
+from jobs import job_scheduler, get_job_progress
+from metrics import StageTimings, instrumented_call, metrics
+from config import (
+    VIDEO_BATCH_SIZE, RETRY_AFTER_SECONDS, JOBS_DIR, IMAGE_BATCH_CHUNK,
+    UPLOAD_CHUNK_BYTES, MAX_VIDEO_UPLOAD_BYTES, UPLOAD_FORM_OVERHEAD_BYTES, DETECT_EVERY, PROFILE_DIR, VIDEO_SEGMENTS,
+    FRAME_STORAGE
+)
+
+# How often the job event stream checks for new progress
+JOB_EVENTS_POLL_SECONDS = 0.5
 
 app = FastAPI()
 
@@ -24,20 +49,113 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize database on startup
+# Stop oversize video uploads before Starlette spools them
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    limits={path: MAX_VIDEO_UPLOAD_BYTES + UPLOAD_FORM_OVERHEAD_BYTES for path in ("/video", "/video/jobs")},
+)
+
+# History and stored-result reads; read_app.py serves these without the analysis stack
+app.include_router(reads_router)
+
+# Initialize database on startup, unless serve.py already did so once in its master process
 @app.on_event("startup")
 def startup_event():
-    init_db()
-    print("✅ Database initialized!")
+    if not getattr(app.state, "db_initialized", False):
+        init_db()
+        print("✅ Database initialized!")
+    analysis_pool.start()
+    print(f"✅ Analysis pool started ({analysis_pool.mode}, {analysis_pool.workers} workers)")
+
+@app.on_event("startup")
+async def start_job_scheduler():
+    await job_scheduler.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await job_scheduler.stop()
+    analysis_pool.shutdown()
+
+def detector_for_request(profile: Optional[str], detector_backend: Optional[str]):
+    """ Resolve the profile / detector_backend form fields, answering 400 for unknown values """
+    try:
+        return resolve_detector(profile, detector_backend)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def profile_requested(request: Request) -> bool:
+    """ Whether the request asked for a cProfile dump (X-Profile: 1) and profiling is enabled """
+    return PROFILE_DIR is not None and request.headers.get("x-profile", "").lower() in ("1", "true", "yes")
+
+async def run_analysis(fn, *args, timings: StageTimings = None, profile: bool = False):
+    """
+    Run CPU-bound analysis on the worker pool, answering 503 when it is saturated.
+    With `timings`, fn's stage timings (and the profile dump path when `profile`) are added to it.
+    """
+    try:
+        if timings is None:
+            return await analysis_pool.run(fn, *args)
+        result, worker_timings = await analysis_pool.run(
+            instrumented_call, fn, args, PROFILE_DIR if profile else None, timings=timings
+        )
+        timings.merge(worker_timings)
+        return result
+    except PoolSaturated:
+        raise HTTPException(
+            status_code=503,
+            detail="Analysis queue is full, please retry later",
+            headers={"Retry-After": str(RETRY_AFTER_SECONDS)}
+        )
+
+@app.get("/ready")
+def readiness():
+    """ Report ready only once the models are loaded and warmed up """
+    if not analysis_pool.ready:
+        return JSONResponse(status_code=503, content={"status": "loading"})
+    
+    return JSONResponse(content={
+        "status": "ready",
+        "detector_backend": registry.detector_backend,
+        "startup_seconds": round(analysis_pool.startup_seconds, 2)
+    })
+
+@app.get("/metrics")
+def get_metrics(format: str = "prometheus"):
+    """ Request timing histograms with pool and cache statistics, as Prometheus text (or JSON stats with format=json) """
+    pool = analysis_pool.stats()
+    cache = result_cache.stats()
+    if format == "json":
+        return JSONResponse(content={"analysis_pool": pool, "result_cache": cache})
+    if format != "prometheus":
+        raise HTTPException(status_code=400, detail="format must be 'prometheus' or 'json'")
+    
+    return PlainTextResponse(metrics.render([
+        ("emotion_pool_in_flight", "gauge", "Analysis jobs running or queued", pool["in_flight"]),
+        ("emotion_pool_queue_depth", "gauge", "Analysis jobs waiting for a worker", pool["queue_depth"]),
+        ("emotion_pool_completed_total", "counter", "Analysis jobs completed", pool["completed"]),
+        ("emotion_pool_rejected_total", "counter", "Analysis jobs rejected with 503", pool["rejected"]),
+        ("emotion_cache_memory_entries", "gauge", "Results held in the in-memory cache", cache["memory_entries"]),
+        ("emotion_cache_hits_total", "counter", "Result cache hits", cache["memory_hits"] + cache["sqlite_hits"]),
+        ("emotion_cache_misses_total", "counter", "Result cache misses", cache["misses"]),
+        ("emotion_cache_evictions_total", "counter", "Results evicted from the in-memory cache", cache["evictions"]),
+    ]), media_type="text/plain; version=0.0.4")
 
 @app.post("/image")
 async def analyze_image(
+    request: Request,
     file: UploadFile = File(...),
+    multi_face: bool = Form(False),
+    profile: Optional[str] = Form(None),
+    detector_backend: Optional[str] = Form(None),
     db: Session = Depends(get_db)
 ):
     """ Analyze an uploaded image for emotions """
+    timings = StageTimings()
     validate_content_type(file, ["image/jpeg", "image/png"])
-    file_bytes = await file.read()
+    detector_backend = detector_for_request(profile, detector_backend)
+    with timings.stage("upload"):
+        file_bytes = await file.read()
+    timings.bytes = len(file_bytes)
     
     try:
         Image.open(io.BytesIO(file_bytes))
@@ -56,13 +174,17 @@ async def analyze_image(
         )
     
     try:
-        analysis = DeepFace.analyze(
-            img_path=io.BytesIO(file_bytes),
-            actions=['emotion'],
-            enforce_detection=False
+        start = time.perf_counter()
+        analysis = await run_analysis(
+            analyze_image_bytes, file_bytes, multi_face, detector_backend,
+            timings=timings, profile=profile_requested(request)
         )
-        if isinstance(analysis, list):
-            analysis = analysis[0]
+        faces = None
+        if multi_face:
+            analysis, faces = analysis
+        registry.log_request_latency("/image", time.perf_counter() - start)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"DeepFace failed: {e}")
     
@@ -73,77 +195,164 @@ async def analyze_image(
     result = {
         "top_k_emotions": top_k,
         "dominant_emotion": dominant_emotion,
-        "dominant_confidence": dominant_conf
+        "dominant_confidence": dominant_conf,
+        "detector_backend": detector_backend or registry.detector_backend
     }
     
-    # Save to database
-    db_image = ImageAnalysis(
-        filename=file.filename,
-        file_type=file.content_type,
-        dominant_emotion=dominant_emotion,
-        dominant_confidence=dominant_conf,
-        analysis_data=json.dumps(result),
-        image_data=file_bytes
-    )
-    db.add(db_image)
-    db.commit()
-    db.refresh(db_image)
+    with timings.stage("storage"):
+        image_blob = blob_store.put(file_bytes)
+    
+    # Save to database; the stored timings cover everything up to this write
+    with timings.stage("db"):
+        db_image = ImageAnalysis(
+            filename=file.filename,
+            file_type=file.content_type,
+            dominant_emotion=dominant_emotion,
+            dominant_confidence=dominant_conf,
+            analysis_data=json.dumps(result),
+            detector_backend=result["detector_backend"],
+            timing_data=json.dumps(timings.to_dict()),
+            image_blob=image_blob
+        )
+        db.add(db_image)
+        db.flush()
+        if faces is not None:
+            bulk_insert_faces(db, [face_row(face, image_id=db_image.id) for face in faces])
+        db.commit()
+        db.refresh(db_image)
+    metrics.record_request("/image", timings)
     
     result["id"] = db_image.id
     result["upload_date"] = db_image.upload_date.isoformat()
+    if faces is not None:
+        result["faces"] = faces
+    result["timings"] = timings.to_dict()
     
     return JSONResponse(content=result)
 
-@app.get("/images")
-def get_all_images(db: Session = Depends(get_db)):
-    """ Get all saved image analyses """
-    images = db.query(ImageAnalysis).order_by(
-        ImageAnalysis.upload_date.desc()
-    ).all()
+async def analyze_image_chunk(chunk: list, batch_size: int, detector_backend: Optional[str], seen: set, db: Session):
+    """ Analyze one chunk of a batch upload and bulk insert its ImageAnalysis rows """
+    results = [None] * len(chunk)
+    candidates = []
+    
+    names = [item.filename for item in chunk if item.error is None]
+    existing = {
+        name for (name,) in db.query(ImageAnalysis.filename).filter(ImageAnalysis.filename.in_(names))
+    }
     
-    return JSONResponse(content={
-        "total": len(images),
-        "images": [
-            {
-                "id": img.id,
-                "filename": img.filename,
-                "upload_date": img.upload_date.isoformat(),
-                "dominant_emotion": img.dominant_emotion,
-                "dominant_confidence": img.dominant_confidence,
+    for i, item in enumerate(chunk):
+        if item.error is not None:
+            results[i] = {"filename": item.filename, "status_code": 400, "error": item.error}
+        elif item.filename in existing or item.filename in seen:
+            results[i] = {
+                "filename": item.filename,
+                "status_code": 409,
+                "error": f"Image with filename '{item.filename}' already exists"
             }
-            for img in images
-        ]
-    })
+        else:
+            seen.add(item.filename)
+            candidates.append(i)
+    
+    if not candidates:
+        return results
+    
+    # Backfills wait for pool capacity instead of failing half way through
+    while True:
+        try:
+            analyses = await analysis_pool.run(
+                analyze_images_bytes, [chunk[i].data for i in candidates], batch_size, detector_backend
+            )
+            break
+        except PoolSaturated:
+            await asyncio.sleep(RETRY_AFTER_SECONDS)
+    
+    analyzed = []
+    for i, analysis in zip(candidates, analyses):
+        if isinstance(analysis, str):
+            status_code = 400 if analysis == "Invalid image data" else 500
+            results[i] = {"filename": chunk[i].filename, "status_code": status_code, "error": analysis}
+            continue
+        
+        top_k = top_k_emotions(analysis, k=3)
+        results[i] = {
+            "filename": chunk[i].filename,
+            "status_code": 200,
+            "top_k_emotions": top_k,
+            "dominant_emotion": top_k[0]["emotion"] if top_k else None,
+            "dominant_confidence": top_k[0]["confidence"] if top_k else None,
+            "detector_backend": detector_backend or registry.detector_backend
+        }
+        analyzed.append(i)
+    
+    if not analyzed:
+        return results
+    
+    blob_refs = await run_in_threadpool(lambda: [blob_store.put(chunk[i].data) for i in analyzed])
+    upload_date = datetime.utcnow()
+    rows = []
+    for i, blob_ref in zip(analyzed, blob_refs):
+        result = {
+            k: results[i][k]
+            for k in ("top_k_emotions", "dominant_emotion", "dominant_confidence", "detector_backend")
+        }
+        rows.append({
+            "filename": chunk[i].filename,
+            "file_type": chunk[i].content_type,
+            "upload_date": upload_date,
+            "dominant_emotion": result["dominant_emotion"],
+            "dominant_confidence": result["dominant_confidence"],
+            "analysis_data": json.dumps(result),
+            "detector_backend": result["detector_backend"],
+            "image_blob": blob_ref,
+        })
     
-@app.get("/image/{image_id}")
-def get_image_analysis(image_id: int, db: Session = Depends(get_db)):
-    """ Get a specific image analysis by ID """
-    img = db.query(ImageAnalysis).filter(ImageAnalysis.id == image_id).first()
+    ids = db.execute(
+        insert(ImageAnalysis).returning(ImageAnalysis.id, sort_by_parameter_order=True),
+        rows
+    ).scalars().all()
+    db.commit()
     
-    if not img:
-        raise HTTPException(status_code=404, detail="Image analysis not found")
+    for i, image_id in zip(analyzed, ids):
+        results[i]["id"] = image_id
+        results[i]["upload_date"] = upload_date.isoformat()
     
-    return JSONResponse(content={
-        "id": img.id,
-        "filename": img.filename,
-        "upload_date": img.upload_date.isoformat(),
-        "dominant_emotion": img.dominant_emotion,
-        "dominant_confidence": img.dominant_confidence,
-        "analysis_data": json.loads(img.analysis_data)
-    })
+    return results
+
+@app.post("/images/batch")
+async def analyze_image_batch(
+    files: List[UploadFile] = File(...),
+    batch_size: int = Form(VIDEO_BATCH_SIZE),
+    profile: Optional[str] = Form(None),
+    detector_backend: Optional[str] = Form(None),
+    db: Session = Depends(get_db)
+):
+    """ Analyze many images, given as files and/or zip/tar archives, in one request """
+    if batch_size < 1:
+        raise HTTPException(status_code=400, detail="batch_size must be at least 1")
+    detector_backend = detector_for_request(profile, detector_backend)
     
-@app.get("/image/{image_id}/file")
-def get_image_file(image_id: int, db: Session = Depends(get_db)):
-    """ Retrieve the original image file by ID """
-    img = db.query(ImageAnalysis).filter(ImageAnalysis.id == image_id).first()
+    items = iter_batch_items(files)
+    seen = set()
+    results = []
+    start = time.perf_counter()
     
-    if not img:
-        raise HTTPException(status_code=404, detail="Image not found")
+    while True:
+        chunk = await run_in_threadpool(next_chunk, items, IMAGE_BATCH_CHUNK)
+        if not chunk:
+            break
+        results.extend(await analyze_image_chunk(chunk, batch_size, detector_backend, seen, db))
     
-    return Response(
-        content=img.image_data,
-        media_type=img.file_type
-    )
+    elapsed = time.perf_counter() - start
+    succeeded = sum(1 for r in results if r["status_code"] == 200)
+    
+    return JSONResponse(content={
+        "total": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "elapsed_seconds": round(elapsed, 2),
+        "images_per_second": round(len(results) / elapsed, 2) if elapsed > 0 else None,
+        "results": results
+    })
 
 @app.delete("/image/{image_id}")
 def delete_image(image_id: int, db: Session = Depends(get_db)):
@@ -153,25 +362,42 @@ def delete_image(image_id: int, db: Session = Depends(get_db)):
     if not img:
         raise HTTPException(status_code=404, detail="Image analysis not found")
     
+    blob_ref, upload_date = img.image_blob, img.upload_date
+    db.query(Face).filter(Face.image_id == image_id).delete()
     db.delete(img)
     db.commit()
+    release_blobs(db, [blob_ref], upload_date)
     
     return JSONResponse(content={"detail": "Image analysis deleted successfully"})
 
-@app.post("/video")
-async def analyze_video(
-    file: UploadFile = File(...),
-    frame_interval: int = Form(30),
-    db: Session = Depends(get_db)
+VIDEO_CONTENT_TYPES = [
+    "video/mp4",
+    "video/quicktime",       # .mov
+    "video/x-msvideo"        # .avi
+]
+
+def validate_video_upload(
+    file: UploadFile,
+    frame_interval: int,
+    samples_per_second: float,
+    batch_size: int,
+    detect_every: int,
+    db: Session
 ):
-    validate_content_type(
-        file,
-        [
-            "video/mp4",
-            "video/quicktime",       # .mov
-            "video/x-msvideo"        # .avi
-        ]
-    )
+    """ Shared checks for synchronous and job-mode video uploads """
+    validate_content_type(file, VIDEO_CONTENT_TYPES)
+    
+    if frame_interval < 1:
+        raise HTTPException(status_code=400, detail="frame_interval must be at least 1")
+    
+    if detect_every < 1:
+        raise HTTPException(status_code=400, detail="detect_every must be at least 1")
+    
+    if samples_per_second is not None and samples_per_second <= 0:
+        raise HTTPException(status_code=400, detail="samples_per_second must be positive")
+    
+    if batch_size < 1:
+        raise HTTPException(status_code=400, detail="batch_size must be at least 1")
     
     # Check if video with same filename already exists
     existing_video = db.query(VideoAnalysis).filter(
@@ -183,105 +409,76 @@ async def analyze_video(
             status_code=409, 
             detail=f"Video with filename '{file.filename}' already exists"
         )
-    
-    file_bytes = await file.read()
-    
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as tmp_file:
-        tmp_file.write(file_bytes)
-        tmp_path = tmp_file.name
+
+@app.post("/video")
+async def analyze_video(
+    request: Request,
+    file: UploadFile = File(...),
+    frame_interval: int = Form(30),
+    samples_per_second: Optional[float] = Form(None),
+    batch_size: int = Form(VIDEO_BATCH_SIZE),
+    multi_face: bool = Form(False),
+    track_faces: bool = Form(False),
+    profile: Optional[str] = Form(None),
+    detector_backend: Optional[str] = Form(None),
+    detect_every: int = Form(DETECT_EVERY),
+    adaptive_sampling: bool = Form(False),
+    segments: int = Form(VIDEO_SEGMENTS),
+    db: Session = Depends(get_db)
+):
+    timings = StageTimings()
+    validate_video_upload(file, frame_interval, samples_per_second, batch_size, detect_every, db)
+    detector_backend = detector_for_request(profile, detector_backend)
+    if segments < 1:
+        raise HTTPException(status_code=400, detail="segments must be at least 1")
+    segments = min(segments, analysis_pool.workers)
+    
+    with timings.stage("upload"):
+        tmp_path = await save_upload_to_tempfile(file, MAX_VIDEO_UPLOAD_BYTES, UPLOAD_CHUNK_BYTES)
+    timings.bytes = os.path.getsize(tmp_path)
         
     try:
-        cap = cv2.VideoCapture(tmp_path)
-        
-        if not cap.isOpened():
-            raise HTTPException(status_code=400, detail="Could not open video file")
-        
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        duration = total_frames / fps if fps > 0 else 0
-        
-        frame_analyses = []
-        frame_count = 0
-        
-        # Reset video to beginning
-        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-        
-        while True:
-            ret, frame = cap.read()
-            
-            if not ret:
-                break
-            
-            if frame_count % frame_interval == 0:
-                try:
-                    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    
-                    analysis = DeepFace.analyze(
-                        img_path=rgb_frame,
-                        actions=['emotion'],
-                        enforce_detection=False
-                    )
-                    
-                    if isinstance(analysis, list):
-                        analysis = analysis[0]
-                    
-                    timestamp = frame_count / fps if fps > 0 else 0
-                    top_k = top_k_emotions(analysis, k=3)
-                    
-                    # Convert frame to JPEG bytes for storage
-                    _, buffer = cv2.imencode('.jpg', frame)
-                    frame_bytes = buffer.tobytes()
-                    
-                    frame_analyses.append({
-                        "frame": frame_count,
-                        "timestamp": round(timestamp, 2),
-                        "top_k_emotions": top_k,
-                        "dominant_emotion": top_k[0]["emotion"] if top_k else None,
-                        "dominant_confidence": top_k[0]["confidence"] if top_k else None,
-                        "frame_image": frame_bytes  # Add image data
-                    })
-                    
-                except Exception as e:
-                    print(f"Failed to analyze frame {frame_count}: {e}")
-            
-            frame_count += 1
-        
-        cap.release()
-        
-        aggregated = aggregate_emotions_weighted(frame_analyses)
+        start = time.perf_counter()
+        if segments > 1 and can_shard(adaptive_sampling, track_faces, detect_every):
+            result = await analyze_video_sharded(
+                run_analysis, tmp_path, frame_interval, batch_size, segments,
+                samples_per_second, multi_face, detector_backend, timings=timings
+            )
+        else:
+            result = await run_analysis(
+                analyze_video_file, tmp_path, frame_interval, batch_size,
+                samples_per_second, multi_face, track_faces, detector_backend, detect_every,
+                adaptive_sampling,
+                timings=timings, profile=profile_requested(request)
+            )
+        registry.log_request_latency("/video", time.perf_counter() - start)
         
-        # Save video analysis to database
-        db_video = VideoAnalysis(
-            filename=file.filename,
-            file_type=file.content_type,
-            duration_seconds=round(duration, 2),
-            total_frames=total_frames,
-            analyzed_frames=len(frame_analyses),
-            fps=round(fps, 2),
-            frame_interval=frame_interval,
-            dominant_emotion=aggregated.get("dominant_emotion"),
-            dominant_confidence=aggregated.get("dominant_average_confidence"),
-            aggregated_data=json.dumps(aggregated)
-        )
+        total_frames = result["total_frames"]
+        fps = result["fps"]
+        duration = result["duration"]
+        frame_analyses = result["frame_analyses"]
         
-        db.add(db_video)
-        db.commit()
-        db.refresh(db_video)
+        # Without stored frame images, the source video is kept to extract frames from
+        source_blob = None
+        if FRAME_STORAGE == "none":
+            with timings.stage("storage"):
+                source_blob = await run_in_threadpool(blob_store.put_file, tmp_path, True)
         
-        # Save individual frames with images
-        for frame_data in frame_analyses:
-            db_frame = VideoFrame(
-                video_id=db_video.id,
-                frame_number=frame_data["frame"],
-                timestamp=frame_data["timestamp"],
-                dominant_emotion=frame_data["dominant_emotion"],
-                dominant_confidence=frame_data["dominant_confidence"],
-                emotions_data=json.dumps(frame_data["top_k_emotions"]),
-                frame_image=frame_data["frame_image"]  # Save image data
+        # The stored timings cover everything up to this write
+        with timings.stage("db"):
+            db_video, aggregated = save_video_analysis(
+                db,
+                filename=file.filename,
+                file_type=file.content_type,
+                frame_interval=result["frame_interval"],
+                video_info=result,
+                frame_analyses=frame_analyses,
+                detector_backend=detector_backend or registry.detector_backend,
+                aggregated=result["aggregated"],
+                timings=timings.to_dict(),
+                source_blob=source_blob
             )
-            db.add(db_frame)
-        
-        db.commit()
+        metrics.record_request("/video", timings)
         
         return JSONResponse(content={
             "id": db_video.id,
@@ -292,16 +489,20 @@ async def analyze_video(
                 "duration_seconds": round(duration, 2),
                 "fps": round(fps, 2)
             },
+            "detector_backend": db_video.detector_backend,
             "frame_by_frame": [
-                {k: v for k, v in frame.items() if k != "frame_image"}  # Exclude image bytes from response
+                {k: v for k, v in frame.items() if k != "frame_blob"}  # Exclude blob references from response
                 for frame in frame_analyses
             ],
-            "aggregated_emotions": aggregated
+            "aggregated_emotions": aggregated,
+            "timings": timings.to_dict()
         })
         
     except HTTPException:
         # Re-raise HTTP exceptions
         raise
+    except VideoDecodeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         # Rollback any database changes if processing fails
         db.rollback()
@@ -310,101 +511,101 @@ async def analyze_video(
         if os.path.exists(tmp_path):
             os.remove(tmp_path)
             
-@app.get("/videos")
-def get_all_videos(db: Session = Depends(get_db)):
-    """ Get all saved video analyses """
-    videos = db.query(VideoAnalysis).order_by(
-        VideoAnalysis.upload_date.desc()
-    ).all()
+@app.post("/video/jobs", status_code=202)
+async def create_video_job(
+    file: UploadFile = File(...),
+    frame_interval: int = Form(30),
+    samples_per_second: Optional[float] = Form(None),
+    batch_size: int = Form(VIDEO_BATCH_SIZE),
+    profile: Optional[str] = Form(None),
+    detector_backend: Optional[str] = Form(None),
+    detect_every: int = Form(DETECT_EVERY),
+    adaptive_sampling: bool = Form(False),
+    db: Session = Depends(get_db)
+):
+    """ Queue a video for background analysis and return its job ID immediately """
+    validate_video_upload(file, frame_interval, samples_per_second, batch_size, detect_every, db)
+    detector_backend = detector_for_request(profile, detector_backend)
     
-    return JSONResponse(content={
-        "total": len(videos),
-        "videos": [
-            {
-                "id": vid.id,
-                "filename": vid.filename,
-                "upload_date": vid.upload_date.isoformat(),
-                "duration_seconds": vid.duration_seconds,
-                "total_frames": vid.total_frames,
-                "analyzed_frames": vid.analyzed_frames,
-                "fps": vid.fps,
-                "dominant_emotion": vid.dominant_emotion,
-                "dominant_confidence": vid.dominant_confidence,
-            }
-            for vid in videos
-        ]
-    })
+    job_id = uuid.uuid4().hex
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    source_path = os.path.join(JOBS_DIR, f"{job_id}{os.path.splitext(file.filename or '')[1] or '.mp4'}")
     
-@app.get("/video/{video_id}")
-def get_video_analysis(video_id: int, db: Session = Depends(get_db)):
-    """ Get a specific video analysis by ID """
-    vid = db.query(VideoAnalysis).filter(VideoAnalysis.id == video_id).first()
+    await save_upload_to_file(file, source_path, MAX_VIDEO_UPLOAD_BYTES, UPLOAD_CHUNK_BYTES)
     
-    if not vid:
-        raise HTTPException(status_code=404, detail="Video analysis not found")
+    job = VideoJob(
+        id=job_id,
+        filename=file.filename,
+        file_type=file.content_type,
+        source_path=source_path,
+        frame_interval=frame_interval,
+        samples_per_second=samples_per_second,
+        detector_backend=detector_backend,
+        detect_every=detect_every,
+        adaptive_sampling=adaptive_sampling,
+        batch_size=batch_size,
+        status="queued"
+    )
+    db.add(job)
+    db.commit()
     
-    frames = db.query(VideoFrame).filter(
-        VideoFrame.video_id == video_id
-    ).order_by(VideoFrame.frame_number).all()
-    
-    frame_data = [
-        {
-            "frame_number": fr.frame_number,
-            "timestamp": fr.timestamp,
-            "dominant_emotion": fr.dominant_emotion,
-            "dominant_confidence": fr.dominant_confidence,
-            "emotions_data": json.loads(fr.emotions_data)
-        }
-        for fr in frames
-    ]
+    job_scheduler.submit(job_id)
     
-    return JSONResponse(content={
-        "id": vid.id,
-        "filename": vid.filename,
-        "upload_date": vid.upload_date.isoformat(),
-        "duration_seconds": vid.duration_seconds,
-        "total_frames": vid.total_frames,
-        "analyzed_frames": vid.analyzed_frames,
-        "fps": vid.fps,
-        "frame_interval": vid.frame_interval,
-        "dominant_emotion": vid.dominant_emotion,
-        "dominant_confidence": vid.dominant_confidence,
-        "aggregated_data": json.loads(vid.aggregated_data),
-        "frames": frame_data
+    return JSONResponse(status_code=202, content={
+        "job_id": job_id,
+        "status": job.status,
+        "status_url": f"/video/jobs/{job_id}",
+        "events_url": f"/video/jobs/{job_id}/events"
     })
-    
-@app.get("/video/{video_id}/frame/{frame_number}/file")
-def get_video_frame_file(video_id: int, frame_number: int, db: Session = Depends(get_db)):
-    """ Get the actual image file for a specific video frame """
-    frame = db.query(VideoFrame).filter(
-        VideoFrame.video_id == video_id,
-        VideoFrame.frame_number == frame_number
-    ).first()
 
-    if not frame or not frame.frame_image:
-        raise HTTPException(status_code=404, detail="Frame image not found")
-
-    return Response(content=frame.frame_image, media_type="image/jpeg")
-
-@app.get("/video/{video_id}/frame/{frame_number}")
-def get_video_frame_analysis(video_id: int, frame_number: int, db: Session = Depends(get_db)):
-    """ Get analysis data for a specific video frame """
-    frame = db.query(VideoFrame).filter(
-        VideoFrame.video_id == video_id,
-        VideoFrame.frame_number == frame_number
-    ).first()
-
-    if not frame:
-        raise HTTPException(status_code=404, detail="Frame analysis not found")
+@app.get("/video/jobs/{job_id}")
+def get_video_job(job_id: str, include_frames: bool = True):
+    """ Get the status, progress and partial frame-by-frame results of a video job """
+    progress = get_job_progress(job_id)
+    
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Video job not found")
+    
+    status, frames = progress
+    if include_frames:
+        status["frame_by_frame"] = frames
+    
+    return JSONResponse(content=status)
 
-    return JSONResponse(content={
-        "frame_number": frame.frame_number,
-        "timestamp": frame.timestamp,
-        "dominant_emotion": frame.dominant_emotion,
-        "dominant_confidence": frame.dominant_confidence,
-        "emotions_data": json.loads(frame.emotions_data)
-    })
+@app.get("/video/jobs/{job_id}/events")
+async def stream_video_job(job_id: str):
+    """ Server-sent events with per-batch progress and new frame results for a video job """
+    progress = await run_in_threadpool(get_job_progress, job_id)
+    
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Video job not found")
+    
+    async def event_stream():
+        last_frame = -1
+        while True:
+            status, frames = await run_in_threadpool(get_job_progress, job_id, last_frame)
+            if frames:
+                last_frame = frames[-1]["frame"]
+            
+            if frames or status["status"] in ("completed", "failed"):
+                status["frame_by_frame"] = frames
+                event = status["status"] if status["status"] in ("completed", "failed") else "progress"
+                yield f"event: {event}\ndata: {json.dumps(status)}\n\n"
+                
+                if event != "progress":
+                    return
+            else:
+                # Comment line keeps proxies from closing an idle stream
+                yield ": keep-alive\n\n"
+            
+            await asyncio.sleep(JOB_EVENTS_POLL_SECONDS)
     
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
+            
 @app.delete("/video/{video_id}")
 def delete_video(video_id: int, db: Session = Depends(get_db)):
     """ Delete a specific video analysis and its frames by ID """
@@ -413,9 +614,15 @@ def delete_video(video_id: int, db: Session = Depends(get_db)):
     if not vid:
         raise HTTPException(status_code=404, detail="Video analysis not found")
     
+    blob_refs = [
+        ref for (ref,) in db.query(VideoFrame.frame_blob).filter(VideoFrame.video_id == video_id)
+    ] + [vid.source_blob]
+    upload_date = vid.upload_date
     db.query(VideoFrame).filter(VideoFrame.video_id == video_id).delete()
+    db.query(Face).filter(Face.video_id == video_id).delete()
     
     db.delete(vid)
     db.commit()
+    release_blobs(db, blob_refs, upload_date)
     
     return JSONResponse(content={"detail": "Video analysis and associated frames deleted successfully"})
\ No newline at end of file
@@ -0,0 +1,209 @@
+"""
+Request timing instrumentation.
+
+StageTimings collects how long one request spent in each stage of the hot
+path (upload buffering, decoding, inference, JPEG encoding, blob writes,
+queue wait, database). It is plain data, so the analysis functions can fill
+it in on a worker process and hand it back with their result
+(instrumented_call, which can also capture a cProfile dump of the call).
+
+Finished requests are recorded in process-wide histograms, rendered in the
+Prometheus text format on /metrics. With several server processes every
+process keeps its own histograms.
+"""
+import cProfile
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# Stages in the order they happen; stages a request never entered are left out
+STAGES = ("upload", "queue_wait", "decode", "inference", "encode", "storage", "db")
+
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+FPS_BUCKETS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+BYTES_BUCKETS = tuple(2 ** power for power in range(14, 32, 2))  # 16 KB to 1 GB
+
+
+class StageTimings:
+    """Seconds spent per stage of one request, plus the frames and bytes it processed."""
+
+    def __init__(self):
+        self.seconds = {}
+        self.frames = 0
+        self.bytes = 0
+        self.profile_path = None
+        self._start = time.perf_counter()
+
+    def add(self, stage: str, seconds: float):
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def merge(self, other: "StageTimings"):
+        """Add the stages, frames and bytes recorded by another timer, e.g. on a worker."""
+        for stage, seconds in other.seconds.items():
+            self.add(stage, seconds)
+        self.frames += other.frames
+        self.bytes += other.bytes
+        self.profile_path = other.profile_path or self.profile_path
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._start
+
+    def to_dict(self) -> dict:
+        """Breakdown in milliseconds, as stored with analysis records and returned to clients."""
+        total = self.elapsed
+        stages = sorted(self.seconds, key=lambda s: STAGES.index(s) if s in STAGES else len(STAGES))
+        result = {
+            "total_ms": round(total * 1000, 2),
+            "stages_ms": {stage: round(self.seconds[stage] * 1000, 2) for stage in stages},
+            "bytes": self.bytes,
+        }
+        if self.frames:
+            result["frames"] = self.frames
+            result["frames_per_second"] = round(self.frames / total, 2) if total > 0 else None
+        if self.profile_path:
+            result["profile_path"] = self.profile_path
+        return result
+
+
+def timed_iter(iterable, timings: StageTimings, stage: str):
+    """Yield the items of an iterable, adding the time spent producing each one to `stage`."""
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            timings.add(stage, time.perf_counter() - start)
+            return
+        timings.add(stage, time.perf_counter() - start)
+        yield item
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, in the Prometheus data model."""
+
+    def __init__(self, name: str, help_text: str, buckets: tuple, label_names: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets))
+        self.label_names = label_names
+        self._series = {}  # label values -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labels, [list(s[0]), s[1], s[2]]) for labels, s in self._series.items())
+        for label_values, (counts, total, count) in series:
+            labels = [f'{name}="{value}"' for name, value in zip(self.label_names, label_values)]
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts + [count]):
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{{{','.join(labels + [le])}}} {bucket_count}")
+            suffix = f"{{{','.join(labels)}}}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {total}")
+            lines.append(f"{self.name}_count{suffix} {count}")
+        return lines
+
+
+class Metrics:
+    """Histograms of the request timings recorded by this process."""
+
+    def __init__(self):
+        self.request_seconds = Histogram(
+            "emotion_request_duration_seconds", "Time to serve an analysis request",
+            DURATION_BUCKETS, ("endpoint",)
+        )
+        self.stage_seconds = Histogram(
+            "emotion_stage_duration_seconds", "Time an analysis request spent in each stage",
+            DURATION_BUCKETS, ("endpoint", "stage")
+        )
+        self.queue_wait_seconds = Histogram(
+            "emotion_queue_wait_seconds", "Time analysis jobs waited for a free worker",
+            DURATION_BUCKETS
+        )
+        self.frames_per_second = Histogram(
+            "emotion_frames_per_second", "Analyzed video frames per second of request time",
+            FPS_BUCKETS, ("endpoint",)
+        )
+        self.processed_bytes = Histogram(
+            "emotion_processed_bytes", "Bytes uploaded per analysis request",
+            BYTES_BUCKETS, ("endpoint",)
+        )
+
+    def record_request(self, endpoint: str, timings: StageTimings):
+        self.request_seconds.observe(timings.elapsed, endpoint)
+        for stage, seconds in timings.seconds.items():
+            self.stage_seconds.observe(seconds, endpoint, stage)
+        if timings.frames:
+            self.frames_per_second.observe(timings.frames / timings.elapsed, endpoint)
+        if timings.bytes:
+            self.processed_bytes.observe(timings.bytes, endpoint)
+
+    def render(self, samples: list = None) -> str:
+        """
+        Prometheus text exposition of the histograms, followed by `samples`,
+        (name, type, help, value) tuples of counters and gauges kept elsewhere
+        such as the analysis pool statistics.
+        """
+        lines = []
+        for histogram in (
+            self.request_seconds, self.stage_seconds, self.queue_wait_seconds,
+            self.frames_per_second, self.processed_bytes
+        ):
+            lines += histogram.render()
+        for name, metric_type, help_text, value in samples or []:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}", f"{name} {float(value)}"]
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+def instrumented_call(fn, args: tuple, profile_dir: str = None):
+    """
+    Run fn(*args, timings=...) with a fresh StageTimings, on the analysis
+    worker, and return (result, timings). With `profile_dir` the call runs
+    under cProfile and the stats are dumped to a new file there, whose path
+    is kept as timings.profile_path. cProfile can only be active once at a
+    time, so a call that finds another profile running is not profiled.
+    """
+    timings = StageTimings()
+    if profile_dir is None:
+        return fn(*args, timings=timings), timings
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        return fn(*args, timings=timings), timings
+    try:
+        result = fn(*args, timings=timings)
+    finally:
+        profiler.disable()
+
+    os.makedirs(profile_dir, exist_ok=True)
+    timings.profile_path = os.path.join(profile_dir, f"{fn.__name__}-{int(time.time())}-{uuid.uuid4().hex[:8]}.prof")
+    profiler.dump_stats(timings.profile_path)
+    return result, timings
@@ -0,0 +1,70 @@
+"""
+Move image and frame blobs out of SQLite into the blob store.
+
+Usage (from emotion-server/):
+    python migrate_blobs.py [--batch-size 200] [--vacuum]
+
+Rows are migrated in batches, each committed on its own, so the command can
+be interrupted and re-run safely. --vacuum reclaims the freed space in the
+database file afterwards.
+"""
+import argparse
+
+from sqlalchemy import text
+
+from database import SessionLocal, engine, init_db
+from models import ImageAnalysis, VideoFrame
+from storage import blob_store
+
+
+def migrate_column(model, data_column: str, ref_column: str, batch_size: int) -> int:
+    """Move inline blobs of one table into the blob store. Returns the number of rows moved."""
+    data_attr = getattr(model, data_column)
+    ref_attr = getattr(model, ref_column)
+    moved = 0
+
+    db = SessionLocal()
+    try:
+        while True:
+            rows = db.query(model.id, data_attr).filter(
+                data_attr.isnot(None),
+                ref_attr.is_(None)
+            ).order_by(model.id).limit(batch_size).all()
+            if not rows:
+                break
+
+            for row_id, data in rows:
+                ref = blob_store.put(data)
+                db.query(model).filter(model.id == row_id).update(
+                    {ref_column: ref, data_column: None},
+                    synchronize_session=False
+                )
+            db.commit()
+            moved += len(rows)
+            print(f"{model.__tablename__}: moved {moved} blobs")
+    finally:
+        db.close()
+
+    return moved
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=200, help="rows moved per transaction")
+    parser.add_argument("--vacuum", action="store_true", help="run VACUUM after migrating")
+    args = parser.parse_args()
+
+    init_db()
+    images = migrate_column(ImageAnalysis, "image_data", "image_blob", args.batch_size)
+    frames = migrate_column(VideoFrame, "frame_image", "frame_blob", args.batch_size)
+    print(f"✅ Migrated {images} images and {frames} video frames to {blob_store.root}")
+
+    if args.vacuum:
+        # VACUUM cannot run inside a transaction
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("VACUUM"))
+        print("✅ Database vacuumed")
+
+
+if __name__ == "__main__":
+    main()
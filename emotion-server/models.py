@@ -1,7 +1,8 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text, LargeBinary, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Text, LargeBinary, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
+import json
 
 Base = declarative_base()
 
@@ -9,13 +10,16 @@ class ImageAnalysis(Base):
     __tablename__ = "image_analyses"
     
     id = Column(Integer, primary_key=True, index=True)
-    filename = Column(String, nullable=False)
+    filename = Column(String, nullable=False, index=True)
     file_type = Column(String)
-    upload_date = Column(DateTime, default=datetime.utcnow)
-    dominant_emotion = Column(String)
+    upload_date = Column(DateTime, default=datetime.utcnow, index=True)
+    dominant_emotion = Column(String, index=True)
     dominant_confidence = Column(Float)
     analysis_data = Column(Text)  # Store full JSON result
-    image_data = Column(LargeBinary)
+    detector_backend = Column(String)  # Face detector used for the analysis
+    timing_data = Column(Text)  # JSON per-stage timing breakdown of the request
+    image_blob = Column(String, index=True)  # Blob store reference of the uploaded image
+    image_data = Column(LargeBinary)  # Legacy inline image, moved to the blob store by migrate_blobs.py
     
     def to_dict(self, include_image=False):
         """Convert model to dictionary"""
@@ -28,7 +32,7 @@ class ImageAnalysis(Base):
             "dominant_confidence": self.dominant_confidence,
         }
         if include_image:
-            result["has_image"] = self.image_data is not None
+            result["has_image"] = self.image_blob is not None or self.image_data is not None
             result["image_url"] = f"/image/{self.id}/file"
         return result
 
@@ -36,17 +40,20 @@ class VideoAnalysis(Base):
     __tablename__ = "video_analyses"
     
     id = Column(Integer, primary_key=True, index=True)
-    filename = Column(String, nullable=False)
+    filename = Column(String, nullable=False, index=True)
     file_type = Column(String)
-    upload_date = Column(DateTime, default=datetime.utcnow)
+    upload_date = Column(DateTime, default=datetime.utcnow, index=True)
     duration_seconds = Column(Float, nullable=False)
     total_frames = Column(Integer, nullable=False)
     analyzed_frames = Column(Integer, nullable=False)
     fps = Column(Float, nullable=False)
     frame_interval = Column(Integer, nullable=False)
-    dominant_emotion = Column(String)
+    dominant_emotion = Column(String, index=True)
     dominant_confidence = Column(Float)
     aggregated_data = Column(Text)  # JSON string of aggregated emotions
+    detector_backend = Column(String)  # Face detector used for the analysis
+    timing_data = Column(Text)  # JSON per-stage timing breakdown of the analysis
+    source_blob = Column(String, index=True)  # Blob store reference of the source video, kept when frame images are not stored
     
     # Relationship to frames
     frames = relationship("VideoFrame", back_populates="video", cascade="all, delete-orphan")
@@ -70,8 +77,15 @@ class VideoAnalysis(Base):
             result["frames_count"] = len(self.frames)
         return result
 
+# Emotions stored as one score column each on frame and face rows
+EMOTION_COLUMNS = ["angry", "disgust", "fear", "happy", "sad", "surprise", "neutral"]
+
 class VideoFrame(Base):
     __tablename__ = "video_frames"
+    __table_args__ = (
+        Index("ix_video_frames_video_id_frame_number", "video_id", "frame_number"),
+        Index("ix_video_frames_video_id_timestamp", "video_id", "timestamp"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     video_id = Column(Integer, ForeignKey("video_analyses.id"), nullable=False)
@@ -80,7 +94,16 @@ class VideoFrame(Base):
     dominant_emotion = Column(String)
     dominant_confidence = Column(Float)
     emotions_data = Column(Text)  # JSON string of top_k_emotions
-    frame_image = Column(LargeBinary)  # Store the actual frame image
+    # Full emotion distribution, one column per emotion (percentages); NULL for older rows
+    angry = Column(Float)
+    disgust = Column(Float)
+    fear = Column(Float)
+    happy = Column(Float)
+    sad = Column(Float)
+    surprise = Column(Float)
+    neutral = Column(Float)
+    frame_blob = Column(String, index=True)  # Blob store reference of the frame JPEG
+    frame_image = Column(LargeBinary)  # Legacy inline JPEG, moved to the blob store by migrate_blobs.py
     
     # Relationship to video
     video = relationship("VideoAnalysis", back_populates="frames")
@@ -94,4 +117,131 @@ class VideoFrame(Base):
             "timestamp": self.timestamp,
             "dominant_emotion": self.dominant_emotion,
             "dominant_confidence": self.dominant_confidence,
-        }
\ No newline at end of file
+        }
+class VideoJob(Base):
+    __tablename__ = "video_jobs"
+    
+    id = Column(String, primary_key=True)  # UUID hex
+    filename = Column(String, nullable=False)
+    file_type = Column(String)
+    source_path = Column(String, nullable=False)  # Uploaded video kept on disk until the job finishes
+    frame_interval = Column(Integer, nullable=False)
+    samples_per_second = Column(Float)  # Time-based sampling rate, overrides frame_interval when set
+    detector_backend = Column(String)  # Face detector for the job, server default when empty
+    detect_every = Column(Integer)  # Sampled frames per face detection, server default when empty
+    adaptive_sampling = Column(Boolean, default=False)  # Sample on scene changes instead of a fixed stride
+    batch_size = Column(Integer, nullable=False)
+    status = Column(String, nullable=False, default="queued")  # queued, running, completed, failed
+    total_frames = Column(Integer)
+    next_frame = Column(Integer, nullable=False, default=0)  # Frame index to resume decoding from
+    error = Column(Text)
+    video_id = Column(Integer, ForeignKey("video_analyses.id"))
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Frames analyzed so far, moved into VideoFrame when the job completes
+    frames = relationship("VideoJobFrame", back_populates="job", cascade="all, delete-orphan")
+    
+    def to_dict(self):
+        """Convert model to dictionary"""
+        return {
+            "job_id": self.id,
+            "filename": self.filename,
+            "status": self.status,
+            "frame_interval": self.frame_interval,
+            "adaptive_sampling": bool(self.adaptive_sampling),
+            "detector_backend": self.detector_backend,
+            "total_frames": self.total_frames,
+            "processed_frames": self.next_frame,
+            "progress": round(min(self.next_frame / self.total_frames, 1.0) * 100, 2) if self.total_frames else 0.0,
+            "error": self.error,
+            "video_id": self.video_id,
+            "created_at": self.created_at.isoformat(),
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+        }
+
+class VideoJobFrame(Base):
+    __tablename__ = "video_job_frames"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(String, ForeignKey("video_jobs.id"), nullable=False, index=True)
+    frame_number = Column(Integer, nullable=False)
+    timestamp = Column(Float, nullable=False)
+    dominant_emotion = Column(String)
+    dominant_confidence = Column(Float)
+    emotions_data = Column(Text)  # JSON string of top_k_emotions
+    # Full emotion distribution, one column per emotion (percentages)
+    angry = Column(Float)
+    disgust = Column(Float)
+    fear = Column(Float)
+    happy = Column(Float)
+    sad = Column(Float)
+    surprise = Column(Float)
+    neutral = Column(Float)
+    frame_blob = Column(String, index=True)  # Blob store reference of the frame JPEG
+    
+    job = relationship("VideoJob", back_populates="frames")
+    
+    def to_frame_analysis(self, include_blob=False):
+        """Convert to the frame_analyses entry shape used by the /video response"""
+        result = {
+            "frame": self.frame_number,
+            "timestamp": self.timestamp,
+            "top_k_emotions": json.loads(self.emotions_data),
+            "dominant_emotion": self.dominant_emotion,
+            "dominant_confidence": self.dominant_confidence,
+        }
+        if self.angry is not None:
+            result["emotions"] = {emo: getattr(self, emo) for emo in EMOTION_COLUMNS}
+        if include_blob:
+            result["frame_blob"] = self.frame_blob
+        return result
+
+class AnalysisCacheEntry(Base):
+    __tablename__ = "analysis_cache"
+    
+    key = Column(String, primary_key=True)  # Hash of the decoded pixels and analysis settings
+    analysis = Column(Text, nullable=False)  # JSON analysis result
+    last_used = Column(DateTime, default=datetime.utcnow, index=True)
+
+class Face(Base):
+    """One detected face of an image or a sampled video frame (multi-face mode)"""
+    __tablename__ = "faces"
+    __table_args__ = (
+        Index("ix_faces_video_id_track_id_frame_number", "video_id", "track_id", "frame_number"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    image_id = Column(Integer, ForeignKey("image_analyses.id"), index=True)
+    video_id = Column(Integer, ForeignKey("video_analyses.id"))
+    frame_number = Column(Integer)
+    timestamp = Column(Float)
+    face_index = Column(Integer, nullable=False)  # Order of the face within its image/frame
+    track_id = Column(Integer)  # Identity across video frames, when tracking is enabled
+    x = Column(Integer, nullable=False)
+    y = Column(Integer, nullable=False)
+    w = Column(Integer, nullable=False)
+    h = Column(Integer, nullable=False)
+    confidence = Column(Float)
+    dominant_emotion = Column(String)
+    # Emotion distribution, one column per emotion (percentages)
+    angry = Column(Float)
+    disgust = Column(Float)
+    fear = Column(Float)
+    happy = Column(Float)
+    sad = Column(Float)
+    surprise = Column(Float)
+    neutral = Column(Float)
+    
+    def to_dict(self):
+        """Convert model to dictionary"""
+        return {
+            "face_index": self.face_index,
+            "frame_number": self.frame_number,
+            "timestamp": self.timestamp,
+            "track_id": self.track_id,
+            "region": {"x": self.x, "y": self.y, "w": self.w, "h": self.h},
+            "confidence": self.confidence,
+            "dominant_emotion": self.dominant_emotion,
+            "emotions": {emo: getattr(self, emo) for emo in EMOTION_COLUMNS},
+        }
@@ -0,0 +1,161 @@
+"""
+Reduced-precision CPU inference for the emotion classifier.
+
+The Keras emotion CNN is converted once with the TensorFlow Lite converter,
+to float16 weights or to int8 weights and activations, and the converted
+model is cached on disk under a name derived from the Keras weights, so a
+changed model is converted again. TFLiteEmotionModel runs it behind the same
+predict() call as the Keras model, so analyze_frames_batched works with
+either.
+
+int8 needs calibration inputs to pick activation ranges. Without real face
+crops it is calibrated on synthetic faces; `python benchmark.py quantization
+--fixtures <dir>` converts with detected fixture faces instead and replaces
+the cached model.
+"""
+import hashlib
+import os
+import threading
+
+import cv2
+import numpy as np
+
+from config import QUANTIZED_MODEL_DIR, TFLITE_THREADS
+
+EMOTION_PRECISIONS = ("float32", "float16", "int8")
+
+# Input of the emotion CNN: one 48x48 grayscale face
+INPUT_SHAPE = (48, 48, 1)
+
+# Synthetic faces used to calibrate int8 when no face crops are given
+SYNTHETIC_CALIBRATION_FACES = 200
+
+
+def weights_fingerprint(keras_model) -> str:
+    """Short hash of a Keras model's weights, part of the cached model's file name."""
+    digest = hashlib.sha256()
+    for weights in keras_model.get_weights():
+        digest.update(np.ascontiguousarray(weights).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def cached_model_path(keras_model, precision: str, model_dir: str = QUANTIZED_MODEL_DIR) -> str:
+    return os.path.join(model_dir, f"emotion-{precision}-{weights_fingerprint(keras_model)}.tflite")
+
+
+def synthetic_faces(count: int = SYNTHETIC_CALIBRATION_FACES, seed: int = 0) -> np.ndarray:
+    """Face-like grayscale inputs (an oval with eyes and a mouth, varied in shape and light)."""
+    rng = np.random.default_rng(seed)
+    faces = np.empty((count, *INPUT_SHAPE), dtype=np.float32)
+    for i in range(count):
+        face = np.full((48, 48), rng.uniform(0.05, 0.4), dtype=np.float32)
+        skin = rng.uniform(0.5, 0.9)
+        cv2.ellipse(face, (24, 24), (int(rng.integers(14, 20)), int(rng.integers(18, 23))), 0, 0, 360, skin, -1)
+        for eye_x in (17, 31):
+            cv2.circle(face, (eye_x, int(rng.integers(18, 22))), 2, skin * 0.3, -1)
+        cv2.ellipse(face, (24, 33), (int(rng.integers(4, 9)), int(rng.integers(1, 4))), 0, 0, 360, skin * 0.4, -1)
+        face += rng.normal(0, 0.03, face.shape).astype(np.float32)
+        faces[i, :, :, 0] = np.clip(face, 0, 1)
+    return faces
+
+
+def face_inputs(images: list, detector_backend: str = None) -> np.ndarray:
+    """Emotion model inputs of the first face detected in each BGR image, stacked as (N, 48, 48, 1)."""
+    from deepface.modules import detection
+    from inference import _emotion_input, registry
+
+    detector_backend = detector_backend or registry.detector_backend
+    faces = []
+    for img in images:
+        face_objs = detection.extract_faces(
+            img_path=img, detector_backend=detector_backend, grayscale=False, enforce_detection=False, align=True
+        )
+        face = face_objs[0]["face"] if face_objs else None
+        if face is not None and face.shape[0] and face.shape[1]:
+            faces.append(_emotion_input(face))
+    if not faces:
+        return np.empty((0, *INPUT_SHAPE), dtype=np.float32)
+    return np.expand_dims(np.stack(faces), axis=-1).astype(np.float32)
+
+
+def convert_emotion_model(keras_model, precision: str, calibration: np.ndarray = None) -> bytes:
+    """Convert the Keras emotion model to a TFLite flatbuffer of the given precision."""
+    import tensorflow as tf
+
+    if precision not in EMOTION_PRECISIONS or precision == "float32":
+        raise ValueError(f"Unknown reduced precision '{precision}', expected 'float16' or 'int8'")
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if precision == "float16":
+        converter.target_spec.supported_types = [tf.float16]
+    else:
+        if calibration is None or not len(calibration):
+            calibration = synthetic_faces()
+
+        def representative_dataset():
+            for face in calibration:
+                yield [face[None, ...].astype(np.float32)]
+
+        # int8 weights and activations; input and output stay float32
+        converter.representative_dataset = representative_dataset
+    return converter.convert()
+
+
+def load_emotion_model(keras_model, precision: str, calibration: np.ndarray = None, rebuild: bool = False):
+    """
+    TFLiteEmotionModel of the given precision, converting and caching it on
+    first use (or when `rebuild` is set).
+    """
+    path = cached_model_path(keras_model, precision)
+    if rebuild or not os.path.exists(path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(convert_emotion_model(keras_model, precision, calibration))
+        os.replace(tmp_path, path)  # Atomic, so workers converting at once never read a partial file
+        print(f"✅ Converted the emotion model to {precision}: {path}")
+    return TFLiteEmotionModel(path)
+
+
+class TFLiteEmotionModel:
+    """
+    A converted emotion model with the predict() signature of the Keras one.
+    TFLite interpreters are not thread-safe, so every thread gets its own.
+    """
+
+    def __init__(self, model_path: str, threads: int = TFLITE_THREADS):
+        self.model_path = model_path
+        self.threads = threads
+        with open(model_path, "rb") as f:
+            self.model_content = f.read()
+        self._local = threading.local()
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self.model_content)
+
+    def _interpreter(self, batch: int):
+        import tensorflow as tf
+
+        state = getattr(self._local, "state", None)
+        if state is None:
+            interpreter = tf.lite.Interpreter(model_content=self.model_content, num_threads=self.threads)
+            state = self._local.state = [interpreter, None]
+        interpreter, allocated = state
+        if allocated != batch:
+            interpreter.resize_tensor_input(interpreter.get_input_details()[0]["index"], (batch, *INPUT_SHAPE))
+            interpreter.allocate_tensors()
+            state[1] = batch
+        return interpreter
+
+    def predict(self, batch: np.ndarray, batch_size: int = 32, verbose: int = 0) -> np.ndarray:
+        """Class probabilities of a (N, 48, 48, 1) batch, run `batch_size` faces at a time."""
+        outputs = []
+        for start in range(0, len(batch), batch_size):
+            chunk = np.ascontiguousarray(batch[start:start + batch_size], dtype=np.float32)
+            interpreter = self._interpreter(len(chunk))
+            interpreter.set_tensor(interpreter.get_input_details()[0]["index"], chunk)
+            interpreter.invoke()
+            outputs.append(interpreter.get_tensor(interpreter.get_output_details()[0]["index"]).copy())
+        return np.concatenate(outputs) if outputs else np.empty((0, 7), dtype=np.float32)
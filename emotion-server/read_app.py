@@ -0,0 +1,38 @@
+"""
+Read-only API process: history listings and stored results, nothing else.
+
+Serves the routes of reads.py without importing DeepFace, TensorFlow,
+OpenCV or PIL and without loading any model, so it starts in well under a
+second and idles at a fraction of the full server's memory. Run it next to
+the analysis server on the same database and blob store, and route GET
+traffic to it:
+
+    uvicorn read_app:app --port 8001
+    python serve.py --role read --port 8001
+
+It never creates or migrates tables; the analysis server does that on
+startup. Frames of videos analyzed with EMOTION_FRAME_STORAGE=none are the
+one exception to the light imports: the first such request imports OpenCV
+to extract the frame.
+"""
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+
+from reads import router as reads_router
+
+app = FastAPI()
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+app.include_router(reads_router)
+
+@app.get("/ready")
+def readiness():
+    """ Ready as soon as the process is up: there are no models to load """
+    return {"status": "ready", "role": "read"}
@@ -0,0 +1,342 @@
+"""
+Read-only endpoints: history listings and stored analysis results.
+
+These only query the database and the blob store, so this module must not
+import the analysis stack (DeepFace, TensorFlow, OpenCV, PIL). main.py
+includes the router next to the analysis endpoints, and read_app.py serves
+it alone as a process that starts in well under a second.
+"""
+from fastapi import APIRouter, Request, Response, HTTPException, Depends, Query
+from fastapi.responses import FileResponse, JSONResponse
+from sqlalchemy.orm import Session, defer
+import os
+import json
+import numpy as np
+from typing import Optional
+from datetime import datetime
+
+from database import get_db
+from crud import list_history, load_frame_scores
+from storage import blob_store, image_media_type, stored_media_type
+from models import ImageAnalysis, VideoAnalysis, VideoFrame, Face
+from aggregation import top_k_rows
+from timeline import TIMELINE_METHODS, bucket_means, lttb_indices
+from config import FRAME_THUMBNAIL_WIDTH, FRAME_IMAGE_FORMAT, FRAME_IMAGE_QUALITY
+
+# Largest page the history listings will return
+MAX_PAGE_SIZE = 1000
+
+# Most points a downsampled video timeline will return
+MAX_TIMELINE_POINTS = 5000
+
+router = APIRouter()
+
+@router.get("/images")
+def get_all_images(
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    dominant_emotion: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    db: Session = Depends(get_db)
+):
+    """ Get saved image analyses, newest first, one page at a time """
+    try:
+        images, total, next_cursor = list_history(
+            db,
+            ImageAnalysis,
+            [ImageAnalysis.filename, ImageAnalysis.dominant_emotion, ImageAnalysis.dominant_confidence],
+            limit, cursor, dominant_emotion, start_date, end_date
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return JSONResponse(content={
+        "total": total,
+        "next_cursor": next_cursor,
+        "images": [
+            {
+                "id": img.id,
+                "filename": img.filename,
+                "upload_date": img.upload_date.isoformat(),
+                "dominant_emotion": img.dominant_emotion,
+                "dominant_confidence": img.dominant_confidence,
+            }
+            for img in images
+        ]
+    })
+    
+@router.get("/image/{image_id}")
+def get_image_analysis(image_id: int, db: Session = Depends(get_db)):
+    """ Get a specific image analysis by ID """
+    # Leave out the legacy inline image of rows not yet moved to the blob store
+    img = db.query(ImageAnalysis).options(defer(ImageAnalysis.image_data)).filter(
+        ImageAnalysis.id == image_id
+    ).first()
+    
+    if not img:
+        raise HTTPException(status_code=404, detail="Image analysis not found")
+    
+    return JSONResponse(content={
+        "id": img.id,
+        "filename": img.filename,
+        "upload_date": img.upload_date.isoformat(),
+        "dominant_emotion": img.dominant_emotion,
+        "dominant_confidence": img.dominant_confidence,
+        "analysis_data": json.loads(img.analysis_data),
+        "timings": json.loads(img.timing_data) if img.timing_data else None,
+        "faces": [
+            face.to_dict()
+            for face in db.query(Face).filter(Face.image_id == image_id).order_by(Face.face_index)
+        ]
+    })
+    
+def blob_file_response(request: Request, ref: str, media_type: str = None):
+    """
+    Serve a blob store file with a content-hash ETag; FileResponse handles Range requests.
+    The media type of frame images is read from the file when not given.
+    """
+    etag = f'"{ref}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    
+    path = blob_store.path(ref)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="File not found in blob store")
+    
+    return FileResponse(path, media_type=media_type or stored_media_type(path), headers=headers)
+
+@router.get("/image/{image_id}/file")
+def get_image_file(image_id: int, request: Request, db: Session = Depends(get_db)):
+    """ Retrieve the original image file by ID """
+    img = db.query(ImageAnalysis.image_blob, ImageAnalysis.file_type).filter(
+        ImageAnalysis.id == image_id
+    ).first()
+    
+    if not img:
+        raise HTTPException(status_code=404, detail="Image not found")
+    
+    if img.image_blob:
+        return blob_file_response(request, img.image_blob, img.file_type)
+    
+    # Rows not yet moved by migrate_blobs.py still hold the image inline
+    image_data = db.query(ImageAnalysis.image_data).filter(ImageAnalysis.id == image_id).scalar()
+    return Response(
+        content=image_data,
+        media_type=img.file_type
+    )
+
+
+@router.get("/videos")
+def get_all_videos(
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    dominant_emotion: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    db: Session = Depends(get_db)
+):
+    """ Get saved video analyses, newest first, one page at a time """
+    try:
+        videos, total, next_cursor = list_history(
+            db,
+            VideoAnalysis,
+            [
+                VideoAnalysis.filename,
+                VideoAnalysis.duration_seconds,
+                VideoAnalysis.total_frames,
+                VideoAnalysis.analyzed_frames,
+                VideoAnalysis.fps,
+                VideoAnalysis.dominant_emotion,
+                VideoAnalysis.dominant_confidence,
+            ],
+            limit, cursor, dominant_emotion, start_date, end_date
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return JSONResponse(content={
+        "total": total,
+        "next_cursor": next_cursor,
+        "videos": [
+            {
+                "id": vid.id,
+                "filename": vid.filename,
+                "upload_date": vid.upload_date.isoformat(),
+                "duration_seconds": vid.duration_seconds,
+                "total_frames": vid.total_frames,
+                "analyzed_frames": vid.analyzed_frames,
+                "fps": vid.fps,
+                "dominant_emotion": vid.dominant_emotion,
+                "dominant_confidence": vid.dominant_confidence,
+            }
+            for vid in videos
+        ]
+    })
+    
+def timeline_frames(timeline: dict, points: Optional[int], method: str):
+    """ Frame entries of a loaded timeline, downsampled to about `points` entries """
+    timestamps, scores = timeline["timestamps"], timeline["scores"]
+    
+    if method == "bucket" and points is not None:
+        first_index, mean_timestamps, mean_scores, counts = bucket_means(timestamps, scores, points)
+        return [
+            {
+                "frame_number": int(timeline["frame_numbers"][i]),
+                "timestamp": round(float(t), 2),
+                "dominant_emotion": top_k[0]["emotion"] if top_k else None,
+                "dominant_confidence": top_k[0]["confidence"] if top_k else None,
+                "emotions_data": top_k,
+                "frames_in_bucket": int(count)
+            }
+            for i, t, top_k, count in zip(first_index, mean_timestamps, top_k_rows(mean_scores, k=3), counts)
+        ]
+    
+    kept = lttb_indices(timestamps, scores, points) if points is not None else np.arange(len(timestamps))
+    return [
+        {
+            "frame_number": int(timeline["frame_numbers"][i]),
+            "timestamp": float(timestamps[i]),
+            "dominant_emotion": timeline["dominant_emotions"][i],
+            "dominant_confidence": timeline["dominant_confidences"][i],
+            "emotions_data": top_k
+        }
+        for i, top_k in zip(kept.tolist(), top_k_rows(scores[kept], k=3))
+    ]
+
+@router.get("/video/{video_id}")
+def get_video_analysis(
+    video_id: int,
+    start: Optional[float] = Query(None, ge=0),
+    end: Optional[float] = Query(None, ge=0),
+    points: Optional[int] = Query(None, ge=3, le=MAX_TIMELINE_POINTS),
+    method: str = "lttb",
+    db: Session = Depends(get_db)
+):
+    """ Get a specific video analysis by ID, with its frames in [start, end] seconds, downsampled to `points` """
+    if method not in TIMELINE_METHODS:
+        raise HTTPException(status_code=400, detail=f"Unknown method '{method}'. Allowed: {list(TIMELINE_METHODS)}")
+    
+    vid = db.query(VideoAnalysis).filter(VideoAnalysis.id == video_id).first()
+    
+    if not vid:
+        raise HTTPException(status_code=404, detail="Video analysis not found")
+    
+    timeline = load_frame_scores(db, video_id, start, end)
+    frame_data = timeline_frames(timeline, points, method)
+    
+    return JSONResponse(content={
+        "id": vid.id,
+        "filename": vid.filename,
+        "upload_date": vid.upload_date.isoformat(),
+        "duration_seconds": vid.duration_seconds,
+        "total_frames": vid.total_frames,
+        "analyzed_frames": vid.analyzed_frames,
+        "fps": vid.fps,
+        "frame_interval": vid.frame_interval,
+        "dominant_emotion": vid.dominant_emotion,
+        "dominant_confidence": vid.dominant_confidence,
+        "detector_backend": vid.detector_backend,
+        "aggregated_data": json.loads(vid.aggregated_data),
+        "timings": json.loads(vid.timing_data) if vid.timing_data else None,
+        "timeline": {
+            "start": start,
+            "end": end,
+            "points": points,
+            "method": method if points is not None else None,
+            "frames_in_range": len(timeline["timestamps"])
+        },
+        "frames": frame_data
+    })
+    
+@router.get("/video/{video_id}/faces")
+def get_video_faces(video_id: int, track_id: Optional[int] = None, db: Session = Depends(get_db)):
+    """ Per-face emotion timelines of a video analyzed in multi-face mode, grouped by track """
+    if not db.query(VideoAnalysis.id).filter(VideoAnalysis.id == video_id).first():
+        raise HTTPException(status_code=404, detail="Video analysis not found")
+    
+    query = db.query(Face).filter(Face.video_id == video_id)
+    if track_id is not None:
+        query = query.filter(Face.track_id == track_id)
+    faces = query.order_by(Face.track_id, Face.frame_number, Face.face_index).all()
+    
+    tracks = {}
+    untracked = []
+    for face in faces:
+        if face.track_id is None:
+            untracked.append(face.to_dict())
+        else:
+            tracks.setdefault(face.track_id, []).append(face.to_dict())
+    
+    return JSONResponse(content={
+        "video_id": video_id,
+        "tracks": [
+            {"track_id": tid, "frames": timeline}
+            for tid, timeline in tracks.items()
+        ],
+        "untracked": untracked
+    })
+
+@router.get("/video/{video_id}/frame/{frame_number}/file")
+def get_video_frame_file(video_id: int, frame_number: int, request: Request, db: Session = Depends(get_db)):
+    """ Get the actual image file for a specific video frame """
+    frame = db.query(VideoFrame.id, VideoFrame.frame_blob).filter(
+        VideoFrame.video_id == video_id,
+        VideoFrame.frame_number == frame_number
+    ).first()
+
+    if not frame:
+        raise HTTPException(status_code=404, detail="Frame image not found")
+
+    if frame.frame_blob:
+        return blob_file_response(request, frame.frame_blob)
+
+    # Rows not yet moved by migrate_blobs.py still hold the JPEG inline
+    frame_image = db.query(VideoFrame.frame_image).filter(VideoFrame.id == frame.id).scalar()
+    if frame_image:
+        return Response(content=frame_image, media_type="image/jpeg")
+
+    # Analyzed without frame images: extract the frame from the kept source video
+    source_blob = db.query(VideoAnalysis.source_blob).filter(VideoAnalysis.id == video_id).scalar()
+    if not source_blob or not blob_store.exists(source_blob):
+        raise HTTPException(status_code=404, detail="Frame image not found")
+
+    etag = f'"{source_blob}-{frame_number}-{FRAME_THUMBNAIL_WIDTH}-{FRAME_IMAGE_FORMAT}-{FRAME_IMAGE_QUALITY}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=86400"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    from frames import render_video_frame  # OpenCV is only needed for this fallback
+
+    data = render_video_frame(blob_store.path(source_blob), source_blob, frame_number)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Frame image not found")
+
+    return Response(content=data, media_type=image_media_type(data), headers=headers)
+
+@router.get("/video/{video_id}/frame/{frame_number}")
+def get_video_frame_analysis(video_id: int, frame_number: int, db: Session = Depends(get_db)):
+    """ Get analysis data for a specific video frame """
+    frame = db.query(
+        VideoFrame.frame_number,
+        VideoFrame.timestamp,
+        VideoFrame.dominant_emotion,
+        VideoFrame.dominant_confidence,
+        VideoFrame.emotions_data
+    ).filter(
+        VideoFrame.video_id == video_id,
+        VideoFrame.frame_number == frame_number
+    ).first()
+
+    if not frame:
+        raise HTTPException(status_code=404, detail="Frame analysis not found")
+
+    return JSONResponse(content={
+        "frame_number": frame.frame_number,
+        "timestamp": frame.timestamp,
+        "dominant_emotion": frame.dominant_emotion,
+        "dominant_confidence": frame.dominant_confidence,
+        "emotions_data": json.loads(frame.emotions_data)
+    })
@@ -0,0 +1,168 @@
+"""
+Frame sampling for video analysis.
+
+Frames that will not be analyzed are skipped with VideoCapture.grab(), which
+demuxes and advances the stream without converting the frame to a BGR
+image, or with a keyframe seek for large gaps. Only sampled frames are
+retrieved.
+
+Adaptive sampling instead picks frames by how much the picture changed
+since the last sample, so static footage is sampled sparsely and cuts are
+caught when they happen.
+"""
+import math
+
+import cv2
+import numpy as np
+
+from config import ADAPTIVE_MAX_GAP_SECONDS, ADAPTIVE_MIN_GAP_SECONDS, ADAPTIVE_THRESHOLD
+
+SAMPLING_STRATEGIES = ("grab", "seek")
+
+# With the "seek" strategy, gaps shorter than this are still skipped with grab();
+# a seek restarts decoding at the previous keyframe, which only pays off for long gaps
+MIN_SEEK_GAP = 90
+
+# Side length of the grayscale thumbnail adaptive sampling compares frames by
+SIGNATURE_SIZE = 32
+
+
+def sample_step(fps: float, frame_interval: int = None, samples_per_second: float = None) -> float:
+    """Distance in frames between samples, from a frame count or a time-based rate."""
+    if samples_per_second:
+        if fps <= 0:
+            return 1.0
+        return max(fps / samples_per_second, 1.0)
+    return float(frame_interval)
+
+
+def effective_frame_interval(fps: float, frame_interval: int = None, samples_per_second: float = None) -> int:
+    """Integer stride recorded with an analysis, rounded for time-based sampling."""
+    return max(1, round(sample_step(fps, frame_interval, samples_per_second)))
+
+
+def sampled_frame_numbers(step: float, start_frame: int = 0):
+    """Yield the indices of sampled frames at or after start_frame, forever."""
+    def frame_number(k):
+        return math.ceil(k * step - 1e-9)
+
+    # Smallest k whose frame is at or after start_frame. ceil(start_frame / step)
+    # is off by one when start_frame itself is a sample of a fractional step
+    k = max(0, math.floor((start_frame - 1) / step))
+    while frame_number(k) < start_frame:
+        k += 1
+    while True:
+        yield frame_number(k)
+        k += 1
+
+
+def segment_bounds(step: float, total_frames: int, batch_size: int, segments: int) -> list:
+    """
+    Split the sampled frames of a video into at most `segments` runs of whole
+    batches. Returns [(start_frame, end_frame), ...] with each start on a
+    sampled frame; the last segment has no end_frame.
+    """
+    samples = []
+    for frame_number in sampled_frame_numbers(step):
+        if frame_number >= total_frames:
+            break
+        samples.append(frame_number)
+
+    batches = math.ceil(len(samples) / batch_size)
+    segments = max(1, min(segments, batches))
+    starts = [samples[round(i * batches / segments) * batch_size] if samples else 0 for i in range(segments)]
+    return list(zip(starts, starts[1:] + [None]))
+
+
+def iter_sampled_frames(cap, step: float, start_frame: int = 0, strategy: str = "grab", end_frame: int = None):
+    """
+    Yield (frame_number, bgr_frame) for every sampled frame of an open capture,
+    stopping before end_frame when given.
+
+    With an integer step this produces exactly the frames of the
+    `frame_count % frame_interval == 0` loop, without decoding the others.
+    """
+    if strategy not in SAMPLING_STRATEGIES:
+        raise ValueError(f"Unknown sampling strategy '{strategy}', expected one of {SAMPLING_STRATEGIES}")
+
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+    position = start_frame  # index of the next frame the capture will return
+
+    for target in sampled_frame_numbers(step, start_frame):
+        if end_frame is not None and target >= end_frame:
+            return
+        gap = target - position
+        if strategy == "seek" and gap >= MIN_SEEK_GAP:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+            position = target
+        else:
+            while position < target:
+                if not cap.grab():
+                    return
+                position += 1
+
+        ret, frame = cap.read()
+        if not ret:
+            return
+        position += 1
+        yield target, frame
+
+
+def average_frame_interval(total_frames: int, sampled_frames: int) -> int:
+    """Mean stride of an adaptively sampled video, recorded as its frame_interval."""
+    if not sampled_frames:
+        return 1
+    return max(1, round(total_frames / sampled_frames))
+
+
+def frame_signature(frame) -> np.ndarray:
+    """Small grayscale thumbnail (0-1) that adaptive sampling compares frames by."""
+    small = cv2.resize(frame, (SIGNATURE_SIZE, SIGNATURE_SIZE), interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.float32) / 255
+
+
+def iter_adaptive_frames(
+    cap,
+    fps: float,
+    start_frame: int = 0,
+    threshold: float = ADAPTIVE_THRESHOLD,
+    min_gap_seconds: float = ADAPTIVE_MIN_GAP_SECONDS,
+    max_gap_seconds: float = ADAPTIVE_MAX_GAP_SECONDS
+):
+    """
+    Yield (frame_number, bgr_frame) for the frames worth analyzing: the first
+    one, every frame whose signature differs from the last sampled frame's by
+    at least `threshold`, and a frame whenever `max_gap_seconds` pass without
+    a sample. Frames closer than `min_gap_seconds` to the last sample are
+    skipped with grab() without being compared.
+    """
+    min_gap = max(1, round(min_gap_seconds * fps)) if fps > 0 else 1
+    max_gap = max(min_gap, round(max_gap_seconds * fps)) if fps > 0 else 1
+
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+    position = start_frame
+    last_sampled = None
+    reference = None
+
+    while True:
+        if last_sampled is not None and position - last_sampled < min_gap:
+            if not cap.grab():
+                return
+            position += 1
+            continue
+
+        ret, frame = cap.read()
+        if not ret:
+            return
+        frame_number = position
+        position += 1
+
+        signature = frame_signature(frame)
+        if (
+            reference is None
+            or frame_number - last_sampled >= max_gap
+            or float(np.abs(signature - reference).mean()) >= threshold
+        ):
+            last_sampled = frame_number
+            reference = signature
+            yield frame_number, frame
@@ -0,0 +1,91 @@
+"""
+Production launcher: several server processes behind one port.
+
+Usage (from emotion-server/):
+    python serve.py [--workers 4] [--host 0.0.0.0] [--port 8000] [--role all|read]
+
+Runs gunicorn with uvicorn workers. The app and its libraries (TensorFlow,
+DeepFace, OpenCV) are imported once in the master before the workers are
+forked, so their code and module data are shared copy-on-write; gc.freeze()
+keeps the garbage collector from touching, and so copying, those objects.
+The database tables are created and migrated there too, once, so the
+workers never race on schema changes. The model weights themselves are
+loaded by each worker after the fork, during its startup, because
+TensorFlow's runtime is not fork-safe. Each worker reports ready on /ready
+once its models are warmed up.
+
+Use EMOTION_WORKER_MODE=thread (the default) here: every server process
+already is a separate analysis process.
+
+With --role read the workers serve read_app.py instead: history and stored
+results only, without the analysis libraries or models, so they start in
+well under a second and are ready at once.
+"""
+import argparse
+import gc
+import importlib
+
+from gunicorn.app.base import BaseApplication
+
+from config import SERVER_TIMEOUT, SERVER_WORKERS
+
+
+# Module whose `app` each role serves
+ROLES = {
+    "all": "main",
+    "read": "read_app",
+}
+
+
+def when_ready(server):
+    # Runs in the master after the app was preloaded, before any worker is forked
+    gc.freeze()
+    server.log.info(f"✅ Preloaded app, starting {server.num_workers} workers")
+
+
+class EmotionServer(BaseApplication):
+    def __init__(self, options: dict, role: str = "all"):
+        self.options = options
+        self.role = role
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        app = importlib.import_module(ROLES[self.role]).app
+        if self.role == "all":
+            # Create and migrate the tables once here in the master: workers doing it
+            # at the same time race on ALTER TABLE / CREATE INDEX, and one failed
+            # worker boot stops the whole server
+            from database import engine, init_db
+            init_db()
+            engine.dispose()  # Workers must not inherit the master's connections
+            app.state.db_initialized = True
+            print("✅ Database initialized!")
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--role", choices=sorted(ROLES), default="all", help="'read' serves only the read-only API")
+    args = parser.parse_args()
+
+    EmotionServer({
+        "bind": f"{args.host}:{args.port}",
+        "workers": args.workers,
+        "worker_class": "uvicorn.workers.UvicornWorker",
+        "preload_app": True,
+        "when_ready": when_ready,
+        "timeout": SERVER_TIMEOUT,
+        "graceful_timeout": 30,
+        "keepalive": 5,
+    }, role=args.role).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Segment-sharded video analysis.
+
+A video is split into segments of consecutive sampled frames, and each
+segment is analyzed by its own analysis pool job, which opens its own
+capture and seeks to the segment's first sampled frame. Segment boundaries
+fall on batch boundaries of the sequential path, so every inference batch
+holds the same frames, and the merged batches are aggregated in the same
+order: frame numbers and aggregates are identical to analyze_video_file.
+
+Sampling that depends on earlier frames cannot be split this way: adaptive
+sampling, face tracking and face box reuse (detect_every above 1) always
+run sequentially.
+"""
+import asyncio
+
+from aggregation import EmotionAccumulator
+from analysis import iter_video_analyses, probe_video
+from metrics import StageTimings
+from sampling import effective_frame_interval, sample_step, segment_bounds
+
+
+def can_shard(adaptive: bool = False, track_faces: bool = False, detect_every: int = 1) -> bool:
+    """Whether a video analysis with these settings gives the same results when sharded."""
+    return not adaptive and not track_faces and detect_every <= 1
+
+
+def plan_video_segments(
+    path: str,
+    frame_interval: int,
+    batch_size: int,
+    segments: int,
+    samples_per_second: float = None
+):
+    """
+    Probe a video and split its sampled frames into at most `segments` runs
+    of whole batches. Returns (video_info, [(start_frame, end_frame), ...]);
+    the last segment has no end_frame, so it reads to the end of the stream
+    even when the container's frame count is off.
+    """
+    video_info = probe_video(path)
+    step = sample_step(video_info["fps"], frame_interval, samples_per_second)
+    return video_info, segment_bounds(step, video_info["total_frames"], batch_size, segments)
+
+
+def analyze_video_segment(
+    path: str,
+    start_frame: int,
+    end_frame: int,
+    frame_interval: int,
+    batch_size: int,
+    samples_per_second: float = None,
+    multi_face: bool = False,
+    detector_backend: str = None,
+    timings: StageTimings = None
+) -> list:
+    """Analyze the sampled frames in [start_frame, end_frame) of a video. Returns its frame_analyses batches."""
+    if timings is None:
+        timings = StageTimings()
+    batches = [
+        batch for batch, _ in iter_video_analyses(
+            path,
+            frame_interval,
+            batch_size,
+            start_frame=start_frame,
+            samples_per_second=samples_per_second,
+            multi_face=multi_face,
+            detector_backend=detector_backend,
+            timings=timings,
+            end_frame=end_frame
+        )
+    ]
+    timings.frames = sum(len(batch) for batch in batches)
+    return batches
+
+
+def merge_video_segments(
+    video_info: dict,
+    segment_batches: list,
+    frame_interval: int,
+    samples_per_second: float = None
+) -> dict:
+    """Combine the batches of every segment, in segment order, into an analyze_video_file result."""
+    result = dict(video_info)
+    frame_analyses = []
+    accumulator = EmotionAccumulator(keep_frames=False)
+    for batches in segment_batches:
+        for batch in batches:
+            frame_analyses.extend(batch)
+            accumulator.add_frames(batch)
+
+    result["frame_interval"] = effective_frame_interval(result["fps"], frame_interval, samples_per_second)
+    result["frame_analyses"] = frame_analyses
+    result["aggregated"] = accumulator.summary()
+    return result
+
+
+async def analyze_video_sharded(
+    run,
+    path: str,
+    frame_interval: int,
+    batch_size: int,
+    segments: int,
+    samples_per_second: float = None,
+    multi_face: bool = False,
+    detector_backend: str = None,
+    timings: StageTimings = None
+) -> dict:
+    """
+    Analyze a video as up to `segments` concurrent jobs and merge the results.
+    `run(fn, *args, timings=...)` submits one job to the analysis pool, e.g.
+    main.run_analysis; segment timings are added to `timings`. When a segment
+    fails (or the pool rejects one), the segments still queued are cancelled.
+    """
+    loop = asyncio.get_running_loop()
+    video_info, bounds = await loop.run_in_executor(
+        None, plan_video_segments, path, frame_interval, batch_size, segments, samples_per_second
+    )
+
+    tasks = [
+        asyncio.ensure_future(run(
+            analyze_video_segment, path, start_frame, end_frame, frame_interval, batch_size,
+            samples_per_second, multi_face, detector_backend, timings=timings
+        ))
+        for start_frame, end_frame in bounds
+    ]
+    try:
+        segment_batches = await asyncio.gather(*tasks)
+    except BaseException:
+        # One failed segment fails the video: drop the segments still queued
+        # instead of analyzing them for a result that is thrown away
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    return merge_video_segments(video_info, segment_batches, frame_interval, samples_per_second)
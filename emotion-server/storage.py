@@ -0,0 +1,126 @@
+"""
+Content-addressed file store for uploaded images, frame images and kept source videos.
+
+Blobs are named by the SHA-256 of their bytes and sharded into two levels
+of directories (ab/cd/abcd...), so identical media is stored once and
+database rows only keep the hash as a reference.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+
+from config import BLOB_DIR
+
+
+class BlobStore:
+    def __init__(self, root: str = BLOB_DIR):
+        self.root = root
+
+    def path(self, ref: str) -> str:
+        """Filesystem path of a blob reference."""
+        return os.path.join(self.root, ref[:2], ref[2:4], ref)
+
+    def exists(self, ref: str) -> bool:
+        return os.path.exists(self.path(ref))
+
+    def modified_at(self, ref: str) -> float:
+        """Last time the blob was written or re-added, as a Unix timestamp, or None if it is missing."""
+        try:
+            return os.path.getmtime(self.path(ref))
+        except OSError:
+            return None
+
+    @staticmethod
+    def _touch(dest: str) -> bool:
+        """
+        Mark an existing blob as re-added, so release_blobs leaves it alone while
+        the new row referencing it is not committed yet. False if it does not exist.
+        """
+        try:
+            os.utime(dest)
+            return True
+        except FileNotFoundError:
+            return False
+        except OSError:  # e.g. not ours to touch; it still exists
+            return os.path.exists(dest)
+
+    def put(self, data: bytes) -> str:
+        """Store data and return its reference. Writing the same bytes twice only touches the blob."""
+        ref = hashlib.sha256(data).hexdigest()
+        dest = self.path(ref)
+        if self._touch(dest):
+            return ref
+
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        # Write to a temporary file first so readers never see a partial blob
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(dest), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, dest)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return ref
+
+    def put_file(self, src_path: str, move: bool = False, chunk_size: int = 1024 * 1024) -> str:
+        """
+        Store a file without reading it into memory and return its reference.
+        With `move`, the file is moved into the store (or removed if the blob exists).
+        """
+        digest = hashlib.sha256()
+        with open(src_path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+        ref = digest.hexdigest()
+        dest = self.path(ref)
+        if self._touch(dest):
+            if move:
+                os.remove(src_path)
+            return ref
+
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(dest), prefix=".tmp-")
+        os.close(fd)
+        try:
+            if move:
+                shutil.move(src_path, tmp_path)
+            else:
+                shutil.copyfile(src_path, tmp_path)
+            os.replace(tmp_path, dest)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return ref
+
+    def get(self, ref: str) -> bytes:
+        with open(self.path(ref), "rb") as f:
+            return f.read()
+
+    def delete(self, ref: str):
+        try:
+            os.remove(self.path(ref))
+        except FileNotFoundError:
+            pass
+
+
+blob_store = BlobStore()
+
+
+def image_media_type(data: bytes) -> str:
+    """Media type of a stored frame image, from its first bytes."""
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return "image/jpeg"
+
+
+def stored_media_type(path: str) -> str:
+    """Media type of a frame image file in the blob store."""
+    try:
+        with open(path, "rb") as f:
+            return image_media_type(f.read(12))
+    except OSError:
+        return "image/jpeg"
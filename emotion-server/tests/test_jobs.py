@@ -0,0 +1,58 @@
+"""
+Background video jobs remove their upload once they end, failed or not.
+
+Run from emotion-server/:
+    python -m unittest discover tests
+"""
+import importlib.util
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in a fresh interpreter inside a temporary directory, so the job gets its own database
+FAILING_JOB = """
+import os
+from database import SessionLocal, init_db
+from jobs import run_video_job
+from models import VideoJob
+
+init_db()
+with open("upload.mp4", "wb") as f:
+    f.write(b"not a video")
+
+db = SessionLocal()
+db.add(VideoJob(id="failing", filename="upload.mp4", source_path=os.path.abspath("upload.mp4"),
+                frame_interval=30, batch_size=16))
+db.commit()
+db.close()
+
+run_video_job("failing")
+
+db = SessionLocal()
+print(db.get(VideoJob, "failing").status, os.path.exists("upload.mp4"))
+"""
+
+
+@unittest.skipUnless(
+    importlib.util.find_spec("cv2") and importlib.util.find_spec("deepface"),
+    "needs the analysis stack (OpenCV, DeepFace)"
+)
+class VideoJobCleanupTest(unittest.TestCase):
+    def test_failed_job_removes_its_upload(self):
+        # Default database and blob store paths, which resolve inside tmp_dir
+        env = {key: value for key, value in os.environ.items() if not key.startswith("EMOTION_")}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            proc = subprocess.run(
+                [sys.executable, "-c", FAILING_JOB],
+                cwd=tmp_dir, env=dict(env, PYTHONPATH=SERVER_DIR), capture_output=True, text=True
+            )
+        self.assertEqual(proc.returncode, 0, proc.stderr)
+        self.assertEqual(proc.stdout.strip().splitlines()[-1], "failed False")
+
+
+if __name__ == "__main__":
+    unittest.main()
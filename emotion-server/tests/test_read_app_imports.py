@@ -0,0 +1,43 @@
+"""
+The read-only API process must start without the analysis stack.
+
+Run from emotion-server/:
+    python -m unittest discover tests
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules read_app.py (and everything it imports) must never load
+HEAVY_MODULES = ("tensorflow", "deepface", "cv2", "PIL")
+
+# Server modules of the analysis path, which would pull the libraries above in
+ANALYSIS_MODULES = ("analysis", "inference", "workers", "frames", "sharding", "quantized", "jobs")
+
+
+class ReadAppImportTest(unittest.TestCase):
+    def test_read_app_does_not_import_analysis_stack(self):
+        """Neither the analysis libraries nor the server modules that wrap them."""
+        # A fresh interpreter, so modules imported by other tests do not count
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            proc = subprocess.run(
+                [sys.executable, "-c", "import json, sys, read_app; print(json.dumps(sorted(sys.modules)))"],
+                cwd=tmp_dir, env=dict(os.environ, PYTHONPATH=SERVER_DIR), capture_output=True, text=True
+            )
+        self.assertEqual(proc.returncode, 0, proc.stderr)
+
+        modules = {name.split(".")[0] for name in json.loads(proc.stdout.strip().splitlines()[-1])}
+        self.assertIn("reads", modules)
+        for forbidden in (HEAVY_MODULES, ANALYSIS_MODULES):
+            with self.subTest(modules=forbidden):
+                loaded = sorted(modules & set(forbidden))
+                self.assertEqual(loaded, [], f"read_app imported {', '.join(loaded)}")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+"""
+Segment-sharded video analysis samples exactly the frames of a sequential run.
+
+Run from emotion-server/:
+    python -m unittest discover tests
+"""
+import itertools
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sampling import sample_step, sampled_frame_numbers, segment_bounds
+
+
+def sequential_samples(step: float, total_frames: int) -> list:
+    return list(itertools.takewhile(lambda n: n < total_frames, sampled_frame_numbers(step)))
+
+
+def sharded_samples(step: float, total_frames: int, batch_size: int, segments: int) -> list:
+    """Frames the segments of a sharded run sample, in segment order."""
+    frames = []
+    for start_frame, end_frame in segment_bounds(step, total_frames, batch_size, segments):
+        end_frame = total_frames if end_frame is None else end_frame
+        frames.extend(itertools.takewhile(lambda n: n < end_frame, sampled_frame_numbers(step, start_frame)))
+    return frames
+
+
+class ShardedSamplingTest(unittest.TestCase):
+    def test_start_on_a_fractional_sample_keeps_it(self):
+        self.assertEqual(next(sampled_frame_numbers(2.5, 3)), 3)
+        self.assertEqual(next(sampled_frame_numbers(2.5, 4)), 5)
+        self.assertEqual(next(sampled_frame_numbers(2.5, 0)), 0)
+
+    def test_sharded_frames_equal_sequential_frames(self):
+        cases = [
+            (29.97, None, 2.0, 120),  # fps / samples_per_second, the usual fractional step
+            (23.976, None, 3.0, 300),
+            (30.0, 7, None, 90),
+        ]
+        for fps, frame_interval, samples_per_second, seconds in cases:
+            step = sample_step(fps, frame_interval, samples_per_second)
+            total_frames = int(fps * seconds)
+            expected = sequential_samples(step, total_frames)
+            for batch_size, segments in itertools.product((1, 16, 32), (2, 3, 4, 8)):
+                with self.subTest(fps=fps, step=step, batch_size=batch_size, segments=segments):
+                    self.assertEqual(sharded_samples(step, total_frames, batch_size, segments), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
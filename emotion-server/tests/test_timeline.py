@@ -0,0 +1,89 @@
+"""
+Video timelines report the stored confidences of each frame unchanged.
+
+Run from emotion-server/:
+    python -m unittest discover tests
+"""
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from crud import load_frame_scores
+from models import Base, VideoAnalysis, VideoFrame
+from reads import timeline_frames
+
+# Scores that float32 cannot hold exactly
+SCORES = [
+    {
+        "angry": 0.1, "disgust": 0.01, "fear": 1.7, "happy": 91.23456789012,
+        "sad": 3.3, "surprise": 0.2, "neutral": 3.45543210988
+    },
+    {"angry": 2.2, "disgust": 0.03, "fear": 0.7, "happy": 11.1, "sad": 70.07, "surprise": 0.9, "neutral": 15.0},
+]
+
+
+def top_k(scores: dict) -> list:
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:3]
+    return [{"emotion": emotion, "confidence": confidence} for emotion, confidence in ranked]
+
+
+class TimelineConfidenceTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        engine = create_engine(f"sqlite:///{os.path.join(self.tmp_dir.name, 'timeline.db')}")
+        Base.metadata.create_all(engine)
+        self.db = sessionmaker(bind=engine)()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.addCleanup(engine.dispose)
+        self.addCleanup(self.db.close)
+
+        video = VideoAnalysis(
+            filename="clip.mp4", duration_seconds=1.0, total_frames=30, analyzed_frames=len(SCORES),
+            fps=30.0, frame_interval=15
+        )
+        self.db.add(video)
+        self.db.flush()
+        self.video_id = video.id
+        for i, scores in enumerate(SCORES):
+            stored = top_k(scores)
+            self.db.add(VideoFrame(
+                video_id=video.id, frame_number=i * 15, timestamp=i * 0.5,
+                dominant_emotion=stored[0]["emotion"], dominant_confidence=stored[0]["confidence"],
+                emotions_data=json.dumps(stored), **scores
+            ))
+        # A frame stored before the score columns existed, with only its top 3
+        legacy = top_k(SCORES[0])
+        self.db.add(VideoFrame(
+            video_id=video.id, frame_number=30, timestamp=1.0, dominant_emotion=legacy[0]["emotion"],
+            dominant_confidence=legacy[0]["confidence"], emotions_data=json.dumps(legacy)
+        ))
+        self.db.commit()
+
+    def stored_top_k(self) -> list:
+        return [
+            json.loads(data) for (data,) in
+            self.db.query(VideoFrame.emotions_data).filter(VideoFrame.video_id == self.video_id)
+            .order_by(VideoFrame.timestamp)
+        ]
+
+    def test_full_timeline_matches_stored_frames(self):
+        frames = timeline_frames(load_frame_scores(self.db, self.video_id), None, "lttb")
+        self.assertEqual([frame["emotions_data"] for frame in frames], self.stored_top_k())
+
+    def test_single_frame_buckets_match_stored_frames(self):
+        frames = timeline_frames(load_frame_scores(self.db, self.video_id), 100, "bucket")
+        self.assertEqual(len(frames), 3)
+        for frame, stored in zip(frames, self.stored_top_k()):
+            self.assertEqual(frame["dominant_confidence"], stored[0]["confidence"])
+            self.assertEqual(frame["emotions_data"], stored)
+
+
+if __name__ == "__main__":
+    unittest.main()
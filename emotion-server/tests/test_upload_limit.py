@@ -0,0 +1,91 @@
+"""
+Oversize video uploads are rejected before their body is fully received.
+
+Run from emotion-server/:
+    python -m unittest discover tests
+"""
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI, File, UploadFile
+
+from helpers import UploadSizeLimitMiddleware
+
+LIMIT_BYTES = 1024 * 1024
+CHUNK_BYTES = 64 * 1024
+BOUNDARY = "limit-test"
+
+
+def multipart_chunks(size: int):
+    """A multipart body with one `size`-byte file, split into CHUNK_BYTES messages."""
+    body = (
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="file"; filename="clip.mp4"\r\n'
+        f'Content-Type: video/mp4\r\n\r\n'.encode() + b"\0" * size + f"\r\n--{BOUNDARY}--\r\n".encode()
+    )
+    return [body[i:i + CHUNK_BYTES] for i in range(0, len(body), CHUNK_BYTES)]
+
+
+def build_app():
+    app = FastAPI()
+    app.add_middleware(UploadSizeLimitMiddleware, limits={"/video": LIMIT_BYTES})
+
+    @app.post("/video")
+    async def upload(file: UploadFile = File(...)):
+        return {"size": len(await file.read())}
+
+    return app
+
+
+def post(app, chunks: list, content_length: bool):
+    """POST the chunks to /video. Returns (status, chunks the app received)."""
+    headers = [(b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode())]
+    if content_length:
+        headers.append((b"content-length", str(sum(len(c) for c in chunks)).encode()))
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": "/video", "raw_path": b"/video", "root_path": "", "query_string": b"",
+        "headers": headers, "client": ("127.0.0.1", 1), "server": ("127.0.0.1", 80),
+    }
+    sent = 0
+    status = None
+
+    async def receive():
+        nonlocal sent
+        if sent < len(chunks):
+            sent += 1
+            return {"type": "http.request", "body": chunks[sent - 1], "more_body": sent < len(chunks)}
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    asyncio.run(app(scope, receive, send))
+    return status, sent
+
+
+class UploadSizeLimitTest(unittest.TestCase):
+    def test_oversize_content_length_rejected_without_reading_body(self):
+        status, received = post(build_app(), multipart_chunks(4 * LIMIT_BYTES), content_length=True)
+        self.assertEqual(status, 413)
+        self.assertEqual(received, 0)
+
+    def test_oversize_chunked_upload_rejected_while_streaming(self):
+        chunks = multipart_chunks(4 * LIMIT_BYTES)
+        status, received = post(build_app(), chunks, content_length=False)
+        self.assertEqual(status, 413)
+        self.assertLessEqual(received, LIMIT_BYTES // CHUNK_BYTES + 1)
+        self.assertLess(received, len(chunks))
+
+    def test_upload_within_limit_accepted(self):
+        status, received = post(build_app(), multipart_chunks(LIMIT_BYTES // 2), content_length=True)
+        self.assertEqual(status, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
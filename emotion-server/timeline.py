@@ -0,0 +1,78 @@
+"""
+Downsampling of per-frame emotion timelines for charts.
+
+Both methods take a sorted timestamp vector and a (frames x emotions)
+score matrix, as loaded from the numeric score columns of video_frames.
+"""
+import numpy as np
+
+TIMELINE_METHODS = ("lttb", "bucket")
+
+
+def lttb_indices(timestamps: np.ndarray, scores: np.ndarray, points: int) -> np.ndarray:
+    """
+    Indices of the frames kept by Largest-Triangle-Three-Buckets.
+
+    The first and last frames are always kept; every bucket in between keeps
+    the frame that forms the largest triangle with the frame kept from the
+    previous bucket and the mean of the next bucket. With several emotions
+    the triangle spans all of them (the norm of the per-emotion areas), so
+    a peak in any emotion survives. Kept frames are real frames, so their
+    images and frame numbers stay valid.
+    """
+    count = len(timestamps)
+    if points >= count:
+        return np.arange(count)
+    if points < 3:
+        return np.array([0, count - 1])
+
+    values = np.nan_to_num(scores.astype(np.float64))
+    edges = np.linspace(1, count - 1, points - 1).astype(int)  # buckets of the frames between first and last
+
+    kept = np.empty(points, dtype=np.int64)
+    kept[0] = 0
+    kept[-1] = count - 1
+    a = 0
+    for b in range(points - 2):
+        lo, hi = edges[b], edges[b + 1]
+        if b + 2 < len(edges):
+            next_t = timestamps[edges[b + 1]:edges[b + 2]].mean()
+            next_v = values[edges[b + 1]:edges[b + 2]].mean(axis=0)
+        else:
+            next_t, next_v = timestamps[-1], values[-1]
+
+        dt_next = next_t - timestamps[a]
+        dv_next = next_v - values[a]
+        dt = timestamps[lo:hi] - timestamps[a]
+        dv = values[lo:hi] - values[a]
+        areas = np.linalg.norm(dt[:, None] * dv_next - dt_next * dv, axis=1)
+        a = lo + int(np.argmax(areas))
+        kept[b + 1] = a
+    return kept
+
+
+def bucket_means(timestamps: np.ndarray, scores: np.ndarray, points: int):
+    """
+    Average the frames of `points` equal-width time buckets. Returns
+    (first_index, mean_timestamps, mean_scores, frame_counts) per non-empty
+    bucket; unknown (NaN) scores are left out of their emotion's mean.
+    """
+    if not len(timestamps):
+        return np.array([], dtype=np.int64), timestamps, scores, np.array([], dtype=np.int64)
+
+    edges = np.linspace(timestamps[0], timestamps[-1], points + 1)
+    ids = np.clip(np.searchsorted(edges, timestamps, side="right") - 1, 0, points - 1)
+
+    counts = np.bincount(ids, minlength=points)
+    filled = np.flatnonzero(counts)
+    valid = ~np.isnan(scores)
+    known = np.where(valid, scores, 0).astype(np.float64)
+
+    mean_timestamps = np.bincount(ids, weights=timestamps, minlength=points)[filled] / counts[filled]
+    sums = np.stack([np.bincount(ids, weights=known[:, j], minlength=points) for j in range(scores.shape[1])], axis=1)
+    known_counts = np.stack([np.bincount(ids, weights=valid[:, j], minlength=points) for j in range(scores.shape[1])], axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_scores = (sums / known_counts)[filled]
+
+    first_index = np.searchsorted(ids, filled)
+    return first_index, mean_timestamps, mean_scores, counts[filled]
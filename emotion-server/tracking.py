@@ -0,0 +1,168 @@
+"""
+Face tracking across sampled video frames: identities by bounding-box
+overlap, and box propagation with optical flow to skip face detection.
+"""
+import cv2
+import numpy as np
+
+from config import DETECT_EVERY, REUSE_MIN_CONFIDENCE, TRACK_IOU_THRESHOLD, TRACK_MAX_MISSED
+
+# Fewest reliably tracked feature points a propagated box may rest on
+MIN_TRACKED_POINTS = 6
+
+# Largest forward-backward optical flow error, in pixels, of a reliable point
+MAX_FLOW_ERROR = 1.0
+
+
+def box_iou(a: dict, b: dict) -> float:
+    """Intersection over union of two {x, y, w, h} boxes."""
+    x1 = max(a["x"], b["x"])
+    y1 = max(a["y"], b["y"])
+    x2 = min(a["x"] + a["w"], b["x"] + b["w"])
+    y2 = min(a["y"] + a["h"], b["y"] + b["h"])
+    inter = max(0, x2 - x1) * max(0, y2 - y1)
+    union = a["w"] * a["h"] + b["w"] * b["h"] - inter
+    return inter / union if union > 0 else 0.0
+
+
+class FaceTracker:
+    """
+    Greedy IoU tracker: each new box continues the unmatched track it overlaps
+    most (above the threshold), otherwise it starts a new track.
+    """
+
+    def __init__(self, iou_threshold: float = TRACK_IOU_THRESHOLD, max_missed: int = TRACK_MAX_MISSED):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.tracks = {}  # track_id -> {"box": dict, "missed": int}
+        self.next_track_id = 1
+
+    def update(self, boxes: list) -> list:
+        """Assign a track ID to each box of the next sampled frame."""
+        pairs = sorted(
+            (
+                (box_iou(track["box"], box), track_id, i)
+                for track_id, track in self.tracks.items()
+                for i, box in enumerate(boxes)
+            ),
+            reverse=True
+        )
+
+        assigned = [None] * len(boxes)
+        matched_tracks = set()
+        for iou, track_id, i in pairs:
+            if iou < self.iou_threshold:
+                break
+            if assigned[i] is not None or track_id in matched_tracks:
+                continue
+            assigned[i] = track_id
+            matched_tracks.add(track_id)
+
+        for track_id in list(self.tracks):
+            if track_id in matched_tracks:
+                continue
+            self.tracks[track_id]["missed"] += 1
+            if self.tracks[track_id]["missed"] > self.max_missed:
+                del self.tracks[track_id]
+
+        for i, box in enumerate(boxes):
+            if assigned[i] is None:
+                assigned[i] = self.next_track_id
+                self.next_track_id += 1
+            self.tracks[assigned[i]] = {"box": box, "missed": 0}
+
+        return assigned
+
+
+class FaceBoxPropagator:
+    """
+    Carries face boxes from one sampled frame to the next so the detector only
+    runs every `detect_every` samples.
+
+    Between detections each box is moved by the median Lucas-Kanade flow of
+    the corner points inside it, and scaled by how far those points spread
+    apart. Points whose backward flow does not return to where they started
+    are unreliable; when too few reliable points remain for any box, tracking
+    is lost and the caller has to detect again.
+    """
+
+    def __init__(self, detect_every: int = DETECT_EVERY, min_confidence: float = REUSE_MIN_CONFIDENCE):
+        self.detect_every = detect_every
+        self.min_confidence = min_confidence
+        self.detections = 0
+        self.propagations = 0
+        self.lost = 0
+        self._gray = None
+        self._faces = []  # (box, detection confidence) of the last sampled frame
+        self._since_detection = 0
+
+    def needs_detection(self) -> bool:
+        """Whether the next frame has to go through the detector."""
+        return (
+            self._gray is None
+            or not self._faces
+            or self._since_detection + 1 >= self.detect_every
+        )
+
+    def reset(self, frame: np.ndarray, faces: list):
+        """Start propagating from faces, a list of (box, confidence), detected on frame."""
+        self._gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        self._faces = [({k: int(box[k]) for k in ("x", "y", "w", "h")}, confidence) for box, confidence in faces]
+        self._since_detection = 0
+        self.detections += 1
+
+    def propagate(self, frame: np.ndarray):
+        """
+        Move the previous frame's boxes onto frame. Returns the list of
+        (box, confidence), or None when tracking was lost.
+        """
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        moved = []
+        for box, confidence in self._faces:
+            new_box = self._track_box(self._gray, gray, box)
+            if new_box is None:
+                self.lost += 1
+                return None
+            moved.append((new_box, confidence))
+
+        self._gray = gray
+        self._faces = moved
+        self._since_detection += 1
+        self.propagations += 1
+        return moved
+
+    def _track_box(self, prev_gray: np.ndarray, gray: np.ndarray, box: dict):
+        height, width = gray.shape
+        mask = np.zeros_like(prev_gray)
+        mask[box["y"]:box["y"] + box["h"], box["x"]:box["x"] + box["w"]] = 255
+        points = cv2.goodFeaturesToTrack(prev_gray, maxCorners=60, qualityLevel=0.01, minDistance=3, mask=mask)
+        if points is None or len(points) < MIN_TRACKED_POINTS:
+            return None
+
+        lk_params = dict(winSize=(21, 21), maxLevel=3)
+        forward, status, _ = cv2.calcOpticalFlowPyrLK(prev_gray, gray, points, None, **lk_params)
+        backward, back_status, _ = cv2.calcOpticalFlowPyrLK(gray, prev_gray, forward, None, **lk_params)
+        flow_error = np.linalg.norm((points - backward).reshape(-1, 2), axis=1)
+        reliable = (status.ravel() == 1) & (back_status.ravel() == 1) & (flow_error < MAX_FLOW_ERROR)
+        if reliable.sum() < MIN_TRACKED_POINTS or reliable.mean() < self.min_confidence:
+            return None
+
+        before = points.reshape(-1, 2)[reliable]
+        after = forward.reshape(-1, 2)[reliable]
+        dx, dy = np.median(after - before, axis=0)
+        spread_before = np.linalg.norm(before - before.mean(axis=0), axis=1)
+        spread_after = np.linalg.norm(after - after.mean(axis=0), axis=1)
+        spread = spread_before > 1e-3
+        scale = float(np.median(spread_after[spread] / spread_before[spread])) if spread.any() else 1.0
+
+        cx = box["x"] + box["w"] / 2 + dx
+        cy = box["y"] + box["h"] / 2 + dy
+        w = box["w"] * scale
+        h = box["h"] * scale
+        x = int(round(max(0, cx - w / 2)))
+        y = int(round(max(0, cy - h / 2)))
+        w = int(round(min(width - x, w)))
+        h = int(round(min(height - y, h)))
+        if w < 2 or h < 2:
+            return None
+        return {"x": x, "y": y, "w": w, "h": h}
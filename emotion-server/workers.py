@@ -0,0 +1,142 @@
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from config import WORKER_MODE, WORKER_COUNT, MAX_QUEUED_JOBS
+from metrics import StageTimings, metrics
+
+
+class PoolSaturated(Exception):
+    """Raised when the analysis pool cannot admit another job."""
+
+
+def _init_process_worker():
+    # Each worker process holds its own copy of the models
+    from inference import registry
+    registry.load()
+
+
+def _worker_ready():
+    # Gives the pool a reason to spawn every worker during startup
+    time.sleep(0.1)
+    return True
+
+
+def _timed_call(submitted_at: float, fn, args):
+    """Run fn in a worker and report how long the job waited in the queue."""
+    wait_seconds = time.time() - submitted_at
+    return wait_seconds, fn(*args)
+
+
+class AnalysisPool:
+    """
+    Bounded executor for CPU-bound analysis work.
+
+    At most `workers` jobs run at once and at most `max_queued` more may wait
+    for a free worker; anything beyond that is rejected with PoolSaturated so
+    the caller can answer 503 instead of piling work up on the event loop.
+    """
+
+    def __init__(self, mode: str = WORKER_MODE, workers: int = WORKER_COUNT, max_queued: int = MAX_QUEUED_JOBS):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Unknown worker mode '{mode}', expected 'thread' or 'process'")
+        self.mode = mode
+        self.workers = workers
+        self.max_queued = max_queued
+        self._executor = None
+        self._lock = threading.Lock()
+        self.ready = False
+        self.startup_seconds = None
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def start(self):
+        """Create the executor and make sure every worker has its models loaded."""
+        if self._executor is not None:
+            return
+        start = time.perf_counter()
+        if self.mode == "process":
+            # TensorFlow is not fork-safe, so workers are spawned fresh
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_process_worker,
+            )
+            futures = [self._executor.submit(_worker_ready) for _ in range(self.workers)]
+            for future in futures:
+                future.result()
+        else:
+            from inference import registry
+            registry.load()
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="analysis"
+            )
+        self.startup_seconds = time.perf_counter() - start
+        self.ready = True
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+            self.ready = False
+
+    @property
+    def queue_depth(self) -> int:
+        """Jobs admitted but still waiting for a worker."""
+        return max(0, self.in_flight - self.workers)
+
+    def _admit(self):
+        with self._lock:
+            if self.in_flight >= self.workers + self.max_queued:
+                self.rejected += 1
+                raise PoolSaturated()
+            self.in_flight += 1
+
+    def _release(self, future=None):
+        with self._lock:
+            self.in_flight -= 1
+
+    async def run(self, fn, *args, timings: StageTimings = None):
+        """Run fn(*args) on the pool and return its result. The queue wait is added to `timings` when given."""
+        self.start()
+        self._admit()
+        try:
+            future = self._executor.submit(_timed_call, time.time(), fn, args)
+        except BaseException:
+            self._release()
+            raise
+        # Released when the job ends, not when the caller stops waiting: a cancelled
+        # job that already started keeps its worker until it finishes
+        future.add_done_callback(self._release)
+        wait_seconds, result = await asyncio.wrap_future(future)
+
+        with self._lock:
+            self.completed += 1
+            self.total_wait_seconds += wait_seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+        metrics.queue_wait_seconds.observe(wait_seconds)
+        if timings is not None:
+            timings.add("queue_wait", wait_seconds)
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "workers": self.workers,
+                "max_queued": self.max_queued,
+                "in_flight": self.in_flight,
+                "queue_depth": self.queue_depth,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "average_wait_seconds": round(self.total_wait_seconds / self.completed, 4) if self.completed else 0.0,
+                "max_wait_seconds": round(self.max_wait_seconds, 4),
+            }
+
+
+analysis_pool = AnalysisPool()
@@ -41,7 +41,12 @@ fi
 # -------------------------
 echo "Starting FastAPI backend..."
 cd emotion-server
-uvicorn main:app --reload --host 127.0.0.1 --port 8000 &
+if [[ "$1" == "--prod" ]]; then
+    # Several preloaded server processes (EMOTION_SERVER_WORKERS, default: one per CPU)
+    python serve.py --host 127.0.0.1 --port 8000 &
+else
+    uvicorn main:app --reload --host 127.0.0.1 --port 8000 &
+fi
 BACKEND_PID=$!
 
 # -------------------------